@@ -0,0 +1,126 @@
+import numpy as np
+import struct
+import os
+from almacenPCM import a_float32, leer_wav
+
+# Configuración del ajuste de tempo
+TEMPO_MAXIMO = 1.6         # Nunca acelerar más de 1.6x (por encima deja de entenderse)
+TEMPO_MINIMO = 1.0         # No ralentizar: si el clip cabe, se deja tal cual
+VENTANA_WSOLA = 0.04       # 40 ms por ventana
+TOLERANCIA_WSOLA = 0.01    # Búsqueda de ±10 ms del mejor empalme
+
+
+def factor_tempo(duracion_clip, duracion_ventana, tempo_max=TEMPO_MAXIMO, tempo_min=TEMPO_MINIMO):
+    """Factor de tempo (>1 = más rápido) para que el clip quepa en la ventana"""
+    if duracion_ventana <= 0 or duracion_clip <= 0:
+        return 1.0
+    return float(min(max(duracion_clip / duracion_ventana, tempo_min), tempo_max))
+
+
+def rate_para_tempo(tempo):
+    """Convierte un factor de tempo al parámetro rate de Edge TTS (p. ej. 1.25 -> '+25%')"""
+    porcentaje = int(round((tempo - 1.0) * 100))
+    return f"{porcentaje:+d}%"
+
+
+def estirar_wsola(pcm, sample_rate, tempo, ventana=VENTANA_WSOLA, tolerancia=TOLERANCIA_WSOLA):
+    """
+    Cambia la duración del PCM por 1/tempo sin cambiar el tono (WSOLA).
+    Cada ventana de análisis se desplaza hasta ±tolerancia para maximizar la correlación
+    con la continuación natural de la anterior; la búsqueda se hace con np.correlate.
+    Devuelve float32 [frames, canales].
+    """
+    x = a_float32(np.asarray(pcm))
+    if x.ndim == 1:
+        x = x[:, None]
+    if abs(tempo - 1.0) < 0.01 or len(x) == 0:
+        return x.copy()
+
+    N = int(ventana * sample_rate) & ~1
+    hop_sintesis = N // 2
+    hop_analisis = hop_sintesis * tempo
+    delta = int(tolerancia * sample_rate)
+
+    largo_salida = int(len(x) / tempo)
+    num_ventanas = max(1, int(np.ceil(largo_salida / hop_sintesis)))
+
+    # Relleno para que todas las ventanas y búsquedas caigan dentro del array
+    relleno = delta + N
+    x = np.concatenate([np.zeros((relleno, x.shape[1]), np.float32), x,
+                        np.zeros((relleno + N + int(hop_analisis) + 1, x.shape[1]), np.float32)])
+    mono = x.mean(axis=1)
+
+    hann = np.hanning(N).astype(np.float32)
+    salida = np.zeros((num_ventanas * hop_sintesis + N, x.shape[1]), np.float32)
+    normalizacion = np.zeros(num_ventanas * hop_sintesis + N, np.float32)
+
+    pos = relleno
+    for k in range(num_ventanas):
+        if k > 0:
+            nominal = relleno + int(round(k * hop_analisis))
+            referencia = mono[pos + hop_sintesis:pos + hop_sintesis + N]
+            region = mono[nominal - delta:nominal + delta + N]
+            pos = nominal - delta + int(np.argmax(np.correlate(region, referencia, 'valid')))
+
+        inicio = k * hop_sintesis
+        salida[inicio:inicio + N] += x[pos:pos + N] * hann[:, None]
+        normalizacion[inicio:inicio + N] += hann
+
+    salida /= np.maximum(normalizacion, 1e-3)[:, None]
+    return salida[:largo_salida]
+
+
+def crear_wav_vacio(ruta, num_frames, sample_rate=44100, canales=2):
+    """Crea un WAV int16 en silencio del largo indicado (sin escribir los datos: archivo disperso)"""
+    bytes_datos = num_frames * canales * 2
+    cabecera = struct.pack('<4sI4s4sIHHIIHH4sI',
+                           b'RIFF', 36 + bytes_datos, b'WAVE',
+                           b'fmt ', 16, 1, canales, sample_rate,
+                           sample_rate * canales * 2, canales * 2, 16,
+                           b'data', bytes_datos)
+    with open(ruta, 'wb') as f:
+        f.write(cabecera)
+        f.truncate(len(cabecera) + bytes_datos)
+    return len(cabecera)
+
+
+def crear_pista_doblaje(ruta_wav, duracion, clips, sample_rate=44100, canales=2,
+                        tempo_max=TEMPO_MAXIMO):
+    """
+    Construye una pista de doblaje del largo de la película.
+    clips: lista de dicts {'voz': wav del TTS, 'inicio': seg, 'fin': seg (fin del hueco disponible)}
+    Cada clip se acelera (WSOLA) si no cabe en su hueco y se escribe en su posición
+    de un WAV mapeado en memoria. Devuelve la lista de factores de tempo aplicados.
+    """
+    num_frames = int(round(duracion * sample_rate))
+    offset = crear_wav_vacio(ruta_wav, num_frames, sample_rate, canales)
+    pista = np.memmap(ruta_wav, dtype='<i2', mode='r+', offset=offset, shape=(num_frames, canales))
+
+    tempos = []
+    for clip in clips:
+        if not clip.get('voz') or not os.path.exists(clip['voz']):
+            tempos.append(None)
+            continue
+
+        voz, sr_voz = leer_wav(clip['voz'])
+        if sr_voz != sample_rate:
+            raise ValueError(f"Sample rate distinto en {clip['voz']}: {sr_voz} != {sample_rate}")
+
+        ventana = clip['fin'] - clip['inicio']
+        tempo = factor_tempo(len(voz) / sample_rate, ventana, tempo_max)
+        ajustada = estirar_wsola(voz, sample_rate, tempo)
+        tempos.append(tempo)
+
+        inicio = int(round(clip['inicio'] * sample_rate))
+        fin = min(inicio + len(ajustada), num_frames)
+        if fin <= inicio:
+            continue
+
+        # Sumar (por si un clip que no cupo pisa al siguiente) y saturar
+        tramo = a_float32(pista[inicio:fin]) + ajustada[:fin - inicio, :canales]
+        np.clip(tramo, -1.0, 32767 / 32768.0, out=tramo)
+        pista[inicio:fin] = (tramo * 32768.0).astype('<i2')
+
+    pista.flush()
+    del pista
+    return tempos
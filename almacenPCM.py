@@ -0,0 +1,163 @@
+import numpy as np
+import struct
+import wave
+import os
+from cacheAudio import audio_pelicula
+
+# Formatos de muestra WAV soportados: (audio_format, bits) -> dtype
+FORMATOS_WAV = {
+    (1, 16): np.dtype('<i2'),  # PCM int16
+    (3, 32): np.dtype('<f4'),  # IEEE float32
+}
+
+
+def _buscar_chunks_wav(ruta):
+    """Recorre los chunks RIFF/RF64 y devuelve (formato, offset de datos, bytes de datos)"""
+    with open(ruta, 'rb') as f:
+        cabecera = f.read(12)
+        if len(cabecera) < 12 or cabecera[8:12] != b'WAVE' or cabecera[:4] not in (b'RIFF', b'RF64'):
+            raise ValueError(f"No es un archivo WAV: {ruta}")
+
+        formato = None
+        tamano_ds64 = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            nombre, tamano = struct.unpack('<4sI', chunk)
+            inicio = f.tell()
+
+            if nombre == b'ds64':
+                # RF64: el tamaño real de 'data' va en 64 bits
+                _, tamano_ds64 = struct.unpack('<QQ', f.read(16))
+            elif nombre == b'fmt ':
+                datos = f.read(tamano)
+                audio_format, canales, sample_rate = struct.unpack('<HHI', datos[:8])
+                bits = struct.unpack('<H', datos[14:16])[0]
+                if audio_format == 0xFFFE:  # WAVE_FORMAT_EXTENSIBLE: el formato real va en el subformato
+                    audio_format = struct.unpack('<H', datos[24:26])[0]
+                formato = (audio_format, bits, canales, sample_rate)
+            elif nombre == b'data':
+                if tamano == 0xFFFFFFFF and tamano_ds64 is not None:
+                    tamano = tamano_ds64
+                tamano = min(tamano, os.path.getsize(ruta) - inicio)
+                return formato, inicio, tamano
+
+            f.seek(inicio + tamano + (tamano & 1))
+
+    raise ValueError(f"WAV sin chunk 'data': {ruta}")
+
+
+class AlmacenPCM:
+    """PCM de una película completa mapeado en memoria; las rebanadas son vistas sin copia"""
+
+    def __init__(self, ruta_wav):
+        formato, offset, tamano = _buscar_chunks_wav(ruta_wav)
+        if formato is None:
+            raise ValueError(f"WAV sin chunk 'fmt ': {ruta_wav}")
+
+        audio_format, bits, canales, sample_rate = formato
+        dtype = FORMATOS_WAV.get((audio_format, bits))
+        if dtype is None:
+            raise ValueError(f"Formato WAV no soportado ({audio_format}, {bits} bits): {ruta_wav}")
+
+        self.ruta = ruta_wav
+        self.sample_rate = sample_rate
+        self.canales = canales
+        self.dtype = dtype
+        num_frames = tamano // (dtype.itemsize * canales)
+        self.muestras = np.memmap(ruta_wav, dtype=dtype, mode='r', offset=offset,
+                                  shape=(num_frames, canales))
+
+    @classmethod
+    def desde_video(cls, video_path):
+        """Abre (extrayendo si hace falta) el audio cacheado de un video"""
+        ruta = audio_pelicula(video_path)
+        if ruta is None:
+            return None
+        return cls(ruta)
+
+    def __len__(self):
+        return self.muestras.shape[0]
+
+    @property
+    def duracion(self):
+        return len(self) / self.sample_rate
+
+    def segundos_a_frame(self, segundos):
+        """Convierte segundos al índice de frame más cercano, limitado al rango del archivo"""
+        return min(max(0, int(round(segundos * self.sample_rate))), len(self))
+
+    def rebanada_frames(self, inicio, fin):
+        """Vista (sin copia) de los frames [inicio, fin)"""
+        inicio = min(max(0, inicio), len(self))
+        fin = min(max(inicio, fin), len(self))
+        return self.muestras[inicio:fin]
+
+    def rebanada(self, inicio_seg, fin_seg):
+        """Vista (sin copia) de la ventana [inicio_seg, fin_seg) en segundos"""
+        return self.rebanada_frames(self.segundos_a_frame(inicio_seg), self.segundos_a_frame(fin_seg))
+
+    def rebanada_float(self, inicio_seg, fin_seg, mono=False):
+        """Copia en float32 [-1, 1] de la ventana (para análisis); opcionalmente en mono"""
+        vista = self.rebanada(inicio_seg, fin_seg)
+        datos = a_float32(vista)
+        return datos.mean(axis=1) if mono else datos
+
+
+def a_float32(pcm):
+    """Convierte PCM int16 o float a float32 en [-1, 1]"""
+    if pcm.dtype == np.int16:
+        return pcm.astype(np.float32) / 32768.0
+    return pcm.astype(np.float32, copy=False)
+
+
+def leer_wav(ruta):
+    """Lee un WAV pequeño completo a memoria. Devuelve (pcm[frames, canales], sample_rate)"""
+    formato, offset, tamano = _buscar_chunks_wav(ruta)
+    audio_format, bits, canales, sample_rate = formato
+    dtype = FORMATOS_WAV.get((audio_format, bits))
+    if dtype is None:
+        raise ValueError(f"Formato WAV no soportado ({audio_format}, {bits} bits): {ruta}")
+    datos = np.fromfile(ruta, dtype=dtype, count=tamano // dtype.itemsize, offset=offset)
+    return datos.reshape(-1, canales), sample_rate
+
+
+def escribir_wav(ruta, pcm, sample_rate=44100, ganancia_db=0.0, frames_por_bloque=1 << 16):
+    """
+    Escribe PCM [frames, canales] como WAV int16.
+    Sin ganancia y con int16 contiguo se escribe la vista directamente (sin copia);
+    con ganancia se procesa por bloques para no duplicar la ventana en memoria.
+    """
+    if pcm.ndim == 1:
+        pcm = pcm[:, None]
+
+    with wave.open(ruta, 'wb') as w:
+        w.setnchannels(pcm.shape[1])
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+
+        if len(pcm) == 0:
+            return ruta
+
+        if ganancia_db == 0.0 and pcm.dtype == np.int16 and pcm.flags['C_CONTIGUOUS']:
+            w.writeframes(memoryview(pcm))
+            return ruta
+
+        factor = 10 ** (ganancia_db / 20.0)
+        for i in range(0, pcm.shape[0], frames_por_bloque):
+            bloque = a_float32(pcm[i:i + frames_por_bloque]) * factor
+            np.clip(bloque, -1.0, 32767 / 32768.0, out=bloque)
+            w.writeframes((bloque * 32768.0).astype('<i2').tobytes())
+    return ruta
+
+
+def es_wav_normalizado(ruta, sample_rate=44100, canales=2):
+    """True si el archivo ya es WAV PCM int16 con el sample rate y canales indicados"""
+    if not ruta.lower().endswith('.wav') or not os.path.exists(ruta):
+        return False
+    try:
+        formato, _, _ = _buscar_chunks_wav(ruta)
+    except (ValueError, struct.error):
+        return False
+    return formato == (1, 16, canales, sample_rate)
@@ -6,6 +6,7 @@ import seaborn as sns
 from scipy import signal
 import soundfile as sf
 from matplotlib.gridspec import GridSpec
+from almacenPCM import a_float32
 
 class AudioAnalyzer:
     def __init__(self, title="Audio Analysis"):
@@ -13,11 +14,24 @@ class AudioAnalyzer:
         sns.set_palette("husl")
         self.title = title
     
+    def cargar_audio(self, fuente):
+        """
+        Carga un audio en mono float32.
+        fuente: ruta de archivo, o tupla (pcm, sample_rate) p. ej. una vista de AlmacenPCM.rebanada()
+        """
+        if isinstance(fuente, tuple):
+            pcm, sr = fuente
+            y = a_float32(np.asarray(pcm))
+            if y.ndim == 2:
+                y = y.mean(axis=1)
+            return y, sr
+        return librosa.load(fuente, sr=None, mono=True)
+    
     def plot_comparison(self, original_path, processed_path, save_path=None):
-        """Comparación completa antes/después"""
+        """Comparación completa antes/después (rutas o tuplas (pcm, sample_rate))"""
         # Cargar audios
-        y_orig, sr_orig = librosa.load(original_path, sr=None, mono=True)
-        y_proc, sr_proc = librosa.load(processed_path, sr=None, mono=True)
+        y_orig, sr_orig = self.cargar_audio(original_path)
+        y_proc, sr_proc = self.cargar_audio(processed_path)
         
         if sr_orig != sr_proc:
             y_proc = librosa.resample(y_proc, orig_sr=sr_proc, target_sr=sr_orig)
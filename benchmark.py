@@ -0,0 +1,230 @@
+import numpy as np
+import subprocess
+import shutil
+import json
+import time
+import sys
+import io
+import os
+from contextlib import redirect_stdout
+from datetime import datetime
+import pysrt
+import instrumentacion
+import edgeTtsFalso
+import unirBloques_3a_edge as pipeline
+from cacheAudio import audio_pelicula
+from almacenPCM import AlmacenPCM
+from renderIncremental import renderizar_incremental
+
+# Configuración
+DIR_BENCHMARK = "benchmarks"
+ARCHIVO_RESULTADOS = os.path.join(DIR_BENCHMARK, "resultados.jsonl")
+LATENCIA_TTS = 0.0            # Latencia simulada del TTS falso (0 = medir solo nuestro código)
+TOLERANCIA_REGRESION = 0.15   # Más de un 15% más lento que la referencia = regresión
+MINIMO_REGRESION = 0.05       # ...y al menos 50 ms (los tiempos muy cortos son ruido)
+
+# Escenarios: número de cues, duración de cada cue y distribución de los huecos entre cues
+#   "exponencial" -> huecos con media 'hueco' (muchos cortos, algunos largos)
+#   "uniforme"    -> huecos entre 0 y 2*'hueco'
+#   "bimodal"     -> mezcla de huecos cortos (se agrupan) y largos (cortan grupo)
+ESCENARIOS = {
+    "corto":    {'cues': 60,   'duracion_cue': (1.0, 3.5), 'huecos': "exponencial", 'hueco': 1.5, 'semilla': 1},
+    "capitulo": {'cues': 400,  'duracion_cue': (1.0, 4.0), 'huecos': "bimodal",     'hueco': 2.0, 'semilla': 2},
+    "pelicula": {'cues': 1500, 'duracion_cue': (1.0, 4.0), 'huecos': "exponencial", 'hueco': 2.5, 'semilla': 3},
+}
+
+VOCABULARIO_EN = "the matrix is everywhere you take the red pill and stay in wonderland follow white rabbit".split()
+VOCABULARIO_ES = "la matriz está en todas partes tomas la pastilla roja y te quedas en el país maravillas".split()
+
+
+# ---------- datos sintéticos ----------
+
+def _huecos(rng, n, distribucion, media):
+    if distribucion == "uniforme":
+        return rng.uniform(0, 2 * media, n)
+    if distribucion == "bimodal":
+        cortos = rng.uniform(0.1, 1.0, n)
+        largos = rng.uniform(3.0, 3.0 + 2 * media, n)
+        return np.where(rng.random(n) < 0.7, cortos, largos)
+    return rng.exponential(media, n)
+
+
+def generar_srts(ruta_en, ruta_es, cues, duracion_cue=(1.0, 4.0), huecos="exponencial", hueco=2.0, semilla=0):
+    """SRT EN y ES paralelos (mismos tiempos) con cues y huecos aleatorios reproducibles. Devuelve la duración"""
+    rng = np.random.default_rng(semilla)
+    duraciones = rng.uniform(*duracion_cue, cues)
+    espacios = _huecos(rng, cues, huecos, hueco)
+    palabras = rng.integers(3, 13, cues)
+
+    subs_en, subs_es = pysrt.SubRipFile(), pysrt.SubRipFile()
+    t = 2.0
+    for i in range(cues):
+        inicio, fin = t, t + duraciones[i]
+        indices = rng.integers(0, len(VOCABULARIO_EN), palabras[i])
+        for subs, vocabulario in ((subs_en, VOCABULARIO_EN), (subs_es, VOCABULARIO_ES)):
+            subs.append(pysrt.SubRipItem(
+                index=i + 1,
+                start=pysrt.SubRipTime(milliseconds=int(inicio * 1000)),
+                end=pysrt.SubRipTime(milliseconds=int(fin * 1000)),
+                text=' '.join(vocabulario[k] for k in indices)))
+        t = fin + espacios[i]
+
+    subs_en.save(ruta_en, encoding='utf-8')
+    subs_es.save(ruta_es, encoding='utf-8')
+    return t + 10.0
+
+
+def generar_video(ruta, duracion):
+    """Video sintético (lavfi): imagen mínima + audio con tono y ruido, del largo pedido"""
+    cmd = [
+        'ffmpeg',
+        '-f', 'lavfi', '-i', f'color=c=black:s=160x90:r=5:d={duracion:.2f}',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=48000:duration={duracion:.2f}',
+        '-f', 'lavfi', '-i', f'anoisesrc=c=pink:r=48000:a=0.05:d={duracion:.2f}',
+        '-filter_complex', '[1:a][2:a]amix=inputs=2,aformat=channel_layouts=stereo[a]',
+        '-map', '0:v', '-map', '[a]',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50',
+        '-c:a', 'aac', '-b:a', '128k',
+        '-y', ruta
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return ruta
+
+
+def separador_sintetico(trabajo):
+    """Silencio + tono + silencio como el separador real (si los MP3 del repo no están a mano)"""
+    if os.path.exists(pipeline.sonido_silencio) and os.path.exists(pipeline.tono_suave_320):
+        return [pipeline.sonido_silencio, pipeline.tono_suave_320, pipeline.sonido_silencio]
+    silencio = os.path.join(trabajo, "silencio.mp3")
+    tono = os.path.join(trabajo, "tono.mp3")
+    for ruta, fuente in ((silencio, 'anullsrc=channel_layout=stereo:sample_rate=44100:d=1.8'),
+                         (tono, 'sine=frequency=320:duration=1')):
+        subprocess.run(['ffmpeg', '-f', 'lavfi', '-i', fuente, '-c:a', 'libmp3lame', '-y', ruta],
+                       check=True, capture_output=True)
+    return [silencio, tono, silencio]
+
+
+# ---------- medición ----------
+
+def ejecutar_escenario(nombre, parametros, procesos=None):
+    """Corre todas las etapas sobre datos sintéticos en benchmarks/<nombre>/ y devuelve los tiempos"""
+    trabajo = os.path.join(DIR_BENCHMARK, nombre)
+    shutil.rmtree(trabajo, ignore_errors=True)
+    os.makedirs(trabajo)
+
+    srt_en, srt_es = os.path.join(trabajo, "en.srt"), os.path.join(trabajo, "es.srt")
+    duracion = generar_srts(srt_en, srt_es, **parametros)
+    video = generar_video(os.path.join(trabajo, "pelicula.mp4"), duracion)
+
+    tiempos = {}
+    instrumentacion.reiniciar()
+    edge_tts_original = sys.modules.get('edge_tts')
+    edgeTtsFalso.instalar(latencia=LATENCIA_TTS, jitter=0.0, tasa_fallos=0.0)
+    try:
+        with redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            subs, subs_es = pipeline.cargar_subtitulos(srt_en), pipeline.cargar_subtitulos(srt_es)
+            grupos = pipeline.agrupar_subtitulos(subs)
+            tiempos['agrupacion'] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            audio = audio_pelicula(video, dir_cache=os.path.join(trabajo, "cache_audio"))
+            almacen = AlmacenPCM(audio)
+            grupos_render = pipeline.preparar_grupos(subs, subs_es, grupos, trabajo)
+            for g in grupos_render:
+                pipeline.extraer_grupo(g, subs, almacen, audio)
+            tiempos['extraccion'] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for g in grupos_render:
+                pipeline.generar_tts_grupo(g)
+            tiempos['tts'] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            separador = separador_sintetico(trabajo)
+            plan = pipeline.construir_plan_secuencial(grupos_render, separador,
+                                                      os.path.join(trabajo, "temp_normalized"))
+            tiempos['normalizacion'] = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            opciones = {} if procesos is None else {'procesos': procesos}
+            renderizar_incremental(plan, os.path.join(trabajo, "salida_final.mp3"),
+                                   os.path.join(trabajo, "bloques_mp3"), **opciones)
+            tiempos['ensamblado'] = time.perf_counter() - t0
+    finally:
+        if edge_tts_original is not None:
+            sys.modules['edge_tts'] = edge_tts_original
+        else:
+            sys.modules.pop('edge_tts', None)
+
+    return {
+        'escenario': nombre,
+        'parametros': parametros,
+        'duracion_pelicula': round(duracion, 2),
+        'grupos': len(grupos_render),
+        'tiempos': {k: round(v, 4) for k, v in tiempos.items()},
+        'total': round(sum(tiempos.values()), 4),
+        'instrumentacion': instrumentacion.instantanea(),
+    }
+
+
+def _commit_actual():
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def guardar_resultado(resultado, ruta=ARCHIVO_RESULTADOS):
+    """Añade el resultado (con fecha y commit) al histórico JSONL"""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    resultado = dict(resultado, fecha=datetime.now().isoformat(timespec='seconds'), commit=_commit_actual())
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    return resultado
+
+
+def referencia(escenario, ruta=ARCHIVO_RESULTADOS):
+    """Último resultado guardado del mismo escenario (o None)"""
+    if not os.path.exists(ruta):
+        return None
+    ultimo = None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        for linea in f:
+            datos = json.loads(linea)
+            if datos.get('escenario') == escenario:
+                ultimo = datos
+    return ultimo
+
+
+def comparar(actual, anterior):
+    """Tabla etapa a etapa contra la referencia; devuelve las etapas que empeoraron"""
+    regresiones = []
+    print(f"\n=== {actual['escenario']}: {actual['grupos']} grupos, {actual['duracion_pelicula']:.0f}s de película ===")
+    print(f"{'etapa':<15}{'actual s':>10}{'ref s':>10}{'ratio':>8}")
+    for etapa, segundos in list(actual['tiempos'].items()) + [('total', actual['total'])]:
+        previo = (anterior['tiempos'].get(etapa) if etapa != 'total' else anterior['total']) if anterior else None
+        if previo:
+            ratio = segundos / previo
+            marca = ""
+            if ratio > 1 + TOLERANCIA_REGRESION and segundos - previo > MINIMO_REGRESION:
+                marca = "  ⚠️  regresión"
+                regresiones.append(etapa)
+            print(f"{etapa:<15}{segundos:>10.3f}{previo:>10.3f}{ratio:>8.2f}{marca}")
+        else:
+            print(f"{etapa:<15}{segundos:>10.3f}{'-':>10}{'-':>8}")
+    return regresiones
+
+
+if __name__ == "__main__":
+    # Uso: python benchmark.py [escenario ...]   (por defecto "corto")
+    nombres = sys.argv[1:] or ["corto"]
+    desconocidos = [n for n in nombres if n not in ESCENARIOS]
+    if desconocidos:
+        print(f"Escenarios desconocidos: {desconocidos}. Disponibles: {list(ESCENARIOS)}")
+        sys.exit(1)
+
+    hubo_regresion = False
+    for nombre in nombres:
+        anterior = referencia(nombre)
+        resultado = guardar_resultado(ejecutar_escenario(nombre, ESCENARIOS[nombre]))
+        hubo_regresion |= bool(comparar(resultado, anterior))
+    sys.exit(1 if hubo_regresion else 0)
@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+from indiceVideo import hash_video
+from espacioTrabajo import temporal_unico
+from instrumentacion import contar, contar_bytes, ejecutar
+
+# Configuración
+DIR_CACHE_AUDIO = "cache_audio"
+SAMPLE_RATE_CACHE = 44100
+CANALES_CACHE = 2
+
+
+def ruta_audio_cacheado(video_path, formato="wav", dir_cache=DIR_CACHE_AUDIO):
+    """Ruta del audio demuxeado de un video (clave = hash del video)"""
+    return os.path.join(dir_cache, f"{hash_video(video_path)}.{formato}")
+
+
+def audio_pelicula(video_path, formato="wav", dir_cache=DIR_CACHE_AUDIO):
+    """
+    Extrae una sola vez la pista de audio del video a un intermedio con seek barato.
+    formato: "wav"  -> PCM s16le 44100Hz estéreo (memory-mappable, seek exacto por muestra)
+             "flac" -> FLAC sin pérdida (más pequeño, seek por bloques)
+    Devuelve la ruta del archivo cacheado, o None si falla.
+    """
+    salida = ruta_audio_cacheado(video_path, formato, dir_cache)
+    if os.path.exists(salida):
+        contar("cache.audio_pelicula.aciertos")
+        return salida
+    contar("cache.audio_pelicula.fallos")
+
+    os.makedirs(dir_cache, exist_ok=True)
+    temporal = temporal_unico(salida)   # Otra película del mismo video puede estar extrayendo a la vez
+
+    if formato == "flac":
+        codec = ['-c:a', 'flac', '-compression_level', '5', '-f', 'flac']
+    else:
+        codec = ['-c:a', 'pcm_s16le', '-rf64', 'auto', '-f', 'wav']
+
+    cmd = [
+        'ffmpeg',
+        '-i', video_path,
+        '-map', '0:a:0',
+        '-vn',
+        '-ar', str(SAMPLE_RATE_CACHE),
+        '-ac', str(CANALES_CACHE),
+        *codec,
+        '-y',
+        temporal
+    ]
+
+    print(f"🎵 Extrayendo pista de audio de {os.path.basename(video_path)} (una sola vez)...")
+    result = ejecutar(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"❌ Error extrayendo audio: {result.stderr[:200]}")
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        return None
+
+    os.replace(temporal, salida)
+    contar_bytes("audio_pelicula", salida)
+
+    # Metadatos junto al audio para saber de qué video viene
+    with open(salida + ".json", 'w', encoding='utf-8') as f:
+        json.dump({
+            'video': os.path.abspath(video_path),
+            'formato': formato,
+            'sample_rate': SAMPLE_RATE_CACHE,
+            'canales': CANALES_CACHE,
+        }, f, indent=2)
+
+    tamano_mb = os.path.getsize(salida) / (1024 * 1024)
+    print(f"✅ Audio cacheado: {salida} ({tamano_mb:.1f} MB)")
+    return salida
+
+
+if __name__ == "__main__":
+    # Uso: python cacheAudio.py video.mp4 [wav|flac]
+    if len(sys.argv) < 2:
+        print("Uso: python cacheAudio.py <video> [wav|flac]")
+        sys.exit(1)
+    formato = sys.argv[2] if len(sys.argv) > 2 else "wav"
+    if audio_pelicula(sys.argv[1], formato) is None:
+        sys.exit(1)
@@ -0,0 +1,281 @@
+import threading
+import sqlite3
+import hashlib
+import shutil
+import time
+import sys
+import os
+from contextlib import contextmanager
+from indiceVideo import hash_video
+from espacioTrabajo import temporal_unico
+
+# Catálogo de películas procesadas (SQLite) + directorio de blobs direccionado por contenido.
+# Los archivos de trabajo (grupo_001.wav, tts_123.wav...) pueden repetirse entre películas;
+# el catálogo guarda cada artefacto como blob (sha256) y lo asocia a película/grupo/tipo/voz.
+ARCHIVO_CATALOGO = "catalogo.sqlite"
+DIR_BLOBS = "blobs"
+BYTES_LECTURA_HASH = 1 << 20
+
+# Estados de una etapa
+EN_CURSO = "en_curso"
+HECHO = "hecho"
+ERROR = "error"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS peliculas (
+    id          INTEGER PRIMARY KEY,
+    nombre      TEXT NOT NULL,
+    video       TEXT NOT NULL,
+    hash_video  TEXT NOT NULL UNIQUE,
+    creada      REAL NOT NULL,
+    actualizada REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cues (
+    pelicula_id INTEGER NOT NULL REFERENCES peliculas(id) ON DELETE CASCADE,
+    idioma      TEXT NOT NULL,
+    indice      INTEGER NOT NULL,
+    inicio      REAL NOT NULL,
+    fin         REAL NOT NULL,
+    texto       TEXT NOT NULL,
+    PRIMARY KEY (pelicula_id, idioma, indice)
+);
+CREATE TABLE IF NOT EXISTS grupos (
+    pelicula_id INTEGER NOT NULL REFERENCES peliculas(id) ON DELETE CASCADE,
+    grupo       INTEGER NOT NULL,
+    primer_cue  INTEGER NOT NULL,
+    ultimo_cue  INTEGER NOT NULL,
+    inicio      REAL NOT NULL,
+    fin         REAL NOT NULL,
+    texto_en    TEXT,
+    texto_es    TEXT,
+    PRIMARY KEY (pelicula_id, grupo)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash        TEXT PRIMARY KEY,
+    ruta        TEXT NOT NULL,
+    bytes       INTEGER NOT NULL,
+    creado      REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS artefactos (
+    pelicula_id INTEGER NOT NULL REFERENCES peliculas(id) ON DELETE CASCADE,
+    grupo       INTEGER NOT NULL,          -- -1 = de la película entera (salida, plan...)
+    tipo        TEXT NOT NULL,             -- pelicula, tts_en, tts_es, salida, m4b...
+    voz         TEXT NOT NULL DEFAULT '',
+    hash        TEXT NOT NULL REFERENCES blobs(hash),
+    origen      TEXT,                      -- ruta de trabajo de la que salió
+    creado      REAL NOT NULL,
+    PRIMARY KEY (pelicula_id, grupo, tipo, voz)
+);
+CREATE TABLE IF NOT EXISTS etapas (
+    pelicula_id INTEGER NOT NULL REFERENCES peliculas(id) ON DELETE CASCADE,
+    etapa       TEXT NOT NULL,
+    estado      TEXT NOT NULL,
+    inicio      REAL,
+    fin         REAL,
+    error       TEXT,
+    PRIMARY KEY (pelicula_id, etapa)
+);
+CREATE INDEX IF NOT EXISTS idx_artefactos_hash ON artefactos(hash);
+CREATE INDEX IF NOT EXISTS idx_artefactos_tipo_voz ON artefactos(tipo, voz, pelicula_id);
+CREATE INDEX IF NOT EXISTS idx_etapas_estado ON etapas(estado, etapa);
+"""
+
+
+def hash_archivo(ruta):
+    """sha256 del contenido completo (clave del blob)"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(BYTES_LECTURA_HASH), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class Catalogo:
+    """Una conexión compartida entre hilos (serializada con un lock; SQLite en modo WAL)"""
+
+    def __init__(self, ruta=ARCHIVO_CATALOGO, dir_blobs=DIR_BLOBS):
+        self.ruta = ruta
+        self.dir_blobs = dir_blobs
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(carpeta, exist_ok=True)
+        self._lock = threading.RLock()
+        self._con = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        self._con.row_factory = sqlite3.Row
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA foreign_keys=ON")
+        self._con.executescript(ESQUEMA)
+
+    def cerrar(self):
+        with self._lock:
+            self._con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+        return False
+
+    def _ejecutar(self, sql, parametros=(), muchos=False):
+        with self._lock, self._con:
+            if muchos:
+                return self._con.executemany(sql, parametros)
+            return self._con.execute(sql, parametros)
+
+    def _consultar(self, sql, parametros=()):
+        with self._lock:
+            return [dict(fila) for fila in self._con.execute(sql, parametros).fetchall()]
+
+    # ---------- películas, cues y grupos ----------
+
+    def registrar_pelicula(self, video, nombre=None):
+        """Alta (o reutilización si el video ya estaba, por su hash) y devuelve el id"""
+        clave = hash_video(video)
+        nombre = nombre or os.path.splitext(os.path.basename(video))[0]
+        ahora = time.time()
+        with self._lock:
+            self._ejecutar(
+                "INSERT INTO peliculas (nombre, video, hash_video, creada, actualizada) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(hash_video) DO UPDATE SET video = excluded.video, actualizada = excluded.actualizada",
+                (nombre, os.path.abspath(video), clave, ahora, ahora))
+            return self._consultar("SELECT id FROM peliculas WHERE hash_video = ?", (clave,))[0]['id']
+
+    def guardar_cues(self, pelicula_id, idioma, subs):
+        """Tabla de cues de un idioma (reemplaza la anterior)"""
+        filas = [(pelicula_id, idioma, i, s.start.ordinal / 1000.0, s.end.ordinal / 1000.0, s.text)
+                 for i, s in enumerate(subs)]
+        with self._lock, self._con:
+            self._con.execute("DELETE FROM cues WHERE pelicula_id = ? AND idioma = ?", (pelicula_id, idioma))
+            self._con.executemany("INSERT INTO cues VALUES (?, ?, ?, ?, ?, ?)", filas)
+
+    def guardar_grupos(self, pelicula_id, grupos_render):
+        filas = [(pelicula_id, g['grupo'], g['cues'][0], g['cues'][-1], g['inicio'], g['fin'],
+                  g['texto_en'].strip(), g['texto_es'].strip()) for g in grupos_render]
+        self._ejecutar("INSERT OR REPLACE INTO grupos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas, muchos=True)
+
+    # ---------- blobs y artefactos ----------
+
+    def ruta_blob(self, clave, extension=""):
+        return os.path.join(self.dir_blobs, clave[:2], clave + extension)
+
+    def guardar_blob(self, ruta):
+        """Copia el archivo al directorio de blobs una sola vez por contenido; devuelve el hash"""
+        clave = hash_archivo(ruta)
+        destino = self.ruta_blob(clave, os.path.splitext(ruta)[1].lower())
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            # Copia y no enlace: algunos archivos de trabajo se reescriben en el sitio y cambiarían el blob
+            temporal = temporal_unico(destino)
+            shutil.copyfile(ruta, temporal)
+            os.replace(temporal, destino)
+        self._ejecutar("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+                       (clave, destino, os.path.getsize(destino), time.time()))
+        return clave
+
+    def registrar_artefacto(self, pelicula_id, tipo, ruta, grupo=-1, voz=None):
+        """Guarda el archivo como blob y lo asocia a (película, grupo, tipo, voz). Devuelve el hash o None"""
+        if not ruta or not os.path.exists(ruta):
+            return None
+        clave = self.guardar_blob(ruta)
+        self._ejecutar("INSERT OR REPLACE INTO artefactos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (pelicula_id, grupo, tipo, voz or '', clave, os.path.abspath(ruta), time.time()))
+        return clave
+
+    def artefacto(self, pelicula_id, tipo, grupo=-1, voz=None):
+        """Ruta del blob de un artefacto (o None)"""
+        filas = self._consultar(
+            "SELECT b.ruta FROM artefactos a JOIN blobs b ON b.hash = a.hash "
+            "WHERE a.pelicula_id = ? AND a.grupo = ? AND a.tipo = ? AND a.voz = ?",
+            (pelicula_id, grupo, tipo, voz or ''))
+        return filas[0]['ruta'] if filas else None
+
+    # ---------- etapas ----------
+
+    def marcar_etapa(self, pelicula_id, etapa, estado, error=None):
+        ahora = time.time()
+        if estado == EN_CURSO:
+            self._ejecutar("INSERT OR REPLACE INTO etapas VALUES (?, ?, ?, ?, NULL, NULL)",
+                           (pelicula_id, etapa, estado, ahora))
+        else:
+            self._ejecutar(
+                "INSERT INTO etapas VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(pelicula_id, etapa) "
+                "DO UPDATE SET estado = excluded.estado, fin = excluded.fin, error = excluded.error",
+                (pelicula_id, etapa, estado, ahora, ahora, error))
+
+    @contextmanager
+    def etapa(self, pelicula_id, nombre):
+        """Marca la etapa en curso y, al salir, hecha o con error"""
+        self.marcar_etapa(pelicula_id, nombre, EN_CURSO)
+        try:
+            yield
+        except BaseException as e:
+            self.marcar_etapa(pelicula_id, nombre, ERROR, repr(e))
+            raise
+        self.marcar_etapa(pelicula_id, nombre, HECHO)
+
+    # ---------- consultas ----------
+
+    def peliculas(self):
+        return self._consultar(
+            "SELECT p.id, p.nombre, p.video, "
+            "  (SELECT COUNT(*) FROM grupos g WHERE g.pelicula_id = p.id) AS grupos, "
+            "  (SELECT group_concat(e.etapa || '=' || e.estado, ' ') FROM etapas e WHERE e.pelicula_id = p.id) AS etapas "
+            "FROM peliculas p ORDER BY p.nombre")
+
+    def peliculas_con(self, tipo, voz=None, completas=True):
+        """
+        Películas que tienen artefactos 'tipo' (p. ej. tts_es) con la voz dada.
+        completas: solo las que los tienen para todos sus grupos.
+        """
+        condicion_voz = "AND a.voz = ?" if voz else ""
+        parametros = (tipo, voz) if voz else (tipo,)
+        filas = self._consultar(
+            "SELECT p.id, p.nombre, COUNT(DISTINCT a.grupo) AS con_artefacto, MIN(a.grupo) < 0 AS de_pelicula, "
+            "  (SELECT COUNT(*) FROM grupos g WHERE g.pelicula_id = p.id) AS grupos "
+            "FROM artefactos a JOIN peliculas p ON p.id = a.pelicula_id "
+            f"WHERE a.tipo = ? {condicion_voz} GROUP BY p.id ORDER BY p.nombre", parametros)
+        for f in filas:
+            # Los artefactos de la película entera (grupo -1, como la salida) no se cuentan por grupo
+            f['completa'] = bool(f['de_pelicula']) or f['con_artefacto'] >= f['grupos']
+        return [f for f in filas if f['completa']] if completas else filas
+
+    def usos_blob(self, clave):
+        """Artefactos (de cualquier película) que comparten un mismo contenido"""
+        return self._consultar(
+            "SELECT p.nombre, a.grupo, a.tipo, a.voz FROM artefactos a JOIN peliculas p ON p.id = a.pelicula_id "
+            "WHERE a.hash = ?", (clave,))
+
+
+def registrar_resultado(catalogo, pelicula_id, grupos_render, voces, output_final=None):
+    """Guarda en el catálogo los cortes y TTS de cada grupo y la salida final de una película"""
+    catalogo.guardar_grupos(pelicula_id, grupos_render)   # Ventanas ya recortadas al extraer (VAD)
+    for g in grupos_render:
+        catalogo.registrar_artefacto(pelicula_id, "pelicula", g['pelicula'], g['grupo'])
+        catalogo.registrar_artefacto(pelicula_id, "tts_en", g['tts_en'], g['grupo'], voces.get(1))
+        catalogo.registrar_artefacto(pelicula_id, "tts_es", g['tts_es'], g['grupo'], voces.get(2))
+    if output_final:
+        catalogo.registrar_artefacto(pelicula_id, "salida", output_final)
+
+
+if __name__ == "__main__":
+    # Uso: python catalogo.py peliculas
+    #      python catalogo.py con <tipo> [voz]     p. ej. con tts_es es-AR-ElenaNeural
+    #      python catalogo.py blob <hash>
+    if len(sys.argv) < 2:
+        print("Uso: python catalogo.py peliculas | con <tipo> [voz] | blob <hash>")
+        sys.exit(1)
+    catalogo = Catalogo()
+    if sys.argv[1] == "peliculas":
+        for p in catalogo.peliculas():
+            print(f"{p['id']:>4}  {p['nombre']:<40} {p['grupos']:>5} grupos  {p['etapas'] or ''}")
+    elif sys.argv[1] == "con" and len(sys.argv) >= 3:
+        voz = sys.argv[3] if len(sys.argv) > 3 else None
+        for p in catalogo.peliculas_con(sys.argv[2], voz, completas=False):
+            detalle = "película" if p['de_pelicula'] else f"{p['con_artefacto']}/{p['grupos']} grupos"
+            print(f"{'✅' if p['completa'] else '⚠️ '} {p['nombre']:<40} {detalle}")
+    elif sys.argv[1] == "blob" and len(sys.argv) >= 3:
+        for uso in catalogo.usos_blob(sys.argv[2]):
+            print(f"{uso['nombre']:<40} grupo {uso['grupo']:>4} {uso['tipo']:<8} {uso['voz']}")
+    else:
+        print(f"Comando desconocido: {' '.join(sys.argv[1:])}")
+        sys.exit(1)
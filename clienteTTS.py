@@ -0,0 +1,258 @@
+import threading
+import asyncio
+import random
+import time
+import os
+from collections import deque
+from contextlib import nullcontext
+from almacenPCM import escribir_wav
+from espacioTrabajo import temporal_unico
+import codecAudio
+from instrumentacion import contar, contar_bytes, medir
+
+# Cliente adaptativo para Edge TTS (compartido por todos los hilos del proceso).
+#   - Concurrencia AIMD: +1 petición simultánea por cada 'limite' éxitos seguidos,
+#     a la mitad ante un error o una latencia por carácter muy por encima de la mínima reciente
+#     (las frases van de "Yeah." a 250 caracteres: la latencia sola no dice si el servicio va lento).
+#   - Circuito: tras FALLOS_PARA_ABRIR errores de conexión/NoAudioReceived seguidos deja de
+#     pedir durante PAUSA_CIRCUITO segundos; luego deja pasar una sola petición de prueba.
+#   - Un trabajo fallido vuelve a la cola (suelta su hueco, espera y se reintenta detrás
+#     de los demás) hasta MAX_REINTENTOS; los que aun así fallan quedan en 'perdidos' hasta
+#     que se informa de ellos (informe_perdidos, por película).
+CONCURRENCIA_INICIAL = 4
+CONCURRENCIA_MINIMA = 1
+CONCURRENCIA_MAXIMA = 16
+FACTOR_LATENCIA = 3.0        # Latencia por carácter > 3x la mínima reciente = el servicio está saturado
+ALFA_LATENCIA = 0.2          # Peso de la última muestra en la media móvil de latencia
+CARACTERES_MINIMOS = 20      # Frases más cortas cuentan como 20 caracteres (su latencia es casi toda fija)
+VENTANA_LATENCIA = 50        # La mínima de referencia sale de las últimas 50 peticiones, no de todas
+FALLOS_PARA_ABRIR = 5
+PAUSA_CIRCUITO = 30.0        # Segundos con el circuito abierto antes de probar de nuevo
+MAX_REINTENTOS = 6
+ESPERA_REINTENTO = 1.0       # Espera base entre reintentos (se duplica en cada intento)
+ESPERA_MAXIMA = 60.0
+TIMEOUT_PETICION = 60.0
+
+
+def _errores_reintentables():
+    """Excepciones que indican un problema del servicio o de la red (no del texto ni de la config)"""
+    errores = [ConnectionError, TimeoutError, asyncio.TimeoutError]
+    try:
+        import edge_tts
+        errores += [edge_tts.exceptions.NoAudioReceived, edge_tts.exceptions.WebSocketError,
+                    edge_tts.exceptions.UnexpectedResponse, edge_tts.exceptions.UnknownResponse]
+    except (ImportError, AttributeError):
+        pass
+    try:
+        import aiohttp
+        errores.append(aiohttp.ClientError)
+    except ImportError:
+        pass
+    return tuple(errores)
+
+
+def edge_a_archivo(texto, archivo_salida, voz, rate):
+    """Una petición a Edge TTS, sin reintentos; lanza la excepción original si falla"""
+    import edge_tts
+
+    async def generar_audio():
+        communicate = edge_tts.Communicate(texto, voz, rate=rate)
+        await asyncio.wait_for(communicate.save(archivo_salida), TIMEOUT_PETICION)
+
+    asyncio.run(generar_audio())
+
+
+def edge_a_wav(texto, archivo_wav, voz, rate, archivo_mp3=None, sample_rate=44100, canales=2):
+    """
+    Una petición a Edge TTS decodificada mientras llega: cada chunk MP3 del websocket entra
+    al decodificador incremental de codecAudio (PyAV en proceso o un ffmpeg por tubería) en cuanto
+    se recibe, y el resultado se escribe directamente como WAV del formato común (el plan lo usa
+    tal cual, sin pasar por normalizar). Con archivo_mp3 también guarda el MP3 original.
+    Lanza la excepción original si falla.
+    """
+    import edge_tts
+
+    decodificador = codecAudio.DecodificadorMP3(sample_rate, canales)
+
+    async def recibir(mp3):
+        communicate = edge_tts.Communicate(texto, voz, rate=rate)
+        async for chunk in communicate.stream():
+            if chunk['type'] == 'audio':
+                decodificador.alimentar(chunk['data'])
+                if mp3 is not None:
+                    mp3.write(chunk['data'])
+
+    temporal_mp3 = temporal_unico(archivo_mp3) if archivo_mp3 else None
+    try:
+        with open(temporal_mp3, 'wb') if temporal_mp3 else nullcontext() as mp3:
+            asyncio.run(asyncio.wait_for(recibir(mp3), TIMEOUT_PETICION))
+        pcm = decodificador.terminar()
+    except BaseException:
+        decodificador.cancelar()
+        if temporal_mp3 and os.path.exists(temporal_mp3):
+            os.remove(temporal_mp3)
+        raise
+
+    temporal_wav = temporal_unico(archivo_wav)
+    escribir_wav(temporal_wav, pcm, sample_rate)
+    os.replace(temporal_wav, archivo_wav)
+    if temporal_mp3:
+        os.replace(temporal_mp3, archivo_mp3)
+    contar_bytes("tts_pcm", archivo_wav)
+
+
+class ClienteTTS:
+    """Envoltorio seguro entre hilos: limita la concurrencia, reintenta y corta el tráfico si el servicio cae"""
+
+    def __init__(self, funcion=edge_a_archivo, concurrencia=CONCURRENCIA_INICIAL,
+                 minima=CONCURRENCIA_MINIMA, maxima=CONCURRENCIA_MAXIMA):
+        self.funcion = funcion
+        self.minima = minima
+        self.maxima = maxima
+        self.limite = max(minima, min(maxima, concurrencia))
+        self.en_curso = 0
+        self.exitos_seguidos = 0
+        self.fallos_seguidos = 0
+        self.abierto_hasta = 0.0
+        self.probando = False          # Circuito semiabierto: hay una petición de prueba en vuelo
+        self.latencia_media = None     # Segundos por carácter (media móvil)
+        self.latencias = deque(maxlen=VENTANA_LATENCIA)
+        self.peticiones = 0
+        self.errores = 0
+        self.perdidos = []             # (texto, archivo, error) que no se pudieron generar
+        self._cond = threading.Condition()
+
+    # ---------- huecos de concurrencia ----------
+
+    def _adquirir(self):
+        with self._cond:
+            while True:
+                ahora = time.monotonic()
+                if ahora < self.abierto_hasta:
+                    self._cond.wait(self.abierto_hasta - ahora)
+                    continue
+                if self.fallos_seguidos >= FALLOS_PARA_ABRIR:
+                    # Semiabierto: una sola petición de prueba decide si se cierra el circuito
+                    if self.probando or self.en_curso > 0:
+                        self._cond.wait(1.0)
+                        continue
+                    self.probando = True
+                elif self.en_curso >= self.limite:
+                    self._cond.wait()
+                    continue
+                self.en_curso += 1
+                return
+
+    def _liberar(self, latencia=None, error=None, caracteres=0):
+        with self._cond:
+            self.en_curso -= 1
+            self.probando = False
+            self.peticiones += 1
+            if latencia is not None:
+                self._registrar_exito(latencia, caracteres)
+            elif error is not None:
+                self._registrar_fallo()
+            self._cond.notify_all()
+
+    def _registrar_exito(self, latencia, caracteres):
+        self.fallos_seguidos = 0
+        # Normalizada por tamaño: una frase larga (y su decodificación) no parece saturación
+        latencia /= max(caracteres, CARACTERES_MINIMOS)
+        self.latencias.append(latencia)
+        self.latencia_media = latencia if self.latencia_media is None else \
+            (1 - ALFA_LATENCIA) * self.latencia_media + ALFA_LATENCIA * latencia
+
+        if self.latencia_media > FACTOR_LATENCIA * max(min(self.latencias), 0.05 / CARACTERES_MINIMOS):
+            self._reducir()
+            self.latencia_media = None   # Volver a medir con el nuevo límite
+            return
+        self.exitos_seguidos += 1
+        if self.exitos_seguidos >= self.limite:
+            self.exitos_seguidos = 0
+            self.limite = min(self.maxima, self.limite + 1)
+
+    def _registrar_fallo(self):
+        self.errores += 1
+        self.fallos_seguidos += 1
+        self._reducir()
+        if self.fallos_seguidos >= FALLOS_PARA_ABRIR:
+            if time.monotonic() >= self.abierto_hasta:
+                contar("tts.circuito_abierto")
+                print(f"  ⛔ Edge TTS: {self.fallos_seguidos} fallos seguidos, pausa de {PAUSA_CIRCUITO:.0f}s")
+            self.abierto_hasta = time.monotonic() + PAUSA_CIRCUITO
+
+    def _reducir(self):
+        self.exitos_seguidos = 0
+        self.limite = max(self.minima, self.limite // 2)
+
+    # ---------- API ----------
+
+    def sintetizar(self, texto, archivo_salida, voz, rate="+0%", funcion=None, **opciones):
+        """
+        Genera archivo_salida; bloquea mientras el circuito esté abierto o no haya hueco.
+        funcion/opciones: otra forma de hacer la petición (p. ej. edge_a_wav con archivo_mp3).
+        Devuelve True, o lanza el último error si se agotan los reintentos (el trabajo queda en 'perdidos').
+        Los errores no reintentables (ImportError, parámetros...) se lanzan al momento.
+        """
+        funcion = funcion or self.funcion
+        reintentables = _errores_reintentables()
+        for intento in range(MAX_REINTENTOS + 1):
+            self._adquirir()
+            t0 = time.monotonic()
+            try:
+                with medir("tts.peticion"):
+                    funcion(texto, archivo_salida, voz, rate, **opciones)
+            except reintentables as e:
+                self._liberar(error=e)
+                ultimo = e
+            except Exception:
+                self._liberar()   # No es culpa del servicio: no cuenta para el circuito
+                raise
+            else:
+                self._liberar(latencia=time.monotonic() - t0, caracteres=len(texto))
+                return True
+
+            if intento < MAX_REINTENTOS:
+                contar("tts.reintentos")
+                espera = min(ESPERA_MAXIMA, ESPERA_REINTENTO * 2 ** intento) * random.uniform(0.5, 1.0)
+                time.sleep(espera)   # Sin hueco tomado: los demás trabajos pasan delante
+
+        with self._cond:
+            self.perdidos.append((texto, archivo_salida, repr(ultimo)))
+        contar("tts.perdidos")
+        raise ultimo
+
+    def estado(self):
+        with self._cond:
+            return {
+                'limite': self.limite,
+                'en_curso': self.en_curso,
+                'peticiones': self.peticiones,
+                'errores': self.errores,
+                'circuito': 'abierto' if time.monotonic() < self.abierto_hasta else
+                            ('semiabierto' if self.fallos_seguidos >= FALLOS_PARA_ABRIR else 'cerrado'),
+                'ms_por_caracter': round(self.latencia_media * 1000, 2) if self.latencia_media is not None else None,
+                'perdidos': len(self.perdidos),
+            }
+
+    def informe_perdidos(self, maximo=10, directorio=None):
+        """
+        Líneas que se quedaron sin audio (para que no pasen desapercibidas). Las informadas se
+        quitan de 'perdidos'; con directorio, solo las de los archivos de ese directorio (una
+        película), para que el informe de la siguiente no repita las de la anterior.
+        """
+        with self._cond:
+            if directorio is None:
+                perdidos, self.perdidos = self.perdidos, []
+            else:
+                carpeta = os.path.join(os.path.abspath(directorio), '')
+                perdidos = [p for p in self.perdidos if os.path.abspath(p[1]).startswith(carpeta)]
+                self.perdidos = [p for p in self.perdidos if p not in perdidos]
+        if not perdidos:
+            return ""
+        lineas = [f"⚠️  {len(perdidos)} líneas sin audio TTS tras {MAX_REINTENTOS} reintentos:"]
+        for texto, archivo, error in perdidos[:maximo]:
+            lineas.append(f"   {archivo}: {texto[:60]!r} ({error})")
+        if len(perdidos) > maximo:
+            lineas.append(f"   ... y {len(perdidos) - maximo} más")
+        return '\n'.join(lineas)
@@ -0,0 +1,519 @@
+import numpy as np
+import subprocess
+import threading
+import json
+import io
+import os
+from scipy import signal
+from almacenPCM import AlmacenPCM, escribir_wav, leer_wav, es_wav_normalizado
+from instrumentacion import contar, medir, ejecutar
+import trabajadoresFFmpeg
+from framesMP3 import largo_id3, cabecera_xing, formato_frame_mp3, RETARDO_DECODIFICADOR
+
+# Decodificación / codificación de audio dentro del proceso (sin lanzar ffmpeg por cada clip).
+# Backends, por orden de preferencia con BACKEND = "auto":
+#   "pyav"       -> PyAV (libavcodec enlazado: lee todo lo que lee ffmpeg, codifica con libmp3lame)
+#   "soundfile"  -> soundfile (libsndfile: WAV/FLAC/OGG/MP3) + lameenc para codificar MP3
+#   "subprocess" -> ffmpeg por tubería (siempre disponible; es el respaldo de todo lo demás). Los MP3
+#                   enteros van a los ffmpeg persistentes de trabajadoresFFmpeg en vez de a uno por clip
+# Si un backend no puede con un archivo o una opción concreta, se usa el siguiente.
+# DecodificadorMP3 decodifica un MP3 a medida que llegan sus partes (el websocket de Edge TTS).
+BACKEND = "auto"
+SAMPLE_RATE = 44100
+CANALES = 2
+BITRATE_MP3 = '192k'
+FRAMES_POR_BLOQUE = 1 << 16   # Frames por bloque al codificar archivos largos
+PRERROLL = 0.5                # Segundos decodificados antes de una ventana (estado del decodificador)
+# La libmp3lame de las ruedas de PyAV/lameenc codifica ~2x más lento que la de un ffmpeg estático:
+# en proceso solo compensa para clips cortos, donde pesa el arranque del proceso y no la codificación
+MAX_SEGUNDOS_CODIFICAR_EN_PROCESO = 30.0
+
+try:
+    import av
+except ImportError:
+    av = None
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+try:
+    import lameenc
+except ImportError:
+    lameenc = None
+
+
+def en_proceso():
+    """True si hay algún backend que no lanza procesos"""
+    return backends()[0] != "subprocess"
+
+
+def backends():
+    """Backends utilizables, en orden de preferencia (termina siempre en 'subprocess')"""
+    disponibles = []
+    if av is not None:
+        disponibles.append("pyav")
+    if soundfile is not None:
+        disponibles.append("soundfile")
+    disponibles.append("subprocess")
+    if BACKEND != "auto" and BACKEND in disponibles:
+        disponibles = disponibles[disponibles.index(BACKEND):]
+    return disponibles
+
+
+def _kbps(bitrate):
+    """'192k' -> 192"""
+    return int(str(bitrate).lower().rstrip('k'))
+
+
+def _layout(canales):
+    return 'mono' if canales == 1 else 'stereo'
+
+
+def _ajustar_canales(pcm, canales):
+    if pcm.shape[1] == canales:
+        return pcm
+    if canales == 1:
+        return pcm.mean(axis=1, keepdims=True).astype(pcm.dtype)
+    return np.repeat(pcm[:, :1], canales, axis=1)
+
+
+# ---------- decodificación ----------
+
+def _alinear(frame, sample_rate):
+    """
+    Quita del principio del frame las muestras hasta un instante que cae justo en una muestra de
+    ambas frecuencias; así la ventana sale con la misma fase que el decodificado completo.
+    Devuelve (frame recortado o None si no llega a ese instante, segundos en que empieza).
+    """
+    primera = int(round(frame.time * frame.sample_rate))
+    sobra = (-primera) % (frame.sample_rate // np.gcd(frame.sample_rate, sample_rate))
+    inicio = (primera + sobra) / frame.sample_rate
+    if not sobra:
+        return frame, inicio
+    if sobra >= frame.samples:
+        return None, inicio
+    datos = frame.to_ndarray()
+    datos = datos[:, sobra:] if frame.format.is_planar else \
+        datos.reshape(-1, len(frame.layout.channels))[sobra:].reshape(1, -1)
+    recortado = av.AudioFrame.from_ndarray(np.ascontiguousarray(datos), format=frame.format.name,
+                                           layout=frame.layout.name)
+    recortado.sample_rate = frame.sample_rate
+    return recortado, inicio
+
+
+def _decodificar_pyav(ruta, sample_rate, canales, inicio, fin):
+    with av.open(ruta) as contenedor:
+        stream = contenedor.streams.audio[0]
+        if inicio:
+            # Empieza un poco antes para que decodificador y remuestreo ya estén estables en 'inicio';
+            # el sobrante se recorta por muestras abajo
+            contenedor.seek(max(0, int((inicio - PRERROLL) / stream.time_base)), stream=stream)
+        remuestreo = av.AudioResampler(format='s16', layout=_layout(canales), rate=sample_rate)
+        partes, t0 = [], None
+        for frame in contenedor.decode(stream):
+            if fin is not None and frame.time is not None and frame.time > fin:
+                break
+            if t0 is None:
+                if frame.time is None:
+                    t0 = 0.0
+                else:
+                    frame, t0 = _alinear(frame, sample_rate)
+                    if frame is None:
+                        t0 = None
+                        continue
+            partes.extend(r.to_ndarray().reshape(-1, canales) for r in remuestreo.resample(frame))
+        partes.extend(r.to_ndarray().reshape(-1, canales) for r in remuestreo.resample(None))
+
+    pcm = np.concatenate(partes) if partes else np.zeros((0, canales), dtype='<i2')
+    t0 = t0 or 0.0
+    desde = max(0, int(round(((inicio or 0.0) - t0) * sample_rate)))
+    hasta = int(round((fin - t0) * sample_rate)) if fin is not None else len(pcm)
+    return np.ascontiguousarray(pcm[desde:hasta])
+
+
+def _decodificar_soundfile(ruta, sample_rate, canales, inicio, fin):
+    info = soundfile.info(ruta)
+    desde = int(round((inicio or 0.0) * info.samplerate))
+    hasta = int(round(fin * info.samplerate)) if fin is not None else -1
+    pcm, sr = soundfile.read(ruta, start=desde, stop=hasta if hasta >= 0 else None,
+                             dtype='int16', always_2d=True)
+    return _remuestrear(_ajustar_canales(pcm, canales), sr, sample_rate)
+
+
+def _remuestrear(pcm, sr, sample_rate):
+    if sr != sample_rate:
+        divisor = np.gcd(sr, sample_rate)
+        remuestreado = signal.resample_poly(pcm.astype(np.float32), sample_rate // divisor, sr // divisor, axis=0)
+        pcm = np.clip(remuestreado, -32768, 32767).astype('<i2')
+    return np.ascontiguousarray(pcm)
+
+
+def _decodificar_trabajador(ruta, datos, sample_rate, canales):
+    """Un MP3 entero por un ffmpeg persistente; None si no se puede (el llamador lanza uno propio)"""
+    if datos is None:
+        if not ruta.lower().endswith('.mp3') or os.path.getsize(ruta) > trabajadoresFFmpeg.MAX_BYTES_CLIP:
+            return None
+        with open(ruta, 'rb') as f:
+            datos = f.read()
+    try:
+        pcm, sr = trabajadoresFFmpeg.decodificar_mp3(datos)
+    except (ValueError, RuntimeError, OSError):   # No segmentable por frames o trabajador caído
+        return None
+    return _remuestrear(_ajustar_canales(pcm, canales), sr, sample_rate)
+
+
+def _decodificar_subprocess(ruta, sample_rate, canales, inicio, fin):
+    datos = ruta.read() if hasattr(ruta, 'read') else None
+    if inicio is None and fin is None and trabajadoresFFmpeg.USAR_TRABAJADORES:
+        pcm = _decodificar_trabajador(ruta, datos, sample_rate, canales)
+        if pcm is not None:
+            return pcm
+    cmd = ['ffmpeg', '-v', 'error']
+    if inicio:
+        cmd += ['-ss', str(inicio)]
+    if fin is not None:
+        cmd += ['-to', str(fin)]
+    cmd += ['-i', ruta if datos is None else 'pipe:0', '-map', '0:a:0', '-f', 's16le', '-ar', str(sample_rate),
+            '-ac', str(canales), 'pipe:1']
+    result = ejecutar(cmd, input=datos, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg no pudo decodificar {ruta}: {result.stderr[-200:].decode(errors='replace')}")
+    return np.frombuffer(result.stdout, dtype='<i2').reshape(-1, canales)
+
+
+_DECODIFICADORES = {
+    "pyav": _decodificar_pyav,
+    "soundfile": _decodificar_soundfile,
+    "subprocess": _decodificar_subprocess,
+}
+
+
+def decodificar(ruta, sample_rate=SAMPLE_RATE, canales=CANALES, inicio=None, fin=None):
+    """
+    PCM int16 [frames, canales] de un archivo (opcionalmente solo la ventana [inicio, fin) en segundos).
+    ruta también puede ser un archivo en memoria (io.BytesIO).
+    """
+    if isinstance(ruta, str) and inicio is None and fin is None and es_wav_normalizado(ruta, sample_rate, canales):
+        pcm, _ = leer_wav(ruta)
+        return pcm
+    ultimo = None
+    for nombre in backends():
+        try:
+            with medir(f"codec.decodificar.{nombre}"):
+                pcm = _DECODIFICADORES[nombre](ruta, sample_rate, canales, inicio, fin)
+        except Exception as e:   # Formato que ese backend no entiende: probar el siguiente
+            ultimo = e
+            if hasattr(ruta, 'seek'):
+                ruta.seek(0)
+            continue
+        contar(f"codec.{nombre}.decodificaciones")
+        return pcm
+    raise ultimo
+
+
+class DecodificadorMP3:
+    """
+    Decodificación incremental de un MP3 que llega por partes: cada parte se decodifica en cuanto
+    se recibe (alimentar) y terminar() devuelve el PCM int16 [frames, canales] completo.
+    Con PyAV, un CodecContext en proceso; si no, un ffmpeg por tubería (arrancado antes de la primera parte).
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, canales=CANALES):
+        self.sample_rate = sample_rate
+        self.canales = canales
+        self.backend = "pyav" if "pyav" in backends() else "subprocess"
+        self._partes = []
+        if self.backend == "pyav":
+            self._contexto = av.CodecContext.create('mp3', 'r')
+            self._remuestreo = av.AudioResampler(format='s16', layout=_layout(canales), rate=sample_rate)
+            self._inicio = bytearray()   # Primeros bytes, hasta saber si hay una etiqueta ID3
+            self._id3 = None             # Bytes de ID3 que faltan por saltar (None: aún no se sabe)
+            self._primero = True
+            self._xing = None            # (frames declarados, retardo, relleno, sample_rate, muestras por frame)
+            return
+        cmd = ['ffmpeg', '-v', 'error', '-f', 'mp3', '-i', 'pipe:0',
+               '-f', 's16le', '-ar', str(sample_rate), '-ac', str(canales), 'pipe:1']
+        contar("subprocesos.ffmpeg")
+        self._proceso = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Vacía la salida a la vez que se escribe la entrada (si no, la tubería se llena y se bloquea)
+        self._lector = threading.Thread(target=self._leer_pcm, daemon=True)
+        self._lector.start()
+
+    def _leer_pcm(self):
+        while True:
+            datos = self._proceso.stdout.read(FRAMES_POR_BLOQUE)
+            if not datos:
+                break
+            self._partes.append(datos)
+
+    def _decodificar(self, paquete):
+        if self._primero and paquete is not None:
+            self._primero = False
+            xing = cabecera_xing(bytes(paquete))
+            if xing is not None:
+                # El frame Xing/Info no lleva audio; su cabecera LAME dice cuánto recortar al terminar
+                sample_rate, _, por_frame, _ = formato_frame_mp3(bytes(paquete))
+                self._xing = (*xing, sample_rate, por_frame)
+                return
+        try:
+            frames = self._contexto.decode(paquete)
+        except av.error.InvalidDataError:   # Frame corrupto: ffmpeg también lo salta
+            contar("codec.pyav.frames_invalidos")
+            return
+        for frame in frames:
+            self._partes.extend(r.to_ndarray().reshape(-1, self.canales) for r in self._remuestreo.resample(frame))
+
+    def alimentar(self, datos):
+        """Decodifica una parte más del MP3"""
+        if self.backend == "subprocess":
+            self._proceso.stdin.write(datos)
+            return
+        if self._id3 is None:
+            self._inicio += datos
+            if len(self._inicio) < 10 and b'ID3'.startswith(bytes(self._inicio[:3])):
+                return   # Aún no se sabe si empieza con una etiqueta ID3
+            datos, self._inicio = bytes(self._inicio), None
+            self._id3 = largo_id3(datos)
+        saltar = min(self._id3, len(datos))
+        self._id3 -= saltar
+        with medir("codec.decodificar.pyav"):
+            for paquete in self._contexto.parse(datos[saltar:]):
+                self._decodificar(paquete)
+
+    def terminar(self):
+        """Vacía el decodificador y devuelve el PCM completo"""
+        if self.backend == "subprocess":
+            self._proceso.stdin.close()
+            self._lector.join()
+            error = self._proceso.stderr.read()
+            if self._proceso.wait() != 0:
+                raise RuntimeError(f"ffmpeg no pudo decodificar el MP3: {error[-200:].decode(errors='replace')}")
+            contar("codec.subprocess.decodificaciones")
+            return np.frombuffer(b''.join(self._partes), dtype='<i2').reshape(-1, self.canales)
+
+        with medir("codec.decodificar.pyav"):
+            if self._inicio:   # Menos de 10 bytes en total: no llegó a decidirse si había ID3
+                datos, self._inicio = bytes(self._inicio), None
+                for paquete in self._contexto.parse(datos):
+                    self._decodificar(paquete)
+            for paquete in self._contexto.parse(None):
+                self._decodificar(paquete)
+            self._decodificar(None)
+            self._partes.extend(r.to_ndarray().reshape(-1, self.canales) for r in self._remuestreo.resample(None))
+        pcm = np.concatenate(self._partes) if self._partes else np.zeros((0, self.canales), dtype='<i2')
+        contar("codec.pyav.decodificaciones")
+
+        if self._xing is not None:
+            # Mismo recorte sin huecos que hace el demuxer de ffmpeg, pasado a la frecuencia de salida
+            declarados, retardo, relleno, sample_rate, por_frame = self._xing
+            if retardo or relleno:
+                escala = self.sample_rate / sample_rate
+                desde = int(round((retardo + RETARDO_DECODIFICADOR) * escala))
+                hasta = int(round((declarados * por_frame - relleno + RETARDO_DECODIFICADOR) * escala)) \
+                    if declarados else len(pcm)
+                pcm = pcm[desde:hasta]
+        return np.ascontiguousarray(pcm)
+
+    def cancelar(self):
+        """Abandona la decodificación (p. ej. si la petición falla a mitad)"""
+        if self.backend == "subprocess":
+            self._proceso.kill()
+            self._proceso.wait()
+
+
+def a_wav(ruta, salida, sample_rate=SAMPLE_RATE, canales=CANALES, inicio=None, fin=None, ganancia_db=0.0):
+    """Decodifica a un WAV del formato común; devuelve salida"""
+    return escribir_wav(salida, decodificar(ruta, sample_rate, canales, inicio, fin), sample_rate, ganancia_db)
+
+
+def extraer(ruta, salida, inicio, fin, ganancia_db=0.0, bitrate=BITRATE_MP3):
+    """Corta la ventana [inicio, fin) de un archivo a salida (WAV del formato común o MP3, según la extensión)"""
+    return guardar(decodificar(ruta, inicio=inicio, fin=fin), salida, ganancia_db, bitrate)
+
+
+def guardar(pcm, salida, ganancia_db=0.0, bitrate=BITRATE_MP3):
+    """Escribe PCM del formato común a salida (WAV o MP3, según la extensión); devuelve salida"""
+    if salida.lower().endswith('.wav'):
+        return escribir_wav(salida, pcm, SAMPLE_RATE, ganancia_db)
+    if ganancia_db:
+        factor = 10 ** (ganancia_db / 20.0)
+        pcm = np.clip(pcm.astype(np.float32) * factor, -32768, 32767).astype('<i2')
+    return codificar_mp3(pcm, salida, bitrate=bitrate)
+
+
+def info(ruta):
+    """Códec, sample rate, canales y bitrate del primer stream de audio (None si no se puede leer)"""
+    if "pyav" in backends():
+        try:
+            with av.open(ruta) as contenedor:
+                stream = contenedor.streams.audio[0]
+                return {'codec': stream.codec_context.codec.canonical_name, 'sample_rate': stream.rate,
+                        'canales': stream.channels, 'bitrate': contenedor.bit_rate}
+        except Exception:
+            pass
+    result = ejecutar(['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', ruta],
+                      capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    datos = json.loads(result.stdout)
+    if not datos.get('streams'):
+        return None
+    stream = datos['streams'][0]
+    return {'codec': stream.get('codec_name'), 'sample_rate': stream.get('sample_rate'),
+            'canales': stream.get('channels'), 'bitrate': datos.get('format', {}).get('bit_rate')}
+
+
+def duracion(ruta):
+    """Duración en segundos leída de la cabecera/contenedor (sin decodificar)"""
+    if "pyav" in backends():
+        try:
+            with av.open(ruta) as contenedor:
+                if contenedor.duration:
+                    return contenedor.duration / av.time_base
+        except Exception:
+            pass
+    if "soundfile" in backends():
+        try:
+            return soundfile.info(ruta).duration
+        except Exception:
+            pass
+    result = ejecutar(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                       '-of', 'default=noprint_wrappers=1:nokey=1', ruta], capture_output=True, text=True)
+    try:
+        return float(result.stdout.strip()) if result.returncode == 0 else None
+    except ValueError:
+        return None
+
+
+# ---------- codificación MP3 ----------
+
+def _codificar_pyav(bloques, destino, sample_rate, canales, bitrate, reservorio):
+    opciones = {} if reservorio else {'write_xing': '0', 'id3v2_version': '0'}
+    with av.open(destino, 'w', format='mp3', options=opciones) as contenedor:
+        stream = contenedor.add_stream('libmp3lame', rate=sample_rate, layout=_layout(canales),
+                                       options={} if reservorio else {'reservoir': '0'})
+        stream.bit_rate = _kbps(bitrate) * 1000
+        pts = 0
+        for bloque in bloques:
+            if not len(bloque):
+                continue
+            frame = av.AudioFrame.from_ndarray(np.ascontiguousarray(bloque, dtype='<i2').reshape(1, -1),
+                                               format='s16', layout=_layout(canales))
+            frame.sample_rate = sample_rate
+            frame.pts = pts
+            pts += len(bloque)
+            contenedor.mux(stream.encode(frame))
+        contenedor.mux(stream.encode(None))
+
+
+def _codificar_lameenc(bloques, destino, sample_rate, canales, bitrate, reservorio):
+    if not reservorio:
+        raise ValueError("lameenc no permite desactivar el reservorio de bits")
+    codificador = lameenc.Encoder()
+    codificador.set_bit_rate(_kbps(bitrate))
+    codificador.set_in_sample_rate(sample_rate)
+    codificador.set_channels(canales)
+    codificador.set_quality(2)
+    for bloque in bloques:
+        if len(bloque):
+            destino.write(codificador.encode(np.ascontiguousarray(bloque, dtype='<i2').tobytes()))
+    destino.write(codificador.flush())
+
+
+def _codificar_subprocess(bloques, destino, sample_rate, canales, bitrate, reservorio):
+    cmd = ['ffmpeg', '-v', 'error', '-f', 's16le', '-ar', str(sample_rate), '-ac', str(canales),
+           '-i', 'pipe:0', '-c:a', 'libmp3lame', '-b:a', bitrate]
+    if not reservorio:
+        cmd += ['-reservoir', '0', '-write_xing', '0', '-id3v2_version', '0']
+    cmd += ['-f', 'mp3', 'pipe:1']
+    contar("subprocesos.ffmpeg")
+    with medir("subproceso.ffmpeg"):
+        proceso = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # stdout se vacía en otro hilo mientras se escribe stdin (si no, la tubería se llena)
+        salida = []
+        lector = threading.Thread(target=lambda: salida.append(proceso.stdout.read()), daemon=True)
+        lector.start()
+        try:
+            for bloque in bloques:
+                proceso.stdin.write(np.ascontiguousarray(bloque, dtype='<i2').tobytes())
+            proceso.stdin.close()
+        except BrokenPipeError:
+            pass
+        lector.join()
+        error = proceso.stderr.read()
+        if proceso.wait() != 0:
+            raise RuntimeError(f"Error codificando MP3: {error[-200:].decode(errors='replace')}")
+    destino.write(salida[0])
+
+
+_CODIFICADORES = {
+    "pyav": _codificar_pyav,
+    "soundfile": _codificar_lameenc,   # soundfile no codifica MP3 de forma fiable: lameenc
+    "subprocess": _codificar_subprocess,
+}
+
+
+def codificar_mp3(bloques, salida=None, sample_rate=SAMPLE_RATE, canales=CANALES, bitrate=BITRATE_MP3,
+                  reservorio=True):
+    """
+    Codifica PCM int16 a MP3. bloques: un array [frames, canales] o una lista de ellos (p. ej. vistas
+    de un memmap, para archivos largos sin cargarlos en memoria).
+    reservorio=False: frames independientes, sin ID3 ni frame Xing (para cortar y pegar bloques).
+    Con salida escribe el archivo y devuelve su ruta; sin salida devuelve los bytes.
+    """
+    bloques = [bloques] if isinstance(bloques, np.ndarray) else list(bloques)
+    largo = sum(len(b) for b in bloques) > MAX_SEGUNDOS_CODIFICAR_EN_PROCESO * sample_rate
+    ultimo = None
+    for nombre in backends():
+        if (nombre == "soundfile" and lameenc is None) or (largo and nombre != "subprocess"):
+            continue
+        try:
+            with open(salida, 'wb') if salida else io.BytesIO() as destino:
+                with medir(f"codec.codificar.{nombre}"):
+                    _CODIFICADORES[nombre](bloques, destino, sample_rate, canales, bitrate, reservorio)
+                datos = None if salida else destino.getvalue()
+        except Exception as e:   # Opción o formato no soportado por ese backend: probar el siguiente
+            ultimo = e
+            continue
+        contar(f"codec.{nombre}.codificaciones")
+        return salida if salida else datos
+    raise ultimo
+
+
+def codificar_wav_mp3(rutas_wav, salida, bitrate=BITRATE_MP3):
+    """
+    Codifica uno o varios WAV del mismo formato (de cualquier largo), uno detrás de otro, a un
+    solo MP3; se leen por bloques del memmap, sin cargarlos en memoria.
+    """
+    if isinstance(rutas_wav, str):
+        rutas_wav = [rutas_wav]
+    almacenes = [AlmacenPCM(ruta) for ruta in rutas_wav]
+    bloques = [a.rebanada_frames(i, i + FRAMES_POR_BLOQUE)
+               for a in almacenes for i in range(0, len(a), FRAMES_POR_BLOQUE)]
+    return codificar_mp3(bloques, salida, almacenes[0].sample_rate, almacenes[0].canales, bitrate)
+
+
+# ---------- tonos ----------
+
+def generar_tono(tipo="beep", duracion=0.3, frecuencia=800, sample_rate=SAMPLE_RATE):
+    """
+    PCM int16 de un tono de separación, igual que las fuentes lavfi que usaba ffmpeg:
+    beep (sine a 1/8 de escala, volumen 0.5), click (ruido blanco, 0.3), silence (estéreo), fade.
+    """
+    n = int(round(duracion * sample_rate))
+    t = np.arange(n, dtype=np.float32) / sample_rate
+    if tipo == "silence":
+        return np.zeros((n, 2), dtype='<i2')
+    if tipo == "click":
+        x = 0.3 * np.random.default_rng().uniform(-1.0, 1.0, n).astype(np.float32)
+    else:
+        x = np.sin(2 * np.pi * frecuencia * t) / 8.0
+        if tipo == "beep":
+            x = x * 0.5
+        elif tipo == "fade":
+            rampa = min(n, int(0.1 * sample_rate))
+            envolvente = np.ones(n, dtype=np.float32)
+            envolvente[:rampa] = np.linspace(0.0, 1.0, rampa)
+            envolvente[n - rampa:] = np.linspace(1.0, 0.0, rampa)
+            x = x * envolvente
+    return (np.clip(x, -1.0, 32767 / 32768.0) * 32768.0).astype('<i2')[:, None]
@@ -2,10 +2,12 @@ import pysrt
 import subprocess
 import os
 import random
+from cacheAudio import audio_pelicula
 
 class AudioProcessor:
     def __init__(self, video_path, srt_path):
         self.video = video_path
+        self.audio = None  # Pista de audio cacheada (se extrae la primera vez que hace falta)
         self.subs = pysrt.open(srt_path)
         self.temp_files = []
         
@@ -57,11 +59,16 @@ class AudioProcessor:
         
         output_file = f'dialogo_{sub_idx:04d}.mp3'
         
+        if self.audio is None:
+            self.audio = audio_pelicula(self.video)
+            if self.audio is None:
+                raise RuntimeError(f"No se pudo extraer el audio de {self.video}")
+        
         cmd = [
             'ffmpeg',
-            '-i', self.video,
             '-ss', start_str,
             '-to', end_str,
+            '-i', self.audio,
             '-q:a', '2',
             '-map', '0:a',
             '-y',
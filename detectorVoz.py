@@ -0,0 +1,87 @@
+import numpy as np
+from functools import lru_cache
+from scipy import signal
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+from almacenPCM import a_float32
+
+# Detección de voz por energía (VAD) para ajustar la ventana de un grupo a lo que se habla.
+# Los grupos se cortan con márgenes fijos alrededor de los subtítulos (segundos de silencio o
+# música detrás de la última frase); aquí se mide la energía en la banda de la voz por ventanas
+# de HOP_VAD y se recortan los márgenes hasta donde termina la voz que rodea a los subtítulos.
+# El tramo de los subtítulos nunca se recorta, y si el clip no tiene contraste (voz, música o
+# ambiente en la banda de la voz todo el rato, o nada por encima del mínimo) no se puede separar
+# la voz del fondo: se deja la ventana original con sus márgenes.
+HOP_VAD = 0.02                 # Ventanas de 20 ms
+BANDA_VOZ = (300.0, 3400.0)    # Hz: deja fuera graves de música y explosiones y el siseo agudo
+PERCENTIL_RUIDO = 10           # Ruido de fondo del clip = este percentil de la energía de las ventanas
+PERCENTIL_VOZ = 90             # Nivel de la voz del clip (para medir el contraste con el fondo)
+UMBRAL_SOBRE_RUIDO_DB = 10.0   # Voz = ventana al menos 10 dB por encima del ruido de fondo...
+UMBRAL_MINIMO_DB = -50.0       # ...y por encima de este nivel absoluto (dBFS RMS)
+PAUSA_MAXIMA = 0.3             # Huecos más cortos dentro de una frase no la cortan
+RELLENO_INICIO = 0.1           # Segundos que se dejan antes de la voz...
+RELLENO_FIN = 0.3              # ...y después (cola de la última sílaba, reverberación)
+
+
+@lru_cache(maxsize=8)
+def _filtro_voz(sample_rate):
+    return signal.butter(4, BANDA_VOZ, btype='bandpass', fs=sample_rate, output='sos').astype(np.float32)
+
+
+def actividad_voz(pcm, sample_rate, hop=HOP_VAD):
+    """
+    Máscara booleana de voz por ventana de 'hop' segundos de un PCM [frames, canales].
+    Todo vectorizado: paso banda -> RMS por ventanas -> umbral sobre el ruido -> cierre de pausas cortas.
+    """
+    x = a_float32(np.asarray(pcm))
+    if x.ndim == 2:
+        # Mezcla a mono como producto matriz-vector (mucho más rápido que mean(axis=1) sobre [frames, 2])
+        x = x @ np.full(x.shape[1], 1.0 / x.shape[1], dtype=np.float32)
+    hop_muestras = max(1, int(hop * sample_rate))
+    num_ventanas = int(np.ceil(len(x) / hop_muestras))
+    if num_ventanas == 0:
+        return np.zeros(0, dtype=bool)
+
+    relleno = np.zeros(num_ventanas * hop_muestras, dtype=np.float32)
+    relleno[:len(x)] = signal.sosfilt(_filtro_voz(sample_rate), x)
+    ventanas = relleno.reshape(num_ventanas, hop_muestras)
+    rms = np.sqrt(np.einsum('ij,ij->i', ventanas, ventanas) / hop_muestras)
+
+    nivel = 20 * np.log10(np.maximum(rms, 1e-10))   # Silencio digital: -200 dB, no -inf
+    ruido, voz = np.percentile(nivel, [PERCENTIL_RUIDO, PERCENTIL_VOZ])
+    if voz - ruido < UMBRAL_SOBRE_RUIDO_DB:
+        # Sin contraste el ruido de fondo medido es la propia voz (o el ambiente): todo cuenta como voz
+        return np.ones(num_ventanas, dtype=bool)
+    activa = nivel > max(UMBRAL_MINIMO_DB, ruido + UMBRAL_SOBRE_RUIDO_DB)
+
+    # Cierre: las pausas de menos de PAUSA_MAXIMA entre palabras cuentan como voz
+    tamano = max(1, int(round(PAUSA_MAXIMA / hop))) + 1
+    activa = maximum_filter1d(activa, size=tamano, mode='nearest')
+    return minimum_filter1d(activa, size=tamano, mode='nearest')
+
+
+def ventana_voz(pcm, sample_rate, inicio_voz, fin_voz, relleno_inicio=RELLENO_INICIO, relleno_fin=RELLENO_FIN,
+                hop=HOP_VAD):
+    """
+    (desde, hasta) en frames del PCM: el tramo [inicio_voz, fin_voz) (segundos desde el inicio del
+    clip, p. ej. los subtítulos) extendido mientras siga la voz que lo toca, más los rellenos.
+    Si la máscara no distingue voz de fondo (todo voz o nada de voz) devuelve el clip entero.
+    """
+    activa = actividad_voz(pcm, sample_rate, hop)
+    if activa.all() or not activa.any():
+        return 0, len(pcm)
+    hop_muestras = max(1, int(hop * sample_rate))
+    inicio = int(round(max(0.0, inicio_voz) * sample_rate))
+    fin = int(round(max(inicio_voz, fin_voz) * sample_rate))
+    if len(activa):
+        # Hacia atrás desde el primer subtítulo y hacia delante desde el último, hasta la primera ventana sin voz
+        i0 = min(inicio // hop_muestras, len(activa) - 1)
+        if activa[i0]:
+            silencios = np.flatnonzero(~activa[:i0])
+            inicio = min(inicio, (silencios[-1] + 1 if len(silencios) else 0) * hop_muestras)
+        i1 = min(max(0, -(-fin // hop_muestras) - 1), len(activa) - 1)
+        if activa[i1]:
+            silencios = np.flatnonzero(~activa[i1:])
+            fin = max(fin, (i1 + silencios[0] if len(silencios) else len(activa)) * hop_muestras)
+    desde = max(0, inicio - int(round(relleno_inicio * sample_rate)))
+    hasta = min(len(pcm), fin + int(round(relleno_fin * sample_rate)))
+    return desde, max(desde, hasta)
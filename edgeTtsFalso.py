@@ -0,0 +1,178 @@
+import numpy as np
+import subprocess
+import threading
+import asyncio
+import hashlib
+import random
+import types
+import json
+import sys
+import os
+
+# Sustituto local de edge_tts (misma interfaz: Communicate.save/stream, list_voices, exceptions)
+# para pruebas de carga y benchmarks sin red. El audio es sintético y determinista por texto/voz.
+#
+# Uso:
+#   import edgeTtsFalso
+#   edgeTtsFalso.instalar(latencia=0.4, jitter=0.2, tasa_fallos=0.05)
+#   ... cualquier 'import edge_tts' posterior recibe este módulo ...
+#
+# También se configura por entorno: EDGE_TTS_FALSO_LATENCIA, _JITTER, _FALLOS, _SEMILLA.
+
+SAMPLE_RATE = 24000          # Edge entrega audio-24khz-48kbitrate-mono-mp3
+BITRATE = '48k'
+SEGUNDOS_POR_PALABRA = 0.35
+BYTES_POR_CHUNK = 4096       # Tamaño de los chunks 'audio' de stream()
+
+CONFIGURACION = {
+    'latencia': float(os.environ.get('EDGE_TTS_FALSO_LATENCIA', 0.0)),   # Segundos hasta el primer byte
+    'jitter': float(os.environ.get('EDGE_TTS_FALSO_JITTER', 0.0)),       # +- segundos aleatorios
+    'tasa_fallos': float(os.environ.get('EDGE_TTS_FALSO_FALLOS', 0.0)),  # Probabilidad de fallo por llamada
+    'semilla': int(os.environ.get('EDGE_TTS_FALSO_SEMILLA', 0)),
+}
+
+VOCES = [
+    {'Name': f'Microsoft Server Speech Text to Speech Voice ({locale}, {nombre})',
+     'ShortName': f'{locale}-{nombre}', 'Gender': genero, 'Locale': locale}
+    for locale, nombre, genero in [
+        ('en-US', 'AriaNeural', 'Female'), ('en-US', 'GuyNeural', 'Male'),
+        ('en-CA', 'LiamNeural', 'Male'), ('en-AU', 'NatashaNeural', 'Female'),
+        ('es-AR', 'ElenaNeural', 'Female'), ('es-MX', 'DaliaNeural', 'Female'),
+        ('es-ES', 'AlvaroNeural', 'Male'),
+    ]
+]
+
+# Mismas excepciones que edge_tts.exceptions
+exceptions = types.ModuleType('edge_tts.exceptions')
+for _nombre in ('UnknownResponse', 'UnexpectedResponse', 'NoAudioReceived', 'WebSocketError',
+                'SkewAdjustmentError'):
+    setattr(exceptions, _nombre, type(_nombre, (Exception,), {}))
+
+# Estadísticas de la carga recibida (para comprobar límites de concurrencia y reintentos)
+estadisticas = {'llamadas': 0, 'fallos': 0, 'concurrentes': 0, 'concurrentes_max': 0}
+_lock = threading.Lock()
+_rng = random.Random(CONFIGURACION['semilla'])
+
+
+def configurar(**opciones):
+    """Cambia latencia / jitter / tasa_fallos / semilla y reinicia las estadísticas"""
+    global _rng
+    desconocidas = set(opciones) - set(CONFIGURACION)
+    if desconocidas:
+        raise ValueError(f"Opciones desconocidas: {sorted(desconocidas)}")
+    CONFIGURACION.update(opciones)
+    _rng = random.Random(CONFIGURACION['semilla'])
+    with _lock:
+        estadisticas.update(llamadas=0, fallos=0, concurrentes=0, concurrentes_max=0)
+
+
+def instalar(**opciones):
+    """Registra este módulo como 'edge_tts' (los 'import edge_tts' posteriores lo reciben)"""
+    if opciones:
+        configurar(**opciones)
+    modulo = sys.modules[__name__]
+    sys.modules['edge_tts'] = modulo
+    sys.modules['edge_tts.exceptions'] = exceptions
+    return modulo
+
+
+def _porcentaje(valor):
+    """'+25%' -> 0.25"""
+    try:
+        return float(str(valor).strip().rstrip('%')) / 100.0
+    except ValueError:
+        return 0.0
+
+
+def sintetizar_pcm(texto, voz, rate="+0%"):
+    """PCM float32 mono determinista: un tono por voz+texto con envolvente por palabra"""
+    palabras = texto.split()
+    semilla = int(hashlib.sha1(f"{voz}:{texto}".encode()).hexdigest()[:8], 16)
+    duracion = (0.2 + SEGUNDOS_POR_PALABRA * len(palabras)) / max(0.1, 1.0 + _porcentaje(rate))
+    n = int(duracion * SAMPLE_RATE)
+    t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+    frecuencia = 140 + semilla % 260
+
+    envolvente = np.abs(np.sin(np.pi * t / SEGUNDOS_POR_PALABRA)) ** 0.5  # Una "sílaba" por palabra
+    return (0.3 * envolvente * np.sin(2 * np.pi * frecuencia * t)).astype(np.float32), duracion
+
+
+def _codificar_mp3(pcm):
+    cmd = ['ffmpeg', '-f', 'f32le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', 'pipe:0',
+           '-c:a', 'libmp3lame', '-b:a', BITRATE, '-f', 'mp3', 'pipe:1']
+    result = subprocess.run(cmd, input=pcm.tobytes(), capture_output=True)
+    if result.returncode != 0:
+        raise exceptions.UnexpectedResponse(result.stderr[-200:].decode(errors='replace'))
+    return result.stdout
+
+
+async def list_voices(*args, **kwargs):
+    return [dict(v) for v in VOCES]
+
+
+class Communicate:
+    """Misma firma que edge_tts.Communicate; responde en local con latencia/jitter/fallos configurables"""
+
+    def __init__(self, text, voice="en-US-AriaNeural", *, rate="+0%", volume="+0%", pitch="+0Hz", **kwargs):
+        if not isinstance(text, str):
+            raise TypeError("text must be str")
+        self.text = text
+        self.voice = voice
+        self.rate = rate
+        self.volume = volume
+        self.pitch = pitch
+
+    async def stream(self):
+        with _lock:
+            estadisticas['llamadas'] += 1
+            estadisticas['concurrentes'] += 1
+            estadisticas['concurrentes_max'] = max(estadisticas['concurrentes_max'], estadisticas['concurrentes'])
+            falla = _rng.random() < CONFIGURACION['tasa_fallos']
+            espera = max(0.0, CONFIGURACION['latencia'] + _rng.uniform(-1, 1) * CONFIGURACION['jitter'])
+        try:
+            if espera:
+                await asyncio.sleep(espera)
+            if falla:
+                with _lock:
+                    estadisticas['fallos'] += 1
+                raise exceptions.WebSocketError("Conexión cerrada por el servidor (simulado)")
+            if not self.text.strip():
+                raise exceptions.NoAudioReceived("No audio was received. Please verify that your parameters are correct.")
+
+            pcm, duracion = sintetizar_pcm(self.text, self.voice, self.rate)
+            mp3 = await asyncio.to_thread(_codificar_mp3, pcm)
+
+            # Marcas de palabra como las de Edge (offset/duration en unidades de 100 ns)
+            palabras = self.text.split()
+            paso = duracion / max(1, len(palabras))
+            for i, palabra in enumerate(palabras):
+                yield {'type': 'WordBoundary', 'offset': int(i * paso * 1e7),
+                       'duration': int(paso * 1e7), 'text': palabra}
+            for i in range(0, len(mp3), BYTES_POR_CHUNK):
+                yield {'type': 'audio', 'data': mp3[i:i + BYTES_POR_CHUNK]}
+        finally:
+            with _lock:
+                estadisticas['concurrentes'] -= 1
+
+    async def save(self, audio_fname, metadata_fname=None):
+        metadatos = open(metadata_fname, 'w', encoding='utf-8') if metadata_fname else None
+        try:
+            with open(audio_fname, 'wb') as audio:
+                async for chunk in self.stream():
+                    if chunk['type'] == 'audio':
+                        audio.write(chunk['data'])
+                    elif metadatos is not None:
+                        metadatos.write(json.dumps(chunk) + "\n")
+        finally:
+            if metadatos is not None:
+                metadatos.close()
+
+
+if __name__ == "__main__":
+    # Uso: python edgeTtsFalso.py "texto" salida.mp3 [voz]
+    if len(sys.argv) < 3:
+        print("Uso: python edgeTtsFalso.py \"texto\" salida.mp3 [voz]")
+        sys.exit(1)
+    voz = sys.argv[3] if len(sys.argv) > 3 else "en-US-AriaNeural"
+    asyncio.run(Communicate(sys.argv[1], voz).save(sys.argv[2]))
+    print(f"✅ {sys.argv[2]}")
@@ -0,0 +1,164 @@
+import numpy as np
+import subprocess
+import os
+import planRender
+from planRender import PlanRender
+from espacioTrabajo import escritura_atomica
+
+# Configuración del empaquetado
+BITRATE_M4B = '96k'              # AAC para el audiolibro (voz)
+CODEC_MKA = ('-c:a', 'libopus', '-b:a', '96k')
+SEPARADOR_TITULO = " / "         # Título de capítulo: texto ES / texto EN
+
+# Pistas del MKA: (nombre, tipos del plan, idioma ISO 639-2, título)
+PISTAS_MKA = [
+    ("en", {planRender.TIPO_TTS_EN}, "eng", "English (TTS)"),
+    ("es", {planRender.TIPO_TTS_ES}, "spa", "Español (TTS)"),
+    ("pelicula", {planRender.TIPO_PELICULA}, "eng", "Película"),
+]
+
+
+def capitulos_plan(plan):
+    """
+    Un capítulo por grupo del plan: [{'grupo', 'inicio', 'fin' (frames), 'titulo'}].
+    Cada capítulo empieza en el primer segmento del grupo y acaba donde empieza el siguiente.
+    """
+    r = plan.registros
+    con_grupo = r[r['grupo'] >= 0]
+    if not len(con_grupo):
+        return []
+
+    grupos = np.unique(con_grupo['grupo'])
+    inicios = np.array([con_grupo['destino'][con_grupo['grupo'] == g].min() for g in grupos])
+    orden = np.argsort(inicios, kind='stable')
+    grupos, inicios = grupos[orden], inicios[orden]
+    fines = np.append(inicios[1:], plan.duracion_frames)
+
+    capitulos = []
+    for g, inicio, fin in zip(grupos, inicios, fines):
+        textos = plan.grupos.get(int(g), {}).get('textos', {})
+        partes = [' '.join(textos.get(idioma, '').split()) for idioma in ('es', 'en')]
+        titulo = SEPARADOR_TITULO.join(p for p in partes if p) or f"Grupo {int(g)}"
+        capitulos.append({'grupo': int(g), 'inicio': int(inicio), 'fin': int(fin), 'titulo': titulo})
+    return capitulos
+
+
+def _escapar_ffmetadata(texto):
+    for caracter in ('\\', '=', ';', '#', '\n'):
+        texto = texto.replace(caracter, '\\' + caracter)
+    return texto
+
+
+def escribir_ffmetadata(ruta, capitulos, sample_rate, titulo=None):
+    """Escribe los capítulos en formato FFMETADATA1 (timebase = 1/sample_rate, exacto al frame)"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(";FFMETADATA1\n")
+        if titulo:
+            f.write(f"title={_escapar_ffmetadata(titulo)}\n")
+        for c in capitulos:
+            f.write("\n[CHAPTER]\n")
+            f.write(f"TIMEBASE=1/{sample_rate}\n")
+            f.write(f"START={c['inicio']}\n")
+            f.write(f"END={c['fin']}\n")
+            f.write(f"title={_escapar_ffmetadata(c['titulo'])}\n")
+    return ruta
+
+
+def plan_pelicula(plan, audio_pelicula):
+    """
+    Plan con el audio de la película de cada grupo colocado al inicio de su capítulo
+    (recortado al largo del capítulo), en la misma línea de tiempo que el plan original.
+    audio_pelicula: WAV cacheado de la película (mismo formato que el plan).
+    """
+    pista = PlanRender(plan.sample_rate, plan.canales)
+    frames_pelicula = pista.assets[pista.asset(audio_pelicula)]['frames']
+    for c in capitulos_plan(plan):
+        g = c['grupo']
+        datos = plan.grupos.get(g, {})
+        if 'inicio' not in datos:
+            continue
+        offset = min(int(round(datos['inicio'] * plan.sample_rate)), frames_pelicula)
+        largo = min(int(round((datos['fin'] - datos['inicio']) * plan.sample_rate)),
+                    c['fin'] - c['inicio'], frames_pelicula - offset)
+        if largo > 0:
+            pista.agregar(audio_pelicula, planRender.TIPO_PELICULA, grupo=g,
+                          offset=offset, largo=largo, destino=c['inicio'])
+
+    # Misma duración que el plan original, para que todas las pistas acaben a la vez
+    pista._fin = max(pista._fin, plan.duracion_frames)
+    return pista
+
+
+def empaquetar_m4b(plan, salida, titulo=None, temp_dir="temp_normalized"):
+    """Audiolibro M4B (AAC) del plan completo con un capítulo por grupo; una sola codificación"""
+    os.makedirs(temp_dir, exist_ok=True)
+    wav = plan.renderizar_numpy(os.path.join(temp_dir, "pista_m4b.wav"))
+    metadatos = escribir_ffmetadata(os.path.join(temp_dir, "capitulos.txt"),
+                                    capitulos_plan(plan), plan.sample_rate, titulo)
+    cmd = [
+        'ffmpeg',
+        '-i', wav,
+        '-i', metadatos,
+        '-map', '0:a',
+        '-map_metadata', '1',
+        '-map_chapters', '1',
+        '-c:a', 'aac',
+        '-b:a', BITRATE_M4B,
+        '-movflags', '+faststart',
+        '-f', 'ipod',
+        '-y',
+    ]
+    with escritura_atomica(salida) as temporal:
+        result = subprocess.run(cmd + [temporal], capture_output=True, text=True)
+        if result.returncode != 0 and os.path.exists(temporal):
+            os.remove(temporal)   # Sin publicar: no queda un M4B a medias en la salida
+    os.remove(wav)
+    if result.returncode != 0:
+        print(f"❌ Error creando M4B: {result.stderr[-300:]}")
+        return None
+    print(f"✅ Audiolibro con {len(capitulos_plan(plan))} capítulos: {salida}")
+    return salida
+
+
+def empaquetar_mka(plan, salida, audio_pelicula=None, titulo=None, temp_dir="temp_normalized"):
+    """
+    MKA multipista (EN TTS, ES TTS y audio de la película) con capítulos, todo en la
+    línea de tiempo del plan. Cada pista se renderiza con el plan filtrado por tipo y se
+    codifica una vez. Sin audio_pelicula se omite esa pista.
+    """
+    os.makedirs(temp_dir, exist_ok=True)
+    wavs, pistas = [], []
+    for nombre, tipos, idioma, titulo_pista in PISTAS_MKA:
+        if planRender.TIPO_PELICULA in tipos:
+            if not audio_pelicula:
+                continue
+            fuente, tipos = plan_pelicula(plan, audio_pelicula), None
+        else:
+            fuente = plan
+        wavs.append(fuente.renderizar_numpy(os.path.join(temp_dir, f"pista_{nombre}.wav"), tipos=tipos))
+        pistas.append((idioma, titulo_pista))
+
+    metadatos = escribir_ffmetadata(os.path.join(temp_dir, "capitulos.txt"),
+                                    capitulos_plan(plan), plan.sample_rate, titulo)
+    cmd = ['ffmpeg']
+    for wav in wavs:
+        cmd += ['-i', wav]
+    cmd += ['-i', metadatos]
+    for i, (idioma, titulo_pista) in enumerate(pistas):
+        cmd += ['-map', f'{i}:a',
+                f'-metadata:s:a:{i}', f'language={idioma}',
+                f'-metadata:s:a:{i}', f'title={titulo_pista}']
+    cmd += ['-map_metadata', str(len(wavs)), '-map_chapters', str(len(wavs)),
+            *CODEC_MKA, '-f', 'matroska', '-y']
+
+    with escritura_atomica(salida) as temporal:
+        result = subprocess.run(cmd + [temporal], capture_output=True, text=True)
+        if result.returncode != 0 and os.path.exists(temporal):
+            os.remove(temporal)
+    for wav in wavs:
+        os.remove(wav)
+    if result.returncode != 0:
+        print(f"❌ Error creando MKA: {result.stderr[-300:]}")
+        return None
+    print(f"✅ MKA con {len(wavs)} pistas: {salida}")
+    return salida
@@ -0,0 +1,176 @@
+import threading
+import tempfile
+import shutil
+import errno
+import os
+from contextlib import contextmanager
+
+# Espacio de trabajo por película: un directorio temporal propio (en tmpfs si hay sitio) para
+# intermedios (temp_normalized, listas de ffmpeg, pistas WAV de empaquetado...) que se borra
+# al terminar, y un bloqueo sobre el directorio de salida para que dos trabajos no lo pisen.
+# Los archivos finales se escriben con nombre temporal único y se publican con os.replace.
+USAR_TMPFS = True
+RAICES_TMPFS = ("/dev/shm",)
+MINIMO_LIBRE_TMPFS = 2 * 1024 ** 3   # tmpfs es RAM: solo si quedan al menos 2 GB libres
+CONSERVAR_SI_FALLA = False           # Dejar el temporal de un trabajo fallido para depurarlo
+ARCHIVO_BLOQUEO = ".trabajo.lock"
+
+
+class TrabajoEnCurso(Exception):
+    """Otro trabajo vivo tiene bloqueado el mismo directorio de salida"""
+
+
+def raiz_temporal(minimo=MINIMO_LIBRE_TMPFS):
+    """tmpfs si existe, se puede escribir y tiene sitio; si no, el temporal del sistema"""
+    if USAR_TMPFS:
+        for raiz in RAICES_TMPFS:
+            try:
+                libre = shutil.disk_usage(raiz).free
+            except OSError:
+                continue
+            if libre >= minimo and os.access(raiz, os.W_OK):
+                return raiz
+    return tempfile.gettempdir()
+
+
+def temporal_unico(ruta):
+    """Nombre temporal junto a 'ruta', distinto por proceso e hilo (conserva la extensión)"""
+    base, extension = os.path.splitext(ruta)
+    return f"{base}.{os.getpid()}_{threading.get_ident()}.tmp{extension}"
+
+
+def publicar(origen, destino):
+    """Mueve origen a destino de forma atómica (copiando primero al disco destino si es otro)"""
+    try:
+        os.replace(origen, destino)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        temporal = temporal_unico(destino)
+        shutil.copyfile(origen, temporal)
+        os.replace(temporal, destino)
+        os.remove(origen)
+    return destino
+
+
+@contextmanager
+def escritura_atomica(destino):
+    """Da una ruta temporal junto a destino; si el bloque termina bien la publica, si no la borra"""
+    temporal = temporal_unico(destino)
+    try:
+        yield temporal
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    if os.path.exists(temporal):
+        os.replace(temporal, destino)
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EspacioTrabajo:
+    """
+    Temporal propio + bloqueo de dir_salida mientras dura un trabajo. Uso:
+        with EspacioTrabajo(dir_salida, "matrix") as espacio:
+            temp_dir = espacio.directorio("temp_normalized")
+    Sin dir_salida solo da el temporal (p. ej. recursos compartidos por un lote).
+    """
+
+    _abiertos = {}                 # dir_salida absoluto -> EspacioTrabajo
+    _lock = threading.Lock()
+
+    def __init__(self, dir_salida=None, nombre="trabajo"):
+        self.dir_salida = os.path.abspath(dir_salida) if dir_salida else None
+        self.nombre = nombre
+        self.temp = None
+        self._bloqueo = None
+
+    @classmethod
+    def de(cls, dir_salida):
+        """Espacio abierto para ese directorio de salida (o None)"""
+        with cls._lock:
+            return cls._abiertos.get(os.path.abspath(dir_salida))
+
+    def _bloquear(self):
+        os.makedirs(self.dir_salida, exist_ok=True)
+        ruta = os.path.join(self.dir_salida, ARCHIVO_BLOQUEO)
+        for _ in range(2):
+            try:
+                fd = os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    with open(ruta, 'r', encoding='utf-8') as f:
+                        pid = int(f.read().split()[0])
+                except (OSError, ValueError, IndexError):
+                    pid = None
+                if pid is not None and pid != os.getpid() and _proceso_vivo(pid):
+                    raise TrabajoEnCurso(f"{self.dir_salida} está en uso por el proceso {pid}")
+                # Bloqueo huérfano (proceso muerto, o este mismo proceso sin el espacio abierto: abrir()
+                # ya descartó el caso de un espacio abierto aquí): se recupera
+                os.remove(ruta)
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(f"{os.getpid()} {self.nombre}\n")
+            self._bloqueo = ruta
+            return
+        raise TrabajoEnCurso(f"No se pudo bloquear {self.dir_salida}")
+
+    def abrir(self):
+        if self.dir_salida:
+            with EspacioTrabajo._lock:
+                if self.dir_salida in EspacioTrabajo._abiertos:
+                    raise TrabajoEnCurso(f"{self.dir_salida} ya tiene un trabajo abierto en este proceso")
+                self._bloquear()
+                EspacioTrabajo._abiertos[self.dir_salida] = self
+        prefijo = "".join(c if c.isalnum() else "_" for c in self.nombre)[:40]
+        self.temp = tempfile.mkdtemp(prefix=f"{prefijo}_", dir=raiz_temporal())
+        return self
+
+    def cerrar(self, ok=True):
+        """Borra el temporal (salvo fallo con CONSERVAR_SI_FALLA) y libera el directorio de salida"""
+        if self.temp and (ok or not CONSERVAR_SI_FALLA):
+            shutil.rmtree(self.temp, ignore_errors=True)
+        elif self.temp:
+            print(f"  ⚠️  Temporal conservado para depurar: {self.temp}")
+        self.temp = None
+        if self.dir_salida:
+            with EspacioTrabajo._lock:
+                if EspacioTrabajo._abiertos.get(self.dir_salida) is self:
+                    del EspacioTrabajo._abiertos[self.dir_salida]
+            if self._bloqueo and os.path.exists(self._bloqueo):
+                os.remove(self._bloqueo)
+            self._bloqueo = None
+
+    def __enter__(self):
+        return self.abrir()
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar(ok=tipo is None)
+        return False
+
+    def directorio(self, nombre):
+        ruta = os.path.join(self.temp, nombre)
+        os.makedirs(ruta, exist_ok=True)
+        return ruta
+
+    def ruta(self, nombre):
+        return os.path.join(self.temp, nombre)
+
+
+def dir_temporal(dir_salida, nombre="temp_normalized"):
+    """Intermedios de un trabajo: en su espacio si hay uno abierto, si no en dir_salida/nombre (como antes)"""
+    espacio = EspacioTrabajo.de(dir_salida)
+    if espacio is not None:
+        return espacio.directorio(nombre)
+    ruta = os.path.join(dir_salida, nombre)
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
@@ -1,11 +1,19 @@
 import pysrt
 import subprocess
 import os
+import sys
+from cacheAudio import audio_pelicula
 
 # Configuración
 video = 'The.Matrix.1999.mp4'
 subs = pysrt.open('The Matrix (1999)-en.srt')
 
+# Leer solo el audio ya demuxeado (se extrae una vez por película)
+audio_fuente = audio_pelicula(video)
+if audio_fuente is None:
+    print(f"❌ No se pudo extraer el audio de {video}")
+    sys.exit(1)
+
 # Crear archivo de lista para FFmpeg
 list_file = 'lista_audio.txt'
 
@@ -29,7 +37,7 @@ with open(list_file, 'w', encoding='utf-8') as f:
         end_str = f'{end.hour:02}:{end.minute:02}:{end.second:02}.{end.microsecond//1000:03}'
         
         # Escribir en el archivo de lista
-        f.write(f"file '{os.path.abspath(video)}'\n")
+        f.write(f"file '{os.path.abspath(audio_fuente)}'\n")
         f.write(f"inpoint {start_str}\n")
         f.write(f"outpoint {end_str}\n")
         
@@ -6,17 +6,26 @@
 import pysrt
 import subprocess
 import re
+from indiceVideo import obtener_indice, keyframe_anterior
 
 video = 'The.Matrix.1999.mp4'
 subs = pysrt.open('The Matrix (1999)-en.srt')
 
+# Índice de keyframes (se genera una vez por video)
+indice = obtener_indice(video)
+
 for i, sub in enumerate(subs):
-    start = sub.start.to_time()
-    end = sub.end.to_time()
+    start_sec = sub.start.ordinal / 1000.0
+    duration = (sub.end - sub.start).ordinal / 1000.0
+    
+    # Empezar en el keyframe anterior para que '-c copy' no corte a mitad de GOP
+    if indice and indice['keyframes_t']:
+        keyframe = keyframe_anterior(indice, start_sec)
+        duration += start_sec - keyframe
+        start_sec = keyframe
     
     # Convertir a formato FFmpeg
-    start_str = f'{start.hour:02}:{start.minute:02}:{start.second:02}.{start.microsecond//1000:03}'
-    duration = (sub.end - sub.start).ordinal / 1000.0
+    start_str = f'{int(start_sec//3600):02d}:{int((start_sec%3600)//60):02d}:{start_sec%60:06.3f}'
     
     # Limpiar texto para nombre de archivo
     clean_text = re.sub(r'[^\w\s]', '', sub.text)[:30].replace(' ', '_')
@@ -2,11 +2,19 @@ import pysrt
 import subprocess
 import re
 import os
+import sys
+from cacheAudio import audio_pelicula
 
 # Configuración
 video = 'The.Matrix.1999.mp4'
 subs = pysrt.open('The Matrix (1999)-en.srt')
 
+# Audio demuxeado una sola vez; los cortes leen de aquí y no del MP4
+audio_fuente = audio_pelicula(video)
+if audio_fuente is None:
+    print(f"❌ No se pudo extraer el audio de {video}")
+    sys.exit(1)
+
 # Crear directorio para los audios si no existe
 output_dir = 'bloques_audio'
 os.makedirs(output_dir, exist_ok=True)
@@ -37,7 +45,7 @@ for bloque_num in range(num_bloques):
     
     # Comando FFmpeg
     cmd = [
-        'ffmpeg', '-ss', start_str, '-i', video,
+        'ffmpeg', '-ss', start_str, '-i', audio_fuente,
         '-t', str(duration),
         '-q:a', '2',  # Buena calidad
         '-map', 'a',
@@ -5,6 +5,7 @@ import sys
 import os
 from pathlib import Path
 from datetime import timedelta
+from indiceVideo import obtener_indice, keyframe_anterior
 
 def verificar_ffmpeg():
     """Verifica si FFmpeg está instalado"""
@@ -67,9 +68,19 @@ def parse_srt_time(time_str):
         print(f"Error parseando tiempo '{time_str}': {e}")
         return 0
 
-def extraer_escena(video_path, start_time_sec, duration_sec, output_path):
+def extraer_escena(video_path, start_time_sec, duration_sec, output_path, indice=None):
     """Extrae una escena usando FFmpeg"""
     
+    # La recompresión no necesita keyframes: corta en el tiempo pedido
+    original_formatted = formatear_tiempo_ffmpeg(start_time_sec)
+    original_duration = duration_sec
+
+    # Con índice, alinear el inicio al keyframe anterior para que la copia directa sea limpia
+    if indice and indice['keyframes_t']:
+        keyframe = keyframe_anterior(indice, start_time_sec)
+        duration_sec += start_time_sec - keyframe
+        start_time_sec = keyframe
+    
     # Formatear tiempos correctamente
     start_formatted = formatear_tiempo_ffmpeg(start_time_sec)
     
@@ -91,9 +102,9 @@ def extraer_escena(video_path, start_time_sec, duration_sec, output_path):
     # Método alternativo si falla (recompresión)
     cmd_alt = [
         'ffmpeg',
-        '-ss', start_formatted,
+        '-ss', original_formatted,
         '-i', video_path,
-        '-t', str(duration_sec),
+        '-t', str(original_duration),
         '-c:v', 'libx264',
         '-preset', 'fast',
         '-crf', '23',
@@ -269,6 +280,9 @@ def main():
     carpeta_salida = Path("escenas_extraidas")
     carpeta_salida.mkdir(exist_ok=True)
     
+    # Indexar el video una sola vez (se reutiliza en siguientes ejecuciones)
+    indice = obtener_indice(str(video_path))
+    
     print(f"\n● Procesando {len(bloques)} escenas")
     print(f"● Carpeta de salida: {carpeta_salida}")
     print("-" * 60 + "\n")
@@ -299,7 +313,7 @@ def main():
         output_path = carpeta_salida / nombre_archivo
         
         # Extraer escena
-        if extraer_escena(str(video_path), inicio_sec, duracion, str(output_path)):
+        if extraer_escena(str(video_path), inicio_sec, duracion, str(output_path), indice):
             exitosos += 1
             print(f"  ✓ Extraído: {nombre_archivo}")
         else:
@@ -2,6 +2,7 @@
 import subprocess
 import re
 import sys
+from indiceVideo import obtener_indice, keyframe_anterior
 
 def parse_srt_time(time_str):
     """Convierte tiempo SRT (00:00:00,000) a segundos"""
@@ -32,6 +33,9 @@ def extract_scenes_with_ffmpeg(video_file, srt_file, output_prefix="escena"):
     
     print(f"Encontrados {len(blocks)} bloques de subtítulos")
     
+    # Índice de keyframes (se genera una vez por video)
+    indice = obtener_indice(video_file)
+    
     for i, block in enumerate(blocks):
         idx, start_time, end_time, text = block
         
@@ -44,6 +48,15 @@ def extract_scenes_with_ffmpeg(video_file, srt_file, output_prefix="escena"):
         end_sec = parse_srt_time(end_time)
         duration = end_sec - start_sec
         
+        # Empezar en el keyframe anterior para que '-c copy' no corte a mitad de GOP
+        # (la recompresión de respaldo usa el inicio pedido: no necesita keyframes)
+        original_ff = f"{int(start_sec//3600):02d}:{int((start_sec%3600)//60):02d}:{start_sec%60:06.3f}"
+        original_duration = duration
+        if indice and indice['keyframes_t']:
+            keyframe = keyframe_anterior(indice, start_sec)
+            duration += start_sec - keyframe
+            start_sec = keyframe
+        
         # Formatear tiempo para FFmpeg (HH:MM:SS.MMM)
         start_ff = f"{int(start_sec//3600):02d}:{int((start_sec%3600)//60):02d}:{start_sec%60:06.3f}"
         
@@ -75,9 +88,9 @@ def extract_scenes_with_ffmpeg(video_file, srt_file, output_prefix="escena"):
             # Intentar con recompresión si falla
             cmd_alt = [
                 'ffmpeg',
-                '-ss', start_ff,
+                '-ss', original_ff,
                 '-i', video_file,
-                '-t', str(duration),
+                '-t', str(original_duration),
                 output_file
             ]
             try:
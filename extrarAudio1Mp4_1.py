@@ -1,62 +1,160 @@
 import pysrt
 import subprocess
+import re
 import os
+import sys
+from indiceVideo import obtener_indice, keyframe_anterior
 
 # Configuración
 video =  'primeros_10min.mp4' ##'The.Matrix.1999.mp4'
 subs = pysrt.open('The Matrix (1999)-en.srt')
 
+# Modo de exportación:
+#   "concat"   -> una entrada inpoint/outpoint por subtítulo (modo original, lento)
+#   "supercut" -> une rangos cercanos y genera el video en una sola pasada con select/aselect
+#   "copia"    -> une rangos, los alinea a keyframes y copia sin recodificar (rápido, cortes aproximados)
+MODO_EXPORTACION = "supercut"
+MAX_SEPARACION_SUPERCUT = 0.5  # Rangos separados por menos de esto (segundos) se unen
+PRESET_X264 = 'veryfast'       # 'ultrafast' / 'superfast' / 'veryfast' para exportar rápido, 'medium' para calidad
+CRF_X264 = '23'
+
 # Crear archivo de lista para FFmpeg
 list_file = 'lista_video.txt'
+filtro_file = 'filtro_supercut.txt'
+
+
+def fusionar_rangos(rangos, max_separacion=MAX_SEPARACION_SUPERCUT):
+    """Ordena y une rangos (inicio, fin) que se solapan o están separados menos de max_separacion"""
+    fusionados = []
+    for inicio, fin in sorted(rangos):
+        if fusionados and inicio - fusionados[-1][1] <= max_separacion:
+            fusionados[-1][1] = max(fusionados[-1][1], fin)
+        else:
+            fusionados.append([inicio, fin])
+    return [(inicio, fin) for inicio, fin in fusionados]
+
+
+def escribir_filtro_supercut(rangos, ruta):
+    """Escribe el filtergraph select/aselect que conserva solo los rangos dados"""
+    condicion = '+'.join(f'between(t,{inicio:.3f},{fin:.3f})' for inicio, fin in rangos)
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(f"[0:v]select='{condicion}',setpts=N/FRAME_RATE/TB[v];\n")
+        f.write(f"[0:a]aselect='{condicion}',asetpts=N/SR/TB[a]\n")
+
 
-print(f"Procesando {len(subs)} subtítulos para un solo archivo...")
-
-# Crear el archivo de lista con todos los segmentos
-with open(list_file, 'w', encoding='utf-8') as f:
-    for i, sub in enumerate(subs):
-        start = sub.start.to_time()
-        
-        # Convertir a formato FFmpeg
-        start_str = f'{start.hour:02}:{start.minute:02}:{start.second:02}.{start.microsecond//1000:03}'
-        
-        # Calcular el punto final
-        end = sub.end.to_time()
-        end_str = f'{end.hour:02}:{end.minute:02}:{end.second:02}.{end.microsecond//1000:03}'
-        
-        # Escribir en el archivo de lista
-        f.write(f"file '{os.path.abspath(video)}'\n")
-        f.write(f"inpoint {start_str}\n")
-        f.write(f"outpoint {end_str}\n")
-        
-        # Mostrar progreso cada 10 subtítulos
-        if (i + 1) % 10 == 0:
-            print(f"Procesados: {i + 1}/{len(subs)} subtítulos")
+def opcion_filtro_desde_archivo():
+    """'-/filter_complex' en ffmpeg >= 7 (donde -filter_complex_script está obsoleto); si no, la opción clásica"""
+    result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True)
+    version = re.search(r'version n?(\d+)\.', result.stdout)
+    return '-/filter_complex' if version and int(version.group(1)) >= 7 else '-filter_complex_script'
+
+
+rangos = [(sub.start.ordinal / 1000.0, sub.end.ordinal / 1000.0) for sub in subs]
 
 # Archivo de salida final
 output = 'todos_los_subtitulos_combinados_10m.mp4'
 
-print(f"\nCombinando todos los segmentos en '{output}'...")
-
-# Comando para combinar TODO en un solo archivo
-cmd = [
-    'ffmpeg',
-    '-f', 'concat',
-    '-safe', '0',
-    '-i', list_file,
-    '-c:v', 'libx264',      # Codec de video
-    '-c:a', 'aac',          # Codec de audio
-    '-crf', '23',           # Calidad (18-28, más bajo = mejor)
-    '-preset', 'medium',    # Velocidad de encoding
-    '-y',                   # Sobrescribir
-    output
-]
+if MODO_EXPORTACION == "concat":
+    print(f"Procesando {len(subs)} subtítulos para un solo archivo...")
+
+    # Crear el archivo de lista con todos los segmentos
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for i, sub in enumerate(subs):
+            start = sub.start.to_time()
+
+            # Convertir a formato FFmpeg
+            start_str = f'{start.hour:02}:{start.minute:02}:{start.second:02}.{start.microsecond//1000:03}'
+
+            # Calcular el punto final
+            end = sub.end.to_time()
+            end_str = f'{end.hour:02}:{end.minute:02}:{end.second:02}.{end.microsecond//1000:03}'
+
+            # Escribir en el archivo de lista
+            f.write(f"file '{os.path.abspath(video)}'\n")
+            f.write(f"inpoint {start_str}\n")
+            f.write(f"outpoint {end_str}\n")
+
+            # Mostrar progreso cada 10 subtítulos
+            if (i + 1) % 10 == 0:
+                print(f"Procesados: {i + 1}/{len(subs)} subtítulos")
+
+    print(f"\nCombinando todos los segmentos en '{output}'...")
+
+    # Comando para combinar TODO en un solo archivo
+    cmd = [
+        'ffmpeg',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', list_file,
+        '-c:v', 'libx264',      # Codec de video
+        '-c:a', 'aac',          # Codec de audio
+        '-crf', CRF_X264,       # Calidad (18-28, más bajo = mejor)
+        '-preset', PRESET_X264, # Velocidad de encoding
+        '-y',                   # Sobrescribir
+        output
+    ]
+    temporal = list_file
+
+elif MODO_EXPORTACION == "supercut":
+    rangos_unidos = fusionar_rangos(rangos)
+    print(f"Supercut: {len(subs)} subtítulos -> {len(rangos_unidos)} rangos")
+
+    # Un solo demux del video: select/aselect conserva los rangos y reordena timestamps
+    escribir_filtro_supercut(rangos_unidos, filtro_file)
+
+    cmd = [
+        'ffmpeg',
+        '-i', video,
+        opcion_filtro_desde_archivo(), filtro_file,
+        '-map', '[v]',
+        '-map', '[a]',
+        '-c:v', 'libx264',
+        '-crf', CRF_X264,
+        '-preset', PRESET_X264,
+        '-c:a', 'aac',
+        '-y',
+        output
+    ]
+    temporal = filtro_file
+
+else:
+    # Copia directa: cada rango empieza en su keyframe anterior, sin recodificar
+    indice = obtener_indice(video)
+    if indice is None:
+        print("❌ No se pudo indexar el video: la copia sin recodificar necesita los keyframes (usa el modo supercut)")
+        sys.exit(1)
+    rangos_unidos = fusionar_rangos(
+        [(keyframe_anterior(indice, inicio), fin) for inicio, fin in rangos]
+    )
+    print(f"Copia: {len(subs)} subtítulos -> {len(rangos_unidos)} rangos alineados a keyframes")
+
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for inicio, fin in rangos_unidos:
+            f.write(f"file '{os.path.abspath(video)}'\n")
+            f.write(f"inpoint {inicio:.3f}\n")
+            f.write(f"outpoint {fin:.3f}\n")
+
+    cmd = [
+        'ffmpeg',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', list_file,
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        '-y',
+        output
+    ]
+    temporal = list_file
 
 # Ejecutar
-subprocess.run(cmd)
+result = subprocess.run(cmd)
 
 # Limpiar archivo temporal
-os.remove(list_file)
+os.remove(temporal)
 
-print(f"\n✅ ¡Combinación exitosa!")
-print(f"   Archivo final: {output}")
-print(f"   Subtítulos combinados: {len(subs)}")
\ No newline at end of file
+if result.returncode == 0:
+    print(f"\n✅ ¡Combinación exitosa!")
+    print(f"   Archivo final: {output}")
+    print(f"   Subtítulos combinados: {len(subs)}")
+else:
+    print(f"\n❌ Error en la combinación (ffmpeg terminó con código {result.returncode})")
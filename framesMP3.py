@@ -0,0 +1,84 @@
+# Segmentación de streams MP3 por frames leyendo sus cabeceras (sin decodificar nada).
+# Módulo hoja: lo usan el render incremental, los decodificadores persistentes de ffmpeg y el
+# decodificador incremental de codecAudio, que no pueden importarse entre sí
+# (codecAudio -> trabajadoresFFmpeg -> renderIncremental -> codecAudio).
+
+RETARDO_DECODIFICADOR = 529       # Muestras que ffmpeg suma al retardo del codificador (cabecera LAME)
+
+# Tablas de cabecera MPEG audio (Layer III)
+_BITRATES = {
+    3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],     # MPEG-2
+    0: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],     # MPEG-2.5
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def dividir_frames_mp3(datos):
+    """Divide un stream MP3 (sin ID3 ni Xing) en la lista de sus frames (bytes)"""
+    frames = []
+    i = 0
+    while i + 4 <= len(datos):
+        cabecera = int.from_bytes(datos[i:i + 4], 'big')
+        if (cabecera >> 21) & 0x7FF != 0x7FF:
+            i += 1  # Basura entre frames: buscar la siguiente sincronización
+            continue
+        version = (cabecera >> 19) & 0x3
+        indice_bitrate = (cabecera >> 12) & 0xF
+        indice_sr = (cabecera >> 10) & 0x3
+        relleno = (cabecera >> 9) & 0x1
+        if version == 1 or indice_bitrate in (0, 15) or indice_sr == 3:
+            i += 1
+            continue
+
+        bitrate = _BITRATES[version][indice_bitrate] * 1000
+        sample_rate = _SAMPLE_RATES[version][indice_sr]
+        coeficiente = 144 if version == 3 else 72
+        largo = coeficiente * bitrate // sample_rate + relleno
+        frames.append(datos[i:i + largo])
+        i += largo
+    return frames
+
+
+def formato_frame_mp3(frame):
+    """(sample_rate, canales, muestras por frame, largo en bytes) según la cabecera de un frame"""
+    cabecera = int.from_bytes(frame[:4], 'big')
+    version = (cabecera >> 19) & 0x3
+    bitrate = _BITRATES[version][(cabecera >> 12) & 0xF] * 1000
+    sample_rate = _SAMPLE_RATES[version][(cabecera >> 10) & 0x3]
+    canales = 1 if (cabecera >> 6) & 0x3 == 3 else 2
+    coeficiente = 144 if version == 3 else 72
+    largo = coeficiente * bitrate // sample_rate + ((cabecera >> 9) & 0x1)
+    return sample_rate, canales, 1152 if version == 3 else 576, largo
+
+
+def largo_id3(datos):
+    """Bytes de la etiqueta ID3v2 al principio de datos (0 si no hay; hacen falta los 10 de su cabecera)"""
+    if datos[:3] == b'ID3' and len(datos) >= 10:
+        largo = (datos[6] << 21) | (datos[7] << 14) | (datos[8] << 7) | datos[9]
+        return 10 + largo + (10 if datos[5] & 0x10 else 0)
+    return 0
+
+
+def quitar_id3(datos):
+    return datos[largo_id3(datos):]
+
+
+def cabecera_xing(frame):
+    """
+    Si el frame es una cabecera Xing/Info (no lleva audio): (frames declarados o None, retardo,
+    relleno) en muestras según la cabecera LAME (0, 0 si no la tiene). Si es un frame normal: None.
+    """
+    posicion = max(frame.find(b'Xing', 4, 48), frame.find(b'Info', 4, 48))
+    if posicion < 0:
+        return None
+    banderas = int.from_bytes(frame[posicion + 4:posicion + 8], 'big')
+    i = posicion + 8
+    frames = int.from_bytes(frame[i:i + 4], 'big') if banderas & 1 else None
+    for bit, largo in ((1, 4), (2, 4), (4, 100), (8, 4)):
+        if banderas & bit:
+            i += largo
+    if frame[i:i + 4] not in (b'LAME', b'Lavf', b'Lavc') or len(frame) < i + 24:
+        return frames, 0, 0
+    x = frame[i + 21:i + 24]
+    return frames, (x[0] << 4) | (x[1] >> 4), ((x[1] & 0xF) << 8) | x[2]
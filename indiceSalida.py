@@ -0,0 +1,136 @@
+import numpy as np
+import json
+import os
+import planRender
+from espacioTrabajo import escritura_atomica
+
+# Idioma de cada tipo de segmento (None = tono / silencio / sin texto)
+IDIOMA_TIPO = {
+    planRender.TIPO_TTS_EN: "en",
+    planRender.TIPO_TTS_ES: "es",
+}
+
+# Un registro por segmento de la salida, ordenado por inicio
+DTYPE_SEGMENTO = np.dtype([
+    ('inicio', '<f8'),     # Segundos en el archivo de salida
+    ('duracion', '<f8'),   # Segundos
+    ('grupo', '<i4'),      # -1 si no pertenece a ningún grupo
+    ('tipo', 'u1'),        # planRender.TIPO_*
+])
+
+
+def ruta_indice(salida, formato="json"):
+    """Sidecar junto a la salida: salida_final.mp3 -> salida_final.indice.json"""
+    return f"{os.path.splitext(salida)[0]}.indice.{formato}"
+
+
+def construir_indice(plan, mapa=None):
+    """
+    Segmentos (DTYPE_SEGMENTO) y metadatos de grupo a partir del plan.
+    mapa: (inicios_plan, inicios_salida) en frames, si la salida no conserva la línea de
+    tiempo del plan (p. ej. bloques MP3 rellenados a 1152 muestras); None = idéntica.
+    """
+    r = plan.registros
+    r = r[np.argsort(r['destino'], kind='stable')]
+    destinos = r['destino'].astype(np.int64)
+
+    if mapa is not None:
+        inicios_plan, inicios_salida = (np.asarray(m, dtype=np.int64) for m in mapa)
+        k = np.searchsorted(inicios_plan, destinos, side='right') - 1
+        destinos = destinos - inicios_plan[k] + inicios_salida[k]
+
+    segmentos = np.zeros(len(r), dtype=DTYPE_SEGMENTO)
+    segmentos['inicio'] = destinos / plan.sample_rate
+    segmentos['duracion'] = r['largo'] / plan.sample_rate
+    segmentos['grupo'] = r['grupo']
+    segmentos['tipo'] = r['tipo']
+
+    grupos = {}
+    for g, datos in plan.grupos.items():
+        grupos[int(g)] = {
+            'cues': list(datos.get('cues', [])),
+            'textos': dict(datos.get('textos', {})),
+        }
+    return segmentos, grupos
+
+
+def escribir_indice(plan, salida, mapa=None, formatos=("json", "npz")):
+    """Escribe el índice de la salida (JSON para el reproductor y/o NPZ compacto). Devuelve las rutas"""
+    segmentos, grupos = construir_indice(plan, mapa)
+    rutas = []
+
+    if "json" in formatos:
+        datos = {
+            'archivo': os.path.basename(salida),
+            'campos': ['inicio', 'duracion', 'grupo', 'tipo'],
+            'tipos': {str(t): nombre for t, nombre in planRender.NOMBRES_TIPO.items()},
+            'segmentos': [[round(float(s['inicio']), 4), round(float(s['duracion']), 4),
+                           int(s['grupo']), int(s['tipo'])] for s in segmentos],
+            'grupos': {str(g): v for g, v in grupos.items()},
+        }
+        ruta = ruta_indice(salida, "json")
+        with escritura_atomica(ruta) as temporal, open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False, separators=(',', ':'))
+        rutas.append(ruta)
+
+    if "npz" in formatos:
+        meta = {'archivo': os.path.basename(salida), 'grupos': {str(g): v for g, v in grupos.items()}}
+        ruta = ruta_indice(salida, "npz")
+        with escritura_atomica(ruta) as temporal, open(temporal, 'wb') as f:
+            np.savez_compressed(f, segmentos=segmentos, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        rutas.append(ruta)
+    return rutas
+
+
+class IndiceSalida:
+    """Índice cargado de un sidecar; búsqueda tiempo -> segmento/cue en O(log n)"""
+
+    def __init__(self, segmentos, grupos):
+        self.segmentos = segmentos
+        self.grupos = grupos
+        self._fines = segmentos['inicio'] + segmentos['duracion']
+
+    @classmethod
+    def cargar(cls, ruta):
+        if ruta.endswith('.npz'):
+            with np.load(ruta) as datos:
+                segmentos = datos['segmentos']
+                meta = json.loads(str(datos['meta']))
+            grupos = meta['grupos']
+        else:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            segmentos = np.array([tuple(s) for s in datos['segmentos']], dtype=DTYPE_SEGMENTO)
+            grupos = datos['grupos']
+        return cls(segmentos, {int(g): v for g, v in grupos.items()})
+
+    def segmento_en(self, tiempo):
+        """Índice del segmento que suena en 'tiempo' (segundos), o None"""
+        i = int(np.searchsorted(self.segmentos['inicio'], tiempo, side='right')) - 1
+        if i < 0 or tiempo >= self._fines[i]:
+            return None
+        return i
+
+    def cue_en(self, tiempo):
+        """
+        Qué se oye en 'tiempo': {'grupo', 'cues', 'idioma', 'texto', 'inicio', 'fin'} o None
+        si es un tono/silencio fuera de cualquier grupo.
+        """
+        i = self.segmento_en(tiempo)
+        if i is None:
+            return None
+        s = self.segmentos[i]
+        g = int(s['grupo'])
+        if g < 0:
+            return None
+
+        datos = self.grupos.get(g, {})
+        idioma = IDIOMA_TIPO.get(int(s['tipo']))
+        return {
+            'grupo': g,
+            'cues': datos.get('cues', []),
+            'idioma': idioma,
+            'texto': datos.get('textos', {}).get(idioma) if idioma else None,
+            'inicio': float(s['inicio']),
+            'fin': float(self._fines[i]),
+        }
@@ -0,0 +1,210 @@
+import subprocess
+import hashlib
+import bisect
+import json
+import os
+import sys
+from espacioTrabajo import temporal_unico
+
+# Configuración
+DIR_INDICES = "indices_video"
+BYTES_HASH = 4 * 1024 * 1024  # Se hashean los primeros y últimos 4 MB (más el tamaño)
+VERSION_INDICE = 2  # 2: ya no se guardan índices con la lectura de paquetes fallida
+
+
+def hash_video(video_path):
+    """Hash rápido del video: tamaño + primeros y últimos BYTES_HASH bytes"""
+    tamano = os.path.getsize(video_path)
+    h = hashlib.sha1(str(tamano).encode())
+    with open(video_path, 'rb') as f:
+        h.update(f.read(BYTES_HASH))
+        if tamano > BYTES_HASH:
+            f.seek(max(BYTES_HASH, tamano - BYTES_HASH))
+            h.update(f.read(BYTES_HASH))
+    return h.hexdigest()
+
+
+def ruta_indice(video_path, dir_indices=DIR_INDICES, hash_archivo=None):
+    """Ruta del archivo sidecar del índice para un video (hash_archivo: hash_video ya calculado)"""
+    return os.path.join(dir_indices, f"{hash_archivo or hash_video(video_path)}.json")
+
+
+def _leer_paquetes(video_path, selector, campos):
+    """Lee los paquetes de un stream con ffprobe (formato compact clave=valor); None si ffprobe falla"""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', selector,
+        '-show_entries', 'packet=' + ','.join(campos),
+        '-of', 'compact=p=0',
+        video_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"❌ Error leyendo paquetes ({selector}): {result.stderr[:200]}")
+        return None
+
+    paquetes = []
+    for linea in result.stdout.splitlines():
+        valores = dict(par.split('=', 1) for par in linea.strip().split('|') if '=' in par)
+        if valores.get('pts_time', 'N/A') == 'N/A' or valores.get('pos', 'N/A') == 'N/A':
+            continue
+        paquetes.append(valores)
+    return paquetes
+
+
+def generar_indice(video_path, dir_indices=DIR_INDICES, hash_archivo=None):
+    """
+    Recorre el video una sola vez y guarda keyframes, paquetes de audio e info de streams.
+    hash_archivo: hash_video ya calculado por quien llama (evita leer otra vez el principio y el final)
+    """
+    print(f"🔎 Indexando {os.path.basename(video_path)}...")
+
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json',
+           '-show_format', '-show_streams', video_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"❌ No se pudo leer la información del video: {video_path}")
+        return None
+    info = json.loads(result.stdout)
+
+    streams = []
+    for stream in info.get('streams', []):
+        streams.append({
+            'index': stream.get('index'),
+            'tipo': stream.get('codec_type'),
+            'codec': stream.get('codec_name'),
+            'sample_rate': stream.get('sample_rate'),
+            'canales': stream.get('channels'),
+            'ancho': stream.get('width'),
+            'alto': stream.get('height'),
+            'fps': stream.get('avg_frame_rate'),
+        })
+
+    # Keyframes del primer stream de video
+    keyframes_t = []
+    keyframes_pos = []
+    paquetes_video = _leer_paquetes(video_path, 'v:0', ['pts_time', 'pos', 'flags'])
+    for p in paquetes_video or []:
+        if 'K' in p.get('flags', ''):
+            keyframes_t.append(round(float(p['pts_time']), 3))
+            keyframes_pos.append(int(p['pos']))
+
+    # Paquetes del primer stream de audio
+    audio_t = []
+    audio_pos = []
+    paquetes_audio = _leer_paquetes(video_path, 'a:0', ['pts_time', 'pos'])
+    for p in paquetes_audio or []:
+        audio_t.append(round(float(p['pts_time']), 3))
+        audio_pos.append(int(p['pos']))
+
+    # ffprobe lista los paquetes en orden de decodificación
+    if keyframes_t:
+        keyframes_t, keyframes_pos = map(list, zip(*sorted(zip(keyframes_t, keyframes_pos))))
+    if audio_t:
+        audio_t, audio_pos = map(list, zip(*sorted(zip(audio_t, audio_pos))))
+
+    indice = {
+        'version': VERSION_INDICE,
+        'hash': hash_archivo or hash_video(video_path),
+        'video': os.path.basename(video_path),
+        'tamano': os.path.getsize(video_path),
+        'duracion': float(info.get('format', {}).get('duration', 0) or 0),
+        'streams': streams,
+        'keyframes_t': keyframes_t,
+        'keyframes_pos': keyframes_pos,
+        'audio_t': audio_t,
+        'audio_pos': audio_pos,
+    }
+
+    if paquetes_video is None or paquetes_audio is None:
+        # Un índice incompleto no se guarda: el sidecar se reutilizaría para siempre
+        print("⚠️  Índice incompleto (falló la lectura de paquetes): se usa sin guardarlo")
+        return indice
+
+    os.makedirs(dir_indices, exist_ok=True)
+    salida = os.path.join(dir_indices, f"{indice['hash']}.json")
+    temporal = temporal_unico(salida)
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(indice, f, separators=(',', ':'))
+    os.replace(temporal, salida)
+
+    print(f"✅ Índice creado: {salida} ({len(keyframes_t)} keyframes, {len(audio_t)} paquetes de audio)")
+    return indice
+
+
+def obtener_indice(video_path, dir_indices=DIR_INDICES):
+    """Carga el índice del video desde su sidecar, generándolo si no existe"""
+    hash_archivo = hash_video(video_path)
+    ruta = ruta_indice(video_path, dir_indices, hash_archivo)
+    if os.path.exists(ruta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            indice = json.load(f)
+        if indice.get('version') == VERSION_INDICE:
+            return indice
+    return generar_indice(video_path, dir_indices, hash_archivo)
+
+
+def keyframe_anterior(indice, segundos):
+    """Último keyframe en o antes de `segundos` (0.0 si es anterior al primero; `segundos` si no hay keyframes)"""
+    tiempos = indice['keyframes_t']
+    if not tiempos:
+        return segundos
+    i = bisect.bisect_right(tiempos, segundos) - 1
+    return tiempos[i] if i >= 0 else 0.0
+
+
+def keyframe_siguiente(indice, segundos):
+    """Primer keyframe en o después de `segundos` (duración total si es posterior al último; `segundos` si no hay keyframes)"""
+    tiempos = indice['keyframes_t']
+    if not tiempos:
+        return segundos
+    i = bisect.bisect_left(tiempos, segundos)
+    return tiempos[i] if i < len(tiempos) else indice['duracion']
+
+
+def rango_a_keyframes(indice, inicio, fin):
+    """Keyframes que encierran el rango [inicio, fin]"""
+    return keyframe_anterior(indice, inicio), keyframe_siguiente(indice, fin)
+
+
+def rango_a_bytes(indice, inicio, fin, flujo="video"):
+    """
+    Convierte un rango de tiempo a offsets de bytes en el contenedor.
+    flujo: "video" usa los keyframes (seek limpio), "audio" los paquetes de audio.
+    """
+    if flujo == "audio":
+        tiempos, posiciones = indice['audio_t'], indice['audio_pos']
+    else:
+        tiempos, posiciones = indice['keyframes_t'], indice['keyframes_pos']
+
+    if not tiempos:
+        return 0, indice['tamano']
+
+    i = max(0, bisect.bisect_right(tiempos, inicio) - 1)
+    j = bisect.bisect_left(tiempos, fin)
+    byte_inicio = posiciones[i]
+    byte_fin = posiciones[j] if j < len(posiciones) else indice['tamano']
+    return byte_inicio, byte_fin
+
+
+if __name__ == "__main__":
+    # Uso: python indiceVideo.py video.mp4 [inicio fin]
+    if len(sys.argv) < 2:
+        print("Uso: python indiceVideo.py <video> [inicio_seg fin_seg]")
+        sys.exit(1)
+
+    indice = obtener_indice(sys.argv[1])
+    if indice is None:
+        sys.exit(1)
+
+    print(f"Duración: {indice['duracion']:.2f}s")
+    print(f"Keyframes: {len(indice['keyframes_t'])}")
+    print(f"Paquetes de audio: {len(indice['audio_t'])}")
+
+    if len(sys.argv) >= 4:
+        inicio, fin = float(sys.argv[2]), float(sys.argv[3])
+        kf_ini, kf_fin = rango_a_keyframes(indice, inicio, fin)
+        print(f"Keyframes: {kf_ini:.3f} -> {kf_fin:.3f}")
+        print(f"Bytes video: {rango_a_bytes(indice, inicio, fin)}")
+        print(f"Bytes audio: {rango_a_bytes(indice, inicio, fin, flujo='audio')}")
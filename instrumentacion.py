@@ -0,0 +1,98 @@
+import subprocess
+import threading
+import json
+import time
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+# Registro global del proceso (los hilos del lote comparten el mismo)
+_lock = threading.Lock()
+_tiempos = {}      # nombre -> [llamadas, segundos totales, máximo]
+_contadores = {}   # nombre -> valor
+_inicio = time.perf_counter()
+_inicio_fecha = datetime.now()
+
+
+def reiniciar():
+    """Vacía el registro (al empezar una ejecución nueva en el mismo proceso)"""
+    global _inicio, _inicio_fecha
+    with _lock:
+        _tiempos.clear()
+        _contadores.clear()
+        _inicio = time.perf_counter()
+        _inicio_fecha = datetime.now()
+
+
+@contextmanager
+def medir(nombre):
+    """Cronometra el bloque y lo acumula bajo 'nombre' (también si lanza una excepción)"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        transcurrido = time.perf_counter() - t0
+        with _lock:
+            registro = _tiempos.setdefault(nombre, [0, 0.0, 0.0])
+            registro[0] += 1
+            registro[1] += transcurrido
+            registro[2] = max(registro[2], transcurrido)
+
+
+def contar(nombre, cantidad=1):
+    """Suma 'cantidad' al contador 'nombre' (llamadas, bytes, aciertos de caché...)"""
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + cantidad
+
+
+def contar_bytes(nombre, ruta):
+    """Suma el tamaño del archivo al contador bytes.<nombre> (si existe)"""
+    if ruta and os.path.exists(ruta):
+        contar(f"bytes.{nombre}", os.path.getsize(ruta))
+
+
+def ejecutar(cmd, **kwargs):
+    """subprocess.run contando lanzamientos y tiempo por programa (ffmpeg, ffprobe...)"""
+    programa = os.path.splitext(os.path.basename(cmd[0]))[0]
+    contar(f"subprocesos.{programa}")
+    with medir(f"subproceso.{programa}"):
+        return subprocess.run(cmd, **kwargs)
+
+
+def instantanea():
+    """Copia del registro como dict serializable"""
+    with _lock:
+        return {
+            'inicio': _inicio_fecha.isoformat(timespec='seconds'),
+            'duracion': round(time.perf_counter() - _inicio, 3),
+            'tiempos': {n: {'llamadas': r[0], 'total': round(r[1], 4), 'max': round(r[2], 4)}
+                        for n, r in sorted(_tiempos.items())},
+            'contadores': dict(sorted(_contadores.items())),
+        }
+
+
+def exportar_json(ruta):
+    """Escribe la instantánea en JSON y devuelve la ruta"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(instantanea(), f, indent=2, ensure_ascii=False)
+    return ruta
+
+
+def resumen():
+    """Tabla de texto: tiempo por etapa (con % de la ejecución) y contadores"""
+    datos = instantanea()
+    duracion = max(datos['duracion'], 1e-9)
+    lineas = [f"=== Instrumentación ({datos['duracion']:.1f}s) ===",
+              f"{'etapa':<28}{'llamadas':>9}{'total s':>10}{'media ms':>10}{'máx ms':>10}{'%':>7}"]
+    for nombre, t in sorted(datos['tiempos'].items(), key=lambda x: -x[1]['total']):
+        media = t['total'] / t['llamadas'] * 1000 if t['llamadas'] else 0.0
+        lineas.append(f"{nombre:<28}{t['llamadas']:>9}{t['total']:>10.2f}{media:>10.1f}"
+                      f"{t['max'] * 1000:>10.1f}{t['total'] / duracion * 100:>6.1f}%")
+    if datos['contadores']:
+        lineas.append(f"{'contador':<28}{'valor':>9}")
+        for nombre, valor in datos['contadores'].items():
+            if nombre.startswith('bytes.'):
+                lineas.append(f"{nombre:<28}{valor / 1024 / 1024:>9.1f} MB")
+            else:
+                lineas.append(f"{nombre:<28}{valor:>9}")
+    return '\n'.join(lineas)
@@ -0,0 +1,284 @@
+import json
+import os
+import sys
+import time
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import unirBloques_3a_edge as pipeline
+from catalogo import Catalogo, registrar_resultado, EN_CURSO, HECHO, ERROR
+from espacioTrabajo import EspacioTrabajo, TrabajoEnCurso
+import instrumentacion
+
+# Concurrencia por etapa (cada etapa tiene su propio pool):
+#   parse   -> leer SRT/ZIP y agrupar (rápido)
+#   extract -> demuxear el audio y cortar los grupos (disco / ffmpeg)
+#   tts     -> una tarea por grupo; casi todo es espera de red
+#              (el límite real de peticiones lo ajusta pipeline.cliente_tts sobre la marcha)
+#   render  -> plan + codificación (ya reparte la codificación MP3 en procesos)
+CONCURRENCIA = {
+    "parse": 2,
+    "extract": 2,
+    "tts": 16,
+    "render": 1,
+}
+ETAPAS = ("parse", "extract", "tts", "render")
+
+# Manifiesto (JSON):
+# {
+#   "concurrencia": {"tts": 16},             <- opcional, sobrescribe CONCURRENCIA
+#   "peliculas": [
+#     {
+#       "video": "The.Matrix.1999.mp4",
+#       "srt_en": "matrix.en.srt",             <- .srt o .zip con un .srt dentro
+#       "srt_es": "matrix.es.zip",
+#       "voz_en": "en-CA-LiamNeural",           <- opcional
+#       "voz_es": "es-AR-ElenaNeural",          <- opcional
+#       "salida": "salidas/matrix"              <- opcional (por defecto salidas/<nombre del video>)
+#     }
+#   ]
+# }
+
+
+class EstadisticasEtapa:
+    """Tiempo ocupado, tareas y grupos procesados de una etapa (seguro entre hilos)"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.tareas = 0
+        self.grupos = 0
+        self.errores = 0
+        self.ocupado = 0.0
+        self.primero = None
+        self.ultimo = None
+        self._lock = threading.Lock()
+
+    def registrar(self, inicio, fin, grupos=0, error=False):
+        with self._lock:
+            self.tareas += 1
+            self.grupos += grupos
+            self.errores += int(error)
+            self.ocupado += fin - inicio
+            self.primero = inicio if self.primero is None else min(self.primero, inicio)
+            self.ultimo = fin if self.ultimo is None else max(self.ultimo, fin)
+
+    @property
+    def reloj(self):
+        """Segundos de pared entre la primera tarea que empezó y la última que terminó"""
+        return (self.ultimo - self.primero) if self.primero is not None else 0.0
+
+    def resumen(self):
+        reloj = self.reloj
+        por_segundo = self.grupos / reloj if reloj > 0 else 0.0
+        return (f"{self.nombre:<8} tareas={self.tareas:<5} grupos={self.grupos:<6} errores={self.errores:<3} "
+                f"ocupado={self.ocupado:8.1f}s reloj={reloj:8.1f}s -> {por_segundo:7.2f} grupos/s")
+
+
+def cargar_manifiesto(ruta):
+    """Lee el manifiesto y completa los valores por defecto de cada película"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        manifiesto = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(ruta))
+    peliculas = []
+    for p in manifiesto['peliculas']:
+        nombre = os.path.splitext(os.path.basename(p['video']))[0]
+        peliculas.append({
+            'nombre': nombre,
+            'video': os.path.join(base, p['video']),
+            'srt_en': os.path.join(base, p['srt_en']),
+            'srt_es': os.path.join(base, p['srt_es']),
+            'voces': {1: p.get('voz_en', pipeline.TTS_VOICE_EN), 2: p.get('voz_es', pipeline.TTS_VOICE_ES)},
+            'salida': os.path.join(base, p.get('salida', os.path.join('salidas', nombre))),
+        })
+    concurrencia = dict(CONCURRENCIA)
+    concurrencia.update(manifiesto.get('concurrencia', {}))
+    return peliculas, concurrencia
+
+
+# ---------- trabajo de cada etapa ----------
+
+def etapa_parse(pelicula, catalogo=None):
+    subs = pipeline.cargar_subtitulos(pelicula['srt_en'])
+    subs_es = pipeline.cargar_subtitulos(pelicula['srt_es'])
+    grupos = pipeline.agrupar_subtitulos(subs)
+    os.makedirs(pelicula['salida'], exist_ok=True)
+    pelicula['subs'] = subs
+    # El formato de los cortes (WAV del almacén o MP3) se decide al extraer; aquí solo textos y tiempos
+    pelicula['grupos_render'] = pipeline.preparar_grupos(subs, subs_es, grupos, pelicula['salida'],
+                                                         usar_wav=pipeline.USAR_ALMACEN_PCM,
+                                                         lim_muestra=pipeline.LIM_MUESTRA)
+    if catalogo:
+        catalogo.guardar_cues(pelicula['id'], "en", subs)
+        catalogo.guardar_cues(pelicula['id'], "es", subs_es)
+        catalogo.guardar_grupos(pelicula['id'], pelicula['grupos_render'])
+    return len(pelicula['grupos_render'])
+
+
+def etapa_extract(pelicula):
+    audio_fuente, almacen = pipeline.abrir_audio(pelicula['video'])
+    pelicula['audio_fuente'], pelicula['almacen'] = audio_fuente, almacen
+    if audio_fuente is None:
+        raise RuntimeError(f"No se pudo extraer el audio de {pelicula['video']}")
+    for g in pelicula['grupos_render']:
+        if almacen is None:
+            g['pelicula'] = os.path.splitext(g['pelicula'])[0] + '.mp3'
+        pipeline.extraer_grupo(g, pelicula['subs'], almacen, audio_fuente)
+    return len(pelicula['grupos_render'])
+
+
+def etapa_tts(pelicula, g):
+    pipeline.generar_tts_grupo(g, pelicula['voces'])
+    return 1
+
+
+def etapa_render(pelicula, tono_separador):
+    pelicula['output_final'] = pipeline.renderizar_grupos(
+        pelicula['grupos_render'], pelicula['almacen'], pelicula['audio_fuente'], tono_separador,
+        pelicula['salida'], pelicula['voces'], pelicula['nombre'])
+    return len(pelicula['grupos_render'])
+
+
+# ---------- orquestador ----------
+
+def procesar_lote(peliculas, concurrencia=CONCURRENCIA, catalogo=None):
+    """
+    Cola de trabajo con un pool por etapa. Por película: parse -> (extract || tts por grupo) -> render.
+    Las etapas de películas distintas se solapan (el TTS de una mientras se renderiza otra).
+    Con catálogo, registra cada película y el estado de sus etapas, y al final sus artefactos.
+    Cada película trabaja en su propio espacio temporal (y bloquea su directorio de salida),
+    que se borra en cuanto termina o falla y no le queda ninguna tarea en vuelo.
+    Devuelve ({nombre: salida o None}, {etapa: EstadisticasEtapa}).
+    """
+    pools = {etapa: ThreadPoolExecutor(max_workers=max(1, concurrencia.get(etapa, 1)),
+                                       thread_name_prefix=etapa) for etapa in ETAPAS}
+    estadisticas = {etapa: EstadisticasEtapa(etapa) for etapa in ETAPAS}
+    espacio_lote = EspacioTrabajo(nombre="lote").abrir()   # Recursos compartidos (el tono)
+    tono_separador = pipeline.crear_tono_grupos(espacio_lote.temp)
+
+    pendientes = {}   # future -> (etapa, película)
+    faltan = {}       # nombre -> tareas de extract/tts que faltan antes del render
+    faltan_tts = {}   # nombre -> grupos con TTS pendiente (para marcar la etapa en el catálogo)
+    fallidas = set()
+
+    def marcar(pelicula, etapa, estado, error=None):
+        if catalogo:
+            catalogo.marcar_etapa(pelicula['id'], etapa, estado, error)
+
+    def liberar(pelicula, ok):
+        # Solo cuando no queda ninguna tarea suya en vuelo (una fallida puede tener TTS pendientes)
+        if 'espacio' in pelicula and not any(p is pelicula for _, p in pendientes.values()):
+            pelicula.pop('espacio').cerrar(ok)
+
+    def lanzar(etapa, pelicula, funcion, *args):
+        def medida():
+            inicio = time.perf_counter()
+            try:
+                grupos = funcion(*args)
+            except Exception:
+                estadisticas[etapa].registrar(inicio, time.perf_counter(), error=True)
+                raise
+            estadisticas[etapa].registrar(inicio, time.perf_counter(), grupos)
+            return grupos
+        pendientes[pools[etapa].submit(medida)] = (etapa, pelicula)
+
+    for pelicula in peliculas:
+        if catalogo:
+            if not os.path.exists(pelicula['video']):
+                print(f"❌ [{pelicula['nombre']}] no existe el video {pelicula['video']}")
+                fallidas.add(pelicula['nombre'])
+                continue
+            pelicula['id'] = catalogo.registrar_pelicula(pelicula['video'], pelicula['nombre'])
+        try:
+            pelicula['espacio'] = EspacioTrabajo(pelicula['salida'], pelicula['nombre']).abrir()
+        except TrabajoEnCurso as e:
+            print(f"❌ [{pelicula['nombre']}] {e}")
+            marcar(pelicula, "parse", ERROR, repr(e))
+            fallidas.add(pelicula['nombre'])
+            continue
+        marcar(pelicula, "parse", EN_CURSO)
+        lanzar("parse", pelicula, etapa_parse, pelicula, catalogo)
+
+    while pendientes:
+        hechos, _ = wait(list(pendientes), return_when=FIRST_COMPLETED)
+        for futuro in hechos:
+            etapa, pelicula = pendientes.pop(futuro)
+            nombre = pelicula['nombre']
+            error = futuro.exception()
+            if error is not None:
+                print(f"❌ [{nombre}] etapa {etapa}: {error}")
+                if nombre not in fallidas:
+                    marcar(pelicula, etapa, ERROR, repr(error))
+                fallidas.add(nombre)
+            if nombre in fallidas:
+                liberar(pelicula, ok=False)
+                continue
+
+            if etapa == "parse":
+                marcar(pelicula, "parse", HECHO)
+                grupos_render = pelicula['grupos_render']
+                faltan[nombre] = 1 + len(grupos_render)
+                faltan_tts[nombre] = len(grupos_render)
+                marcar(pelicula, "extract", EN_CURSO)
+                marcar(pelicula, "tts", EN_CURSO)
+                lanzar("extract", pelicula, etapa_extract, pelicula)
+                for g in grupos_render:
+                    lanzar("tts", pelicula, etapa_tts, pelicula, g)
+            elif etapa in ("extract", "tts"):
+                if etapa == "extract":
+                    marcar(pelicula, "extract", HECHO)
+                else:
+                    faltan_tts[nombre] -= 1
+                    if faltan_tts[nombre] == 0:
+                        marcar(pelicula, "tts", HECHO)
+                faltan[nombre] -= 1
+                if faltan[nombre] == 0:
+                    marcar(pelicula, "render", EN_CURSO)
+                    lanzar("render", pelicula, etapa_render, pelicula, tono_separador)
+            elif etapa == "render":
+                marcar(pelicula, "render", HECHO)
+                if catalogo:
+                    registrar_resultado(catalogo, pelicula['id'], pelicula['grupos_render'],
+                                        pelicula['voces'], pelicula['output_final'])
+                liberar(pelicula, ok=True)
+
+    for pool in pools.values():
+        pool.shutdown()
+    espacio_lote.cerrar()
+
+    salidas = {p['nombre']: (p.get('output_final') if p['nombre'] not in fallidas else None) for p in peliculas}
+    return salidas, estadisticas
+
+
+def imprimir_resumen(salidas, estadisticas, segundos):
+    print(f"\n=== Lote terminado en {segundos:.1f}s ===")
+    for etapa in ETAPAS:
+        print("  " + estadisticas[etapa].resumen())
+    for nombre, salida in salidas.items():
+        print(f"  {'✅' if salida else '❌'} {nombre}: {salida or 'falló'}")
+    print(f"  TTS: {pipeline.cliente_tts.estado()}")
+    perdidos = pipeline.cliente_tts.informe_perdidos()
+    if perdidos:
+        print("\n" + perdidos)
+
+
+if __name__ == "__main__":
+    # Uso: python lotePeliculas.py manifiesto.json [--tts-falso]
+    #   --tts-falso -> TTS local (edgeTtsFalso) para pruebas de carga sin red;
+    #                  latencia/jitter/fallos por EDGE_TTS_FALSO_LATENCIA / _JITTER / _FALLOS
+    if len(sys.argv) < 2:
+        print("Uso: python lotePeliculas.py manifiesto.json [--tts-falso]")
+        sys.exit(1)
+    tts_falso = "--tts-falso" in sys.argv[2:]
+    if tts_falso:
+        import edgeTtsFalso
+        edgeTtsFalso.instalar()
+    peliculas, concurrencia = cargar_manifiesto(sys.argv[1])
+    inicio = time.perf_counter()
+    with Catalogo() if pipeline.USAR_CATALOGO else nullcontext() as catalogo:
+        salidas, estadisticas = procesar_lote(peliculas, concurrencia, catalogo)
+    imprimir_resumen(salidas, estadisticas, time.perf_counter() - inicio)
+    if tts_falso:
+        print(f"\nTTS falso: {edgeTtsFalso.estadisticas}")
+    print("\n" + instrumentacion.resumen())
+    instrumentacion.exportar_json(os.path.join(os.path.dirname(os.path.abspath(sys.argv[1])), "metricas_lote.json"))
@@ -0,0 +1,109 @@
+import numpy as np
+import wave
+from scipy.ndimage import maximum_filter1d, uniform_filter1d
+from almacenPCM import a_float32, leer_wav
+
+# Configuración del ducking (el audio de la película baja mientras habla el TTS)
+REDUCCION_DUCKING_DB = -12.0  # Cuánto baja la película bajo la voz
+UMBRAL_VOZ_DB = -45.0         # Nivel (dBFS RMS) a partir del cual se considera que el TTS habla
+ATAQUE_DUCKING = 0.05         # Segundos para bajar
+LIBERACION_DUCKING = 0.30     # Segundos que se mantiene bajado tras la voz
+HOP_ENVOLVENTE = 0.01         # Resolución de la envolvente (10 ms)
+
+
+def curva_ducking(voz, sample_rate, reduccion_db=REDUCCION_DUCKING_DB, umbral_db=UMBRAL_VOZ_DB,
+                  ataque=ATAQUE_DUCKING, liberacion=LIBERACION_DUCKING, hop=HOP_ENVOLVENTE):
+    """
+    Ganancia por muestra (float32) a aplicar al fondo según la actividad de la voz.
+    Todo vectorizado: RMS por ventanas -> máscara de voz -> retención (liberación) -> suavizado (ataque).
+    """
+    x = a_float32(np.asarray(voz))
+    if x.ndim == 2:
+        x = x.mean(axis=1)
+    if len(x) == 0:
+        return np.ones(0, dtype=np.float32)
+
+    hop_muestras = max(1, int(hop * sample_rate))
+    num_ventanas = int(np.ceil(len(x) / hop_muestras))
+    relleno = np.zeros(num_ventanas * hop_muestras, dtype=np.float32)
+    relleno[:len(x)] = x
+    rms = np.sqrt((relleno.reshape(num_ventanas, hop_muestras) ** 2).mean(axis=1))
+
+    with np.errstate(divide='ignore'):
+        activa = (20 * np.log10(rms) > umbral_db).astype(np.float32)
+
+    # Bajar 'ataque' antes de que empiece la voz y mantener bajado 'liberacion' después
+    ventanas_liberacion = max(1, int(round(liberacion / hop)))
+    ventanas_ataque = max(1, int(round(ataque / hop)))
+    tamano = ventanas_ataque + ventanas_liberacion + 1
+    activa = maximum_filter1d(activa, size=tamano, origin=tamano // 2 - ventanas_ataque, mode='constant')
+    activa = uniform_filter1d(activa, size=ventanas_ataque, mode='nearest')
+
+    profundidad = 1.0 - 10 ** (reduccion_db / 20.0)
+    ganancia_ventanas = 1.0 - profundidad * activa
+
+    t_ventanas = (np.arange(num_ventanas) + 0.5) * hop_muestras
+    return np.interp(np.arange(len(x)), t_ventanas, ganancia_ventanas).astype(np.float32)
+
+
+def mezclar_superpuesto(fondo, voz, sample_rate, inicio_voz=0, volumen_fondo=1.0, volumen_voz=1.0,
+                        **opciones_ducking):
+    """
+    Mezcla la voz encima del fondo empezando en la muestra inicio_voz, bajando el fondo bajo la voz.
+    fondo y voz: PCM [frames, canales] (int16 o float). Devuelve float32 del largo necesario.
+    """
+    fondo = a_float32(np.asarray(fondo))
+    voz = a_float32(np.asarray(voz))
+    if fondo.ndim == 1:
+        fondo = fondo[:, None]
+    if voz.ndim == 1:
+        voz = voz[:, None]
+    canales = max(fondo.shape[1], voz.shape[1])
+
+    largo = max(len(fondo), inicio_voz + len(voz))
+    salida = np.zeros((largo, canales), dtype=np.float32)
+    salida[:len(fondo)] = fondo * volumen_fondo
+
+    tramo = slice(inicio_voz, inicio_voz + len(voz))
+    ganancia = curva_ducking(voz, sample_rate, **opciones_ducking)
+    salida[tramo] *= ganancia[:, None]
+    salida[tramo] += voz * volumen_voz
+
+    np.clip(salida, -1.0, 32767 / 32768.0, out=salida)
+    return salida
+
+
+def renderizar_superpuesto(almacen, segmentos, salida_wav, volumen_fondo=1.0, volumen_voz=1.0,
+                           separacion=None, **opciones_ducking):
+    """
+    Renderiza todos los grupos en una sola pasada sobre el PCM en memoria.
+    segmentos: lista de dicts {'inicio': seg, 'fin': seg, 'voz': wav del TTS o None}
+    separacion: PCM opcional (p. ej. un tono) insertado entre grupos.
+    Escribe un único WAV (listo para una sola codificación) y devuelve su duración en segundos.
+    """
+    sr = almacen.sample_rate
+    total_frames = 0
+    with wave.open(salida_wav, 'wb') as w:
+        w.setnchannels(almacen.canales)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+
+        for i, seg in enumerate(segmentos):
+            fondo = almacen.rebanada(seg['inicio'], seg['fin'])
+            if seg.get('voz'):
+                voz, sr_voz = leer_wav(seg['voz'])
+                if sr_voz != sr:
+                    raise ValueError(f"Sample rate distinto en {seg['voz']}: {sr_voz} != {sr}")
+                mezcla = mezclar_superpuesto(fondo, voz, sr, 0, volumen_fondo, volumen_voz,
+                                             **opciones_ducking)
+            else:
+                mezcla = a_float32(np.asarray(fondo)) * volumen_fondo
+
+            w.writeframes((mezcla * 32768.0).astype('<i2').tobytes())
+            total_frames += len(mezcla)
+
+            if separacion is not None and i < len(segmentos) - 1:
+                w.writeframes(np.asarray(separacion, dtype='<i2').tobytes())
+                total_frames += len(separacion)
+
+    return total_frames / sr
@@ -0,0 +1,243 @@
+import numpy as np
+import json
+from indiceVideo import hash_video
+from almacenPCM import AlmacenPCM, a_float32
+from ajusteTiempo import crear_wav_vacio
+
+# Tipos de segmento del plan
+TIPO_PELICULA = 0
+TIPO_TTS_EN = 1
+TIPO_TTS_ES = 2
+TIPO_TONO = 3
+TIPO_SILENCIO = 4
+NOMBRES_TIPO = {
+    TIPO_PELICULA: "pelicula",
+    TIPO_TTS_EN: "tts_en",
+    TIPO_TTS_ES: "tts_es",
+    TIPO_TONO: "tono",
+    TIPO_SILENCIO: "silencio",
+}
+
+# Un registro por segmento: qué asset, desde dónde, cuánto, con qué ganancia y dónde cae en la salida
+DTYPE_REGISTRO = np.dtype([
+    ('asset', '<i4'),      # Índice en plan.assets
+    ('destino', '<i8'),    # Frame de inicio en la salida
+    ('offset', '<i8'),     # Frame de inicio dentro del asset
+    ('largo', '<i8'),      # Frames
+    ('ganancia', '<f4'),   # Ganancia lineal
+    ('grupo', '<i4'),      # Grupo de subtítulos (-1 si no pertenece a ninguno)
+    ('tipo', 'u1'),        # TIPO_*
+])
+
+FRAMES_POR_BLOQUE = 1 << 16
+
+
+class PlanRender:
+    """Plan de render compacto: tabla de assets + array de registros (asset, offset, largo, ganancia)"""
+
+    def __init__(self, sample_rate=44100, canales=2):
+        self.sample_rate = sample_rate
+        self.canales = canales
+        self.assets = []       # [{'ruta', 'hash', 'frames'}]
+        self.grupos = {}       # id -> {'cues': [...], 'textos': {...}, ...} (metadatos libres)
+        self._indice_assets = {}
+        self._filas = []
+        self._registros = None
+        self._fin = 0          # Final (en frames) de la salida tal como está ahora
+
+    # ---------- construcción ----------
+
+    def asset(self, ruta):
+        """Registra un WAV del formato común como asset y devuelve su id (una vez por ruta)"""
+        if ruta in self._indice_assets:
+            return self._indice_assets[ruta]
+
+        almacen = AlmacenPCM(ruta)
+        if almacen.sample_rate != self.sample_rate or almacen.canales != self.canales:
+            raise ValueError(f"Asset con formato distinto al del plan: {ruta}")
+
+        self.assets.append({'ruta': ruta, 'hash': hash_video(ruta), 'frames': len(almacen)})
+        self._indice_assets[ruta] = len(self.assets) - 1
+        return self._indice_assets[ruta]
+
+    @property
+    def duracion_frames(self):
+        return self._fin
+
+    def agregar(self, ruta, tipo, grupo=-1, ganancia=1.0, offset=0, largo=None, destino=None):
+        """
+        Añade un segmento. Sin destino, va justo detrás del final actual (modo secuencial);
+        sin largo, usa el asset desde offset hasta el final.
+        """
+        id_asset = self.asset(ruta)
+        if largo is None:
+            largo = self.assets[id_asset]['frames'] - offset
+        if destino is None:
+            destino = self._fin
+        self._filas.append((id_asset, destino, offset, largo, ganancia, grupo, tipo))
+        self._fin = max(self._fin, destino + largo)
+        self._registros = None
+        return len(self._filas) - 1
+
+    @property
+    def registros(self):
+        """Array estructurado (DTYPE_REGISTRO) con todos los segmentos"""
+        if self._registros is None:
+            self._registros = np.array(self._filas, dtype=DTYPE_REGISTRO)
+        return self._registros
+
+    # ---------- validación ----------
+
+    def validar(self):
+        """Devuelve la lista de errores del plan (vacía si es válido)"""
+        errores = []
+        r = self.registros
+        if not len(r):
+            return errores
+
+        frames_asset = np.array([a['frames'] for a in self.assets], dtype=np.int64)
+        fuera = (r['asset'] < 0) | (r['asset'] >= len(self.assets))
+        for i in np.nonzero(fuera)[0]:
+            errores.append(f"registro {i}: asset {r['asset'][i]} inexistente")
+
+        validos = ~fuera
+        malos = validos & ((r['offset'] < 0) | (r['largo'] <= 0) | (r['destino'] < 0))
+        for i in np.nonzero(malos)[0]:
+            errores.append(f"registro {i}: offset/largo/destino inválidos")
+
+        excede = np.zeros(len(r), dtype=bool)
+        excede[validos] = r['offset'][validos] + r['largo'][validos] > frames_asset[r['asset'][validos]]
+        for i in np.nonzero(excede)[0]:
+            errores.append(f"registro {i}: se pasa del final de {self.assets[r['asset'][i]]['ruta']}")
+
+        for i in np.nonzero(~np.isfinite(r['ganancia']))[0]:
+            errores.append(f"registro {i}: ganancia no finita")
+        return errores
+
+    def es_contiguo(self):
+        """True si los segmentos se suceden sin huecos ni solapes (apto para concat)"""
+        r = self.registros
+        if not len(r):
+            return True
+        return r['destino'][0] == 0 and np.array_equal(r['destino'][1:], (r['destino'] + r['largo'])[:-1])
+
+    # ---------- serialización ----------
+
+    def guardar(self, ruta):
+        """Guarda el plan en un .npz (registros binarios + metadatos JSON)"""
+        meta = {
+            'sample_rate': self.sample_rate,
+            'canales': self.canales,
+            'assets': self.assets,
+            'grupos': {str(k): v for k, v in self.grupos.items()},
+        }
+        with open(ruta, 'wb') as f:
+            np.savez_compressed(f, registros=self.registros, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        return ruta
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            meta = json.loads(str(datos['meta']))
+            registros = datos['registros']
+        plan = cls(meta['sample_rate'], meta['canales'])
+        plan.assets = meta['assets']
+        plan.grupos = {int(k): v for k, v in meta['grupos'].items()}
+        plan._indice_assets = {a['ruta']: i for i, a in enumerate(plan.assets)}
+        plan._filas = [tuple(fila) for fila in registros.tolist()]
+        plan._registros = registros
+        plan._fin = int((registros['destino'] + registros['largo']).max()) if len(registros) else 0
+        return plan
+
+    # ---------- comparación ----------
+
+    def claves_registros(self):
+        """Clave de contenido de cada registro (hash del asset en vez del id, que cambia entre ejecuciones)"""
+        r = self.registros
+        hashes = [self.assets[a]['hash'] for a in r['asset']]
+        return [(h, int(d), int(o), int(l), round(float(g), 6))
+                for h, d, o, l, g in zip(hashes, r['destino'], r['offset'], r['largo'], r['ganancia'])]
+
+    def diferencias(self, anterior):
+        """
+        Tramos [inicio, fin) de la salida (en frames) que cambian respecto a otro plan.
+        Un tramo cambia si algún registro que lo cubre existe solo en uno de los dos planes.
+        """
+        actuales = self.claves_registros()
+        previas = anterior.claves_registros()
+        solo_actual = set(actuales) - set(previas)
+        solo_previo = set(previas) - set(actuales)
+
+        tramos = sorted((d, d + l) for _, d, _, l, _ in solo_actual | solo_previo)
+        fin_total = max(self.duracion_frames, anterior.duracion_frames)
+        if self.duracion_frames != anterior.duracion_frames:
+            tramos.append((min(self.duracion_frames, anterior.duracion_frames), fin_total))
+            tramos.sort()
+
+        unidos = []
+        for inicio, fin in tramos:
+            if unidos and inicio <= unidos[-1][1]:
+                unidos[-1][1] = max(unidos[-1][1], fin)
+            else:
+                unidos.append([inicio, fin])
+        return [(inicio, fin) for inicio, fin in unidos]
+
+    # ---------- render ----------
+
+    def _seleccion(self, tipos=None):
+        r = self.registros
+        if tipos is None:
+            return r
+        return r[np.isin(r['tipo'], list(tipos))]
+
+    def iterar_bloques(self, inicio=0, fin=None, tipos=None, frames_por_bloque=FRAMES_POR_BLOQUE):
+        """
+        Genera el PCM int16 de la salida por bloques (para renderers en streaming).
+        tipos: conjunto de TIPO_* a incluir (el resto queda en silencio, p. ej. pistas por idioma).
+        """
+        r = self._seleccion(tipos)
+        orden = np.argsort(r['destino'], kind='stable')
+        r = r[orden]
+        fines = r['destino'] + r['largo']
+        max_fin = np.maximum.accumulate(fines) if len(r) else fines
+        fin = self.duracion_frames if fin is None else fin
+
+        almacenes = {}
+        for a in range(inicio, fin, frames_por_bloque):
+            b = min(a + frames_por_bloque, fin)
+            bloque = np.zeros((b - a, self.canales), dtype=np.float32)
+
+            # Registros que tocan [a, b): empiezan antes de b y terminan después de a
+            hasta = np.searchsorted(r['destino'], b, side='left')
+            desde = np.searchsorted(max_fin[:hasta], a, side='right')
+            for reg in r[desde:hasta]:
+                d, l = int(reg['destino']), int(reg['largo'])
+                if d + l <= a:
+                    continue
+                ini, fi = max(a, d), min(b, d + l)
+                ruta = self.assets[reg['asset']]['ruta']
+                if ruta not in almacenes:
+                    almacenes[ruta] = AlmacenPCM(ruta)
+                origen = int(reg['offset']) + (ini - d)
+                vista = almacenes[ruta].rebanada_frames(origen, origen + (fi - ini))
+                # a_float32: los assets pueden ser WAV int16 o float32 (AlmacenPCM rechaza el resto)
+                bloque[ini - a:ini - a + len(vista)] += a_float32(vista) * reg['ganancia']
+
+            np.clip(bloque, -1.0, 32767 / 32768.0, out=bloque)
+            yield (bloque * 32768.0).astype('<i2')
+
+    def renderizar_numpy(self, salida_wav, tipos=None):
+        """Renderiza el plan a un WAV int16 (mapeado en memoria) con el mezclador de NumPy"""
+        total = self.duracion_frames
+        offset = crear_wav_vacio(salida_wav, total, self.sample_rate, self.canales)
+        if total == 0:
+            # Plan vacío (p. ej. todos los grupos descartados): solo la cabecera (mmap no mapea 0 bytes)
+            return salida_wav
+        salida = np.memmap(salida_wav, dtype='<i2', mode='r+', offset=offset, shape=(total, self.canales))
+        posicion = 0
+        for bloque in self.iterar_bloques(tipos=tipos):
+            salida[posicion:posicion + len(bloque)] = bloque
+            posicion += len(bloque)
+        salida.flush()
+        del salida
+        return salida_wav
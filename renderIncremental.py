@@ -0,0 +1,329 @@
+import numpy as np
+import hashlib
+import struct
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from almacenPCM import AlmacenPCM
+from instrumentacion import medir, contar
+from espacioTrabajo import temporal_unico
+import codecAudio
+from framesMP3 import dividir_frames_mp3
+
+# Configuración
+DIR_BLOQUES = "bloques_mp3"
+DURACION_BLOQUE = 60.0          # Duración aproximada de cada bloque (segundos)
+SAMPLES_POR_FRAME_MP3 = 1152    # MPEG-1 Layer III
+FRAMES_CONTEXTO = 4             # Frames MP3 de contexto antes/después de cada bloque
+BITRATE_MP3 = '192k'
+PROCESOS_CODIFICACION = os.cpu_count() or 1  # Codificaciones de bloques en paralelo
+DURACION_TRAMO_MINIMA = 30.0    # No partir la codificación paralela en tramos más cortos
+RETARDO_ENCODER_LAME = 576      # Muestras de retardo que añade libmp3lame al principio
+
+
+def codificar_pcm_mp3(pcm, sample_rate=44100, bitrate=BITRATE_MP3):
+    """
+    Codifica PCM int16 [frames, canales] a MP3 crudo sin reservorio de bits (cada frame se
+    decodifica solo: se puede cortar y pegar), sin ID3 ni frame Xing. En proceso con PyAV si
+    está instalado; si no, por stdin/stdout de ffmpeg con las mismas opciones.
+    """
+    return codecAudio.codificar_mp3(pcm, None, sample_rate, pcm.shape[1], bitrate, reservorio=False)
+
+
+def codificar_bloque(previo, bloque, siguiente, sample_rate=44100, bitrate=BITRATE_MP3, es_ultimo=False):
+    """
+    Codifica un bloque (largo múltiplo de 1152) de forma que sus frames encajan sin huecos
+    con los de los bloques vecinos: se codifica con contexto previo/siguiente y se conservan
+    solo los frames que corresponden al bloque. Devuelve los bytes MP3 del bloque.
+    """
+    if len(bloque) % SAMPLES_POR_FRAME_MP3 or len(previo) % SAMPLES_POR_FRAME_MP3:
+        raise ValueError("El bloque y el contexto previo deben ser múltiplos de 1152 muestras")
+
+    entrada = np.concatenate([previo, bloque, siguiente])
+    frames = dividir_frames_mp3(codificar_pcm_mp3(entrada, sample_rate, bitrate))
+
+    primero = len(previo) // SAMPLES_POR_FRAME_MP3
+    if es_ultimo:
+        return b''.join(frames[primero:])  # El último bloque se queda con el vaciado del encoder
+    return b''.join(frames[primero:primero + len(bloque) // SAMPLES_POR_FRAME_MP3])
+
+
+def _crc16(datos):
+    """CRC-16 (polinomio 0x8005 reflejado) que usa LAME en su cabecera"""
+    crc = 0
+    for byte in datos:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def frame_info_lame(primer_frame, num_frames, num_bytes, num_muestras):
+    """
+    Frame 'Info' (Xing + extensión LAME) para un stream CBR ya unido, con el retardo del
+    encoder y el relleno final: los reproductores gapless recortan exactamente num_muestras.
+    """
+    cabecera = primer_frame[:4]
+    version = (cabecera[1] >> 3) & 0x3
+    canales_modo = (cabecera[3] >> 6) & 0x3
+    if version == 3:
+        lado = 17 if canales_modo == 3 else 32
+    else:
+        lado = 9 if canales_modo == 3 else 17
+
+    largo = len(primer_frame) - (cabecera[2] >> 1 & 1)  # El frame Info va sin byte de relleno
+    frame = bytearray(largo)
+    frame[:4] = bytes([cabecera[0], cabecera[1], cabecera[2] & ~0x02, cabecera[3]])
+    p = 4 + lado
+
+    num_bytes += largo
+    toc = bytes(min(255, i * 256 // 100) for i in range(100))
+    frame[p:p + 120] = (b'Info' + struct.pack('>III', 0x0F, num_frames, num_bytes) + toc +
+                        struct.pack('>I', 0))
+    p += 120
+
+    relleno = num_frames * SAMPLES_POR_FRAME_MP3 - RETARDO_ENCODER_LAME - num_muestras
+    relleno = min(max(relleno, 0), 0xFFF)
+    kbps = int(BITRATE_MP3.rstrip('k'))
+    frame[p:p + 9] = b'LAME3.100'
+    frame[p + 9] = 0x01                      # Revisión 0, método CBR
+    frame[p + 20] = min(kbps, 255)
+    frame[p + 21:p + 24] = ((RETARDO_ENCODER_LAME << 12) | relleno).to_bytes(3, 'big')
+    frame[p + 28:p + 32] = struct.pack('>I', num_bytes)
+    frame[p + 34:p + 36] = struct.pack('>H', _crc16(frame[:p + 34]))
+    return bytes(frame)
+
+
+def _codificar_tramo_wav(ruta_wav, inicio, fin, es_ultimo):
+    """Trabajo de proceso: codifica los frames [inicio, fin) de un WAV con contexto de sus vecinos"""
+    almacen = AlmacenPCM(ruta_wav)
+    contexto = FRAMES_CONTEXTO * SAMPLES_POR_FRAME_MP3
+    previo = almacen.rebanada_frames(inicio - contexto, inicio) if inicio > 0 else almacen.rebanada_frames(0, 0)
+    bloque = np.asarray(almacen.rebanada_frames(inicio, fin))
+    if es_ultimo:
+        siguiente = almacen.rebanada_frames(0, 0)
+        resto = (-len(bloque)) % SAMPLES_POR_FRAME_MP3
+        bloque = np.concatenate([bloque, np.zeros((resto, almacen.canales), dtype=bloque.dtype)])
+    else:
+        siguiente = almacen.rebanada_frames(fin, fin + contexto)
+    return codificar_bloque(np.asarray(previo), bloque, np.asarray(siguiente), almacen.sample_rate,
+                            es_ultimo=es_ultimo)
+
+
+@medir("codificacion_mp3")
+def codificar_wav_paralelo(ruta_wav, salida, procesos=PROCESOS_CODIFICACION):
+    """
+    Codifica un WAV largo a MP3 en tramos simultáneos (uno por proceso) y los une sin huecos.
+    Los tramos se cortan en múltiplos de 1152 muestras, así se pegan frame a frame sin
+    relleno intermedio; el frame Info final declara el retardo y el relleno reales.
+    """
+    almacen = AlmacenPCM(ruta_wav)
+    total = len(almacen)
+    minimo = int(DURACION_TRAMO_MINIMA * almacen.sample_rate)
+    num_tramos = max(1, min(procesos * 2, total // max(minimo, 1)))
+    paso = -(-total // num_tramos)
+    paso += (-paso) % SAMPLES_POR_FRAME_MP3
+    cortes = list(range(0, total, paso)) + [total]
+    del almacen
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        trabajos = [pool.submit(_codificar_tramo_wav, ruta_wav, a, b, b == total)
+                    for a, b in zip(cortes[:-1], cortes[1:])]
+        partes = [t.result() for t in trabajos]
+
+    datos = b''.join(partes)
+    frames = dividir_frames_mp3(datos)
+    info = frame_info_lame(frames[0], len(frames), len(datos), total)
+    temporal = temporal_unico(salida)
+    with open(temporal, 'wb') as f:
+        f.write(info)
+        f.write(datos)
+    os.replace(temporal, salida)
+    return salida
+
+
+def grupos_del_plan(plan):
+    """Ids de grupo del plan, ordenados (lista de int, serializable)"""
+    r = plan.registros
+    return [int(g) for g in np.unique(r['grupo'][r['grupo'] >= 0])] if len(r) else []
+
+
+def grupos_por_bloque(plan, duracion_bloque=DURACION_BLOQUE):
+    """Cada cuántos grupos se corta para que los bloques duren ~duracion_bloque"""
+    duracion_total = plan.duracion_frames / plan.sample_rate
+    return max(1, int(round(len(grupos_del_plan(plan)) * duracion_bloque / max(duracion_total, 1e-9))))
+
+
+def cortes_por_grupo(plan, duracion_bloque=DURACION_BLOQUE, cada=None):
+    """
+    Límites de bloque (frames del plan) en el inicio de ciertos grupos.
+    Se corta en grupos cuyo id es múltiplo de 'cada'. Como 'cada' sale de la duración total,
+    renderizar_incremental lo guarda en el manifiesto y lo reutiliza mientras los grupos sean
+    los mismos: así una corrección (que cambia la duración) no mueve los demás cortes.
+    """
+    r = plan.registros
+    total = plan.duracion_frames
+    if not len(r) or total == 0:
+        return [0, total]
+
+    con_grupo = r[r['grupo'] >= 0]
+    grupos = np.unique(con_grupo['grupo'])
+    if cada is None:
+        cada = grupos_por_bloque(plan, duracion_bloque)
+
+    cortes = {0, total}
+    for g in grupos:
+        if g % cada == 0 and g > 0:
+            cortes.add(int(con_grupo['destino'][con_grupo['grupo'] == g].min()))
+    return sorted(cortes)
+
+
+def _descriptor(plan, inicio, fin):
+    """Descripción (relativa a inicio) de los registros que tocan [inicio, fin)"""
+    r = plan.registros
+    toca = (r['destino'] < fin) & (r['destino'] + r['largo'] > inicio)
+    descripcion = [fin - inicio]
+    for reg in r[toca]:
+        descripcion.append((plan.assets[reg['asset']]['hash'], int(reg['destino']) - inicio,
+                            int(reg['offset']), int(reg['largo']), round(float(reg['ganancia']), 6)))
+    return descripcion
+
+
+def _pcm_rellenado(plan, inicio, fin):
+    """PCM del plan en [inicio, fin) rellenado con silencio hasta un múltiplo de 1152"""
+    partes = list(plan.iterar_bloques(inicio, fin))
+    pcm = np.concatenate(partes) if partes else np.zeros((0, plan.canales), dtype='<i2')
+    resto = (-len(pcm)) % SAMPLES_POR_FRAME_MP3
+    if resto:
+        pcm = np.concatenate([pcm, np.zeros((resto, plan.canales), dtype='<i2')])
+    return pcm
+
+
+def preparar_bloques(plan, duracion_bloque=DURACION_BLOQUE, cada=None):
+    """Lista de bloques [{'inicio', 'fin', 'hash'}]; el hash cubre el bloque y el contexto de sus vecinos"""
+    cortes = cortes_por_grupo(plan, duracion_bloque, cada)
+    tramos = list(zip(cortes[:-1], cortes[1:]))
+    contexto = FRAMES_CONTEXTO * SAMPLES_POR_FRAME_MP3
+
+    bloques = []
+    for k, (inicio, fin) in enumerate(tramos):
+        h = hashlib.sha1()
+        h.update(json.dumps(_descriptor(plan, inicio, fin)).encode())
+        if k > 0:
+            a, b = tramos[k - 1]
+            h.update(json.dumps(_descriptor(plan, max(a, b - contexto), b)).encode())
+        if k + 1 < len(tramos):
+            a, b = tramos[k + 1]
+            h.update(json.dumps(_descriptor(plan, a, min(b, a + contexto))).encode())
+        h.update(f"{plan.sample_rate}:{plan.canales}:{BITRATE_MP3}:{k + 1 == len(tramos)}".encode())
+        bloques.append({'inicio': inicio, 'fin': fin, 'hash': h.hexdigest()})
+    return bloques
+
+
+def _contexto(plan, bloques, k):
+    """PCM de contexto (final del bloque anterior y principio del siguiente) para el bloque k"""
+    contexto = FRAMES_CONTEXTO * SAMPLES_POR_FRAME_MP3
+    vacio = np.zeros((0, plan.canales), dtype='<i2')
+    previo = _pcm_rellenado(plan, bloques[k - 1]['inicio'], bloques[k - 1]['fin'])[-contexto:] if k > 0 else vacio
+    siguiente = _pcm_rellenado(plan, bloques[k + 1]['inicio'], bloques[k + 1]['fin'])[:contexto] if k + 1 < len(bloques) else vacio
+    return previo, siguiente
+
+
+def codificar_bloque_plan(plan, bloques, k, dir_bloques=DIR_BLOQUES):
+    """Codifica el bloque k del plan a dir_bloques/<hash>.mp3 y devuelve su ruta"""
+    ruta = os.path.join(dir_bloques, f"{bloques[k]['hash']}.mp3")
+    pcm = _pcm_rellenado(plan, bloques[k]['inicio'], bloques[k]['fin'])
+    previo, siguiente = _contexto(plan, bloques, k)
+    datos = codificar_bloque(previo, pcm, siguiente, plan.sample_rate, es_ultimo=(k + 1 == len(bloques)))
+    temporal = temporal_unico(ruta)
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def unir_bloques(rutas, salida, num_muestras=None):
+    """
+    Concatena los MP3 de los bloques copiando los frames (sin recodificar).
+    Con num_muestras se antepone el frame Info con el retardo/relleno para reproducción gapless.
+    """
+    temporal = temporal_unico(salida)
+    with open(temporal, 'wb') as f:
+        if num_muestras is not None:
+            datos = b''.join(open(ruta, 'rb').read() for ruta in rutas)
+            frames = dividir_frames_mp3(datos)
+            f.write(frame_info_lame(frames[0], len(frames), len(datos), num_muestras))
+            f.write(datos)
+        else:
+            for ruta in rutas:
+                with open(ruta, 'rb') as b:
+                    f.write(b.read())
+    os.replace(temporal, salida)
+    return salida
+
+
+def mapa_salida(bloques):
+    """
+    (inicios en el plan, inicios en la salida) de cada bloque, en frames: cada bloque
+    ocupa en el MP3 su largo redondeado a 1152, así que la salida se desplaza respecto al plan.
+    """
+    largos = np.array([b['fin'] - b['inicio'] for b in bloques], dtype=np.int64)
+    rellenados = largos + (-largos) % SAMPLES_POR_FRAME_MP3
+    inicios_salida = np.concatenate([[0], np.cumsum(rellenados)[:-1]]) if len(bloques) else largos
+    return np.array([b['inicio'] for b in bloques], dtype=np.int64), inicios_salida
+
+
+@medir("codificacion_mp3")
+def renderizar_incremental(plan, salida, dir_bloques=DIR_BLOQUES, duracion_bloque=DURACION_BLOQUE,
+                           procesos=PROCESOS_CODIFICACION):
+    """
+    Renderiza el plan a MP3 por bloques independientes; solo se codifican (en paralelo) los
+    bloques cuyo hash no está ya en dir_bloques. Devuelve (bloques codificados, bloques).
+    """
+    os.makedirs(dir_bloques, exist_ok=True)
+    # Mismos grupos que la última salida: mismos cortes (aunque la duración total haya cambiado)
+    grupos = grupos_del_plan(plan)
+    cada = None
+    try:
+        with open(os.path.join(dir_bloques, "manifest.json"), 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+        if anterior.get('grupos') == grupos and anterior.get('duracion_bloque') == duracion_bloque:
+            cada = anterior.get('cada')
+    except (OSError, ValueError):
+        pass
+    if cada is None:
+        cada = grupos_por_bloque(plan, duracion_bloque)
+    bloques = preparar_bloques(plan, duracion_bloque, cada)
+
+    pendientes = [k for k, bloque in enumerate(bloques)
+                  if not os.path.exists(os.path.join(dir_bloques, f"{bloque['hash']}.mp3"))]
+    if procesos > 1 and len(pendientes) > 1:
+        with ProcessPoolExecutor(max_workers=min(procesos, len(pendientes))) as pool:
+            for t in [pool.submit(codificar_bloque_plan, plan, bloques, k, dir_bloques) for k in pendientes]:
+                t.result()
+    else:
+        for k in pendientes:
+            codificar_bloque_plan(plan, bloques, k, dir_bloques)
+    codificados = len(pendientes)
+    contar("cache.bloques_mp3.aciertos", len(bloques) - codificados)
+    contar("cache.bloques_mp3.fallos", codificados)
+
+    rutas = [os.path.join(dir_bloques, f"{b['hash']}.mp3") for b in bloques]
+    # Cada bloque ocupa su largo redondeado a 1152 salvo el último, que termina donde termina el plan
+    largos = [b['fin'] - b['inicio'] for b in bloques]
+    num_muestras = sum(l + (-l) % SAMPLES_POR_FRAME_MP3 for l in largos[:-1]) + (largos[-1] if largos else 0)
+    unir_bloques(rutas, salida, num_muestras)
+
+    # Borrar bloques que ya no usa ninguna parte de la salida
+    vigentes = {os.path.basename(r) for r in rutas}
+    for nombre in os.listdir(dir_bloques):
+        if nombre.endswith('.mp3') and nombre not in vigentes:
+            os.remove(os.path.join(dir_bloques, nombre))
+
+    # Mapa de bloques de la última salida (para saber qué cambió entre ejecuciones)
+    with open(os.path.join(dir_bloques, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump({'salida': salida, 'duracion_bloque': duracion_bloque, 'cada': cada, 'grupos': grupos,
+                   'bloques': bloques}, f, indent=1)
+
+    print(f"✅ Render incremental: {codificados}/{len(bloques)} bloques codificados -> {salida}")
+    return codificados, bloques
@@ -0,0 +1,106 @@
+import numpy as np
+from scipy import signal
+from almacenPCM import a_float32, leer_wav, escribir_wav
+
+# Configuración (EBU R128 / ITU-R BS.1770)
+OBJETIVO_LUFS = -16.0        # Sonoridad integrada objetivo para voz (podcast / audiolibro)
+TECHO_PICO_DBFS = -1.0       # La ganancia nunca lleva el pico por encima de esto
+DURACION_BLOQUE = 0.4        # Bloques de 400 ms...
+SOLAPE_BLOQUE = 0.75         # ...con 75% de solape
+PUERTA_ABSOLUTA = -70.0      # LUFS
+PUERTA_RELATIVA = -10.0      # LU por debajo de la sonoridad sin puerta relativa
+
+
+def _biquad(tipo, ganancia_db, q, fc, sample_rate):
+    """Coeficientes (b, a) de un biquad shelf alto o paso alto (Audio EQ Cookbook)"""
+    A = 10 ** (ganancia_db / 40.0)
+    w0 = 2.0 * np.pi * fc / sample_rate
+    alpha = np.sin(w0) / (2.0 * q)
+    cos_w0 = np.cos(w0)
+
+    if tipo == "shelf_alto":
+        b = [A * ((A + 1) + (A - 1) * cos_w0 + 2 * np.sqrt(A) * alpha),
+             -2 * A * ((A - 1) + (A + 1) * cos_w0),
+             A * ((A + 1) + (A - 1) * cos_w0 - 2 * np.sqrt(A) * alpha)]
+        a = [(A + 1) - (A - 1) * cos_w0 + 2 * np.sqrt(A) * alpha,
+             2 * ((A - 1) - (A + 1) * cos_w0),
+             (A + 1) - (A - 1) * cos_w0 - 2 * np.sqrt(A) * alpha]
+    else:  # paso_alto
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+
+    b = np.array(b) / a[0]
+    a = np.array(a) / a[0]
+    return b, a
+
+
+def filtro_k(pcm, sample_rate):
+    """Aplica la ponderación K (shelf +4 dB en 1.5 kHz + paso alto en 38 Hz) a todos los canales"""
+    b1, a1 = _biquad("shelf_alto", 4.0, 1 / np.sqrt(2), 1500.0, sample_rate)
+    b2, a2 = _biquad("paso_alto", 0.0, 0.5, 38.0, sample_rate)
+    y = signal.lfilter(b1, a1, pcm, axis=0)
+    return signal.lfilter(b2, a2, y, axis=0)
+
+
+def medir_sonoridad(pcm, sample_rate):
+    """
+    Sonoridad integrada en LUFS de un PCM [frames, canales] (int16 o float).
+    Todos los bloques se calculan de una vez con sumas acumuladas; devuelve -inf si es silencio.
+    """
+    x = a_float32(np.asarray(pcm))
+    if x.ndim == 1:
+        x = x[:, None]
+    if len(x) == 0:
+        return float('-inf')
+
+    cuadrados = filtro_k(x, sample_rate) ** 2
+
+    largo_bloque = int(round(DURACION_BLOQUE * sample_rate))
+    paso = max(1, int(round(largo_bloque * (1 - SOLAPE_BLOQUE))))
+
+    if len(x) < largo_bloque:
+        # Clips más cortos que un bloque (tonos, interjecciones): un único bloque
+        z = cuadrados.mean(axis=0, keepdims=True)
+    else:
+        acumulado = np.concatenate([np.zeros((1, x.shape[1])), np.cumsum(cuadrados, axis=0)])
+        inicios = np.arange(0, len(x) - largo_bloque + 1, paso)
+        z = (acumulado[inicios + largo_bloque] - acumulado[inicios]) / largo_bloque
+
+    # Canales L/R con peso 1.0 (sin canales surround en este proyecto)
+    potencia = z.sum(axis=1)
+    with np.errstate(divide='ignore'):
+        sonoridad_bloques = -0.691 + 10 * np.log10(potencia)
+
+    sobre_absoluta = sonoridad_bloques > PUERTA_ABSOLUTA
+    if not sobre_absoluta.any():
+        return float('-inf')
+
+    umbral_relativo = -0.691 + 10 * np.log10(potencia[sobre_absoluta].mean()) + PUERTA_RELATIVA
+    seleccion = sobre_absoluta & (sonoridad_bloques > umbral_relativo)
+    return float(-0.691 + 10 * np.log10(potencia[seleccion].mean()))
+
+
+def ganancia_normalizacion(pcm, sample_rate, objetivo=OBJETIVO_LUFS, techo_db=TECHO_PICO_DBFS):
+    """Ganancia en dB para llevar el PCM al objetivo, limitada para no superar el techo de pico"""
+    sonoridad = medir_sonoridad(pcm, sample_rate)
+    if not np.isfinite(sonoridad):
+        return 0.0
+
+    ganancia = objetivo - sonoridad
+    pico = np.abs(a_float32(np.asarray(pcm))).max()
+    if pico > 0:
+        ganancia = min(ganancia, techo_db - 20 * np.log10(pico))
+    return float(ganancia)
+
+
+def normalizar_wav(entrada, salida, objetivo=OBJETIVO_LUFS, volumen=1.0):
+    """
+    Mide la sonoridad de un WAV y escribe la copia normalizada (más el volumen extra lineal).
+    Devuelve la ganancia aplicada en dB.
+    """
+    pcm, sample_rate = leer_wav(entrada)
+    ganancia = ganancia_normalizacion(pcm, sample_rate, objetivo)
+    if volumen > 0:
+        ganancia += 20 * np.log10(volumen)
+    escribir_wav(salida, pcm, sample_rate, ganancia_db=ganancia)
+    return ganancia
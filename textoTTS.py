@@ -0,0 +1,195 @@
+import numpy as np
+import unicodedata
+import threading
+import hashlib
+import re
+import os
+from concurrent.futures import ThreadPoolExecutor
+from almacenPCM import leer_wav, escribir_wav
+from instrumentacion import contar
+from espacioTrabajo import temporal_unico
+
+# Preparación del texto para TTS:
+#   1. limpiar cada cue (etiquetas <i>, {\an8}, guiones de interlocutor, anotaciones [música])
+#   2. dividir el texto del grupo en frases
+#   3. sintetizar cada frase distinta (normalizada) una sola vez por película y componer
+#      el audio del grupo con esas piezas ("Yeah.", "What?"... se repiten cientos de veces)
+DIR_FRASES = "tts_frases"
+QUITAR_ANOTACIONES = True     # [door slams], (LAUGHS), (sighs), ♪ ... ♪ (subtítulos para sordos)
+MAX_CARACTERES_FRASE = 250    # Frases más largas se cortan en comas / espacios
+PAUSA_ENTRE_FRASES = 0.12     # Segundos de silencio entre frases al componer el grupo
+HILOS_FRASES = 4              # Frases de un mismo grupo pedidas a la vez (el cliente TTS pone el límite real)
+COMPONER_INCOMPLETOS = False  # True: el grupo se compone aunque falte el audio de alguna frase
+
+ABREVIATURAS = {
+    'mr', 'mrs', 'ms', 'dr', 'st', 'jr', 'sr', 'sra', 'srta', 'dra', 'ud', 'uds', 'vs', 'etc',
+    'lt', 'sgt', 'capt', 'col', 'gen', 'prof', 'p.ej', 'e.g', 'i.e', 'a.m', 'p.m',
+}
+
+# Paréntesis en minúsculas que son anotaciones y no diálogo: "(laughs)", "(sighs heavily)"...
+# (los que van todo en mayúsculas, "(DOOR SLAMS)", se quitan siempre)
+SONIDOS_SDH = {
+    'laughs', 'laughing', 'chuckles', 'giggles', 'sighs', 'gasps', 'groans', 'grunts', 'screams',
+    'screaming', 'cries', 'crying', 'sobs', 'sobbing', 'coughs', 'sniffs', 'sniffles', 'whispers',
+    'whispering', 'shouts', 'yells', 'panting', 'music', 'applause', 'indistinct', 'inaudible',
+    'risas', 'ríe', 'suspira', 'jadea', 'gruñe', 'grita', 'llora', 'solloza', 'tose', 'susurra',
+    'música', 'aplausos',
+}
+
+_ETIQUETA_HTML = re.compile(r'</?[a-zA-Z][^>]*>')
+_ETIQUETA_ASS = re.compile(r'\{[^}]*\}')
+_GUION_INICIAL = re.compile(r'^\s*[-–—]+\s*', re.MULTILINE)
+_ANOTACION = re.compile(r'\[[^\]]*\]|♪[^♪]*♪|[♪♫]+')
+_PARENTESIS = re.compile(r'\(([^)]*)\)')
+_ETIQUETA_HABLANTE = re.compile(r'^\s*[A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ0-9 .\'-]{1,30}:\s+', re.MULTILINE)
+_ESPACIOS = re.compile(r'\s+')
+_FIN_FRASE = re.compile(r'[.!?…]+["\'»”’)]*$')
+
+
+def _quitar_parentesis_sdh(m):
+    """Quita '(...)' si es una anotación (todo en mayúsculas o un sonido de SONIDOS_SDH); un inciso se queda"""
+    contenido = m.group(1)
+    palabras = contenido.casefold().strip(' .!?…').split()
+    if contenido.isupper() and sum(c.isalpha() for c in contenido) >= 2:
+        return ' '
+    if palabras and (palabras[0] in SONIDOS_SDH or ' '.join(palabras) in SONIDOS_SDH):
+        return ' '
+    return m.group(0)
+
+
+def limpiar_texto(texto):
+    """Texto de un cue listo para TTS: sin etiquetas, guiones de diálogo ni anotaciones"""
+    texto = _ETIQUETA_HTML.sub('', texto)
+    texto = _ETIQUETA_ASS.sub('', texto)
+    if QUITAR_ANOTACIONES:
+        texto = _ANOTACION.sub(' ', texto)
+        texto = _PARENTESIS.sub(_quitar_parentesis_sdh, texto)
+        texto = _ETIQUETA_HABLANTE.sub('', texto)
+    texto = _GUION_INICIAL.sub('', texto)
+    return _ESPACIOS.sub(' ', texto).strip()
+
+
+def _cortar_largo(frase, maximo=MAX_CARACTERES_FRASE):
+    """Parte una frase demasiado larga en comas (o en espacios si no tiene comas)"""
+    if len(frase) <= maximo:
+        return [frase]
+    en_comas = re.search(r'[,;:]\s', frase) is not None
+    trozos, actual = [], ""
+    for parte in re.split(r'(?<=[,;:])\s+' if en_comas else r'\s+', frase):
+        if actual and len(actual) + 1 + len(parte) > maximo:
+            trozos.append(actual)
+            actual = parte
+        else:
+            actual = f"{actual} {parte}" if actual else parte
+    if actual:
+        trozos.append(actual)
+    # Un trozo entre comas que aún se pasa se corta en espacios
+    return [t for trozo in trozos for t in (_cortar_largo(trozo, maximo) if en_comas else [trozo])]
+
+
+def dividir_frases(texto):
+    """Divide un texto ya limpio en frases (respeta abreviaturas como Mr. / Sra.)"""
+    frases, actual = [], []
+    for palabra in texto.split():
+        actual.append(palabra)
+        if _FIN_FRASE.search(palabra):
+            base = palabra.rstrip('.!?…"\'»”’)').lstrip('¿¡"\'«“(').lower()
+            if palabra.endswith('.') and not palabra.endswith('..') and base in ABREVIATURAS:
+                continue
+            frases.append(' '.join(actual))
+            actual = []
+    if actual:
+        frases.append(' '.join(actual))
+    return [trozo for frase in frases for trozo in _cortar_largo(frase)]
+
+
+def normalizar_frase(frase):
+    """Clave de deduplicación: mismas palabras y puntuación final, sin importar mayúsculas ni espacios"""
+    frase = unicodedata.normalize('NFKC', frase).casefold()
+    frase = frase.replace('…', '...').replace('’', "'").replace('“', '"').replace('”', '"')
+    return _ESPACIOS.sub(' ', frase).strip()
+
+
+class FrasesTTS:
+    """
+    Audio de frases únicas de una película (un WAV por frase en <dir>/tts_frases/, reutilizable
+    entre ejecuciones). Seguro entre hilos: si dos grupos piden la misma frase a la vez, solo
+    uno la sintetiza y el otro espera el resultado.
+    """
+
+    _instancias = {}
+    _lock_instancias = threading.Lock()
+
+    def __init__(self, directorio, sintetizar):
+        self.directorio = directorio
+        self.sintetizar = sintetizar   # (texto, archivo_wav, voz, rate) -> bool
+        self._lock = threading.Lock()
+        self._en_curso = {}            # ruta -> threading.Event de la síntesis en vuelo
+        os.makedirs(directorio, exist_ok=True)
+
+    @classmethod
+    def para(cls, dir_salida, sintetizar):
+        """Una instancia por directorio de salida (compartida por los hilos de la misma película)"""
+        directorio = os.path.abspath(os.path.join(dir_salida, DIR_FRASES))
+        with cls._lock_instancias:
+            if directorio not in cls._instancias:
+                cls._instancias[directorio] = cls(directorio, sintetizar)
+            return cls._instancias[directorio]
+
+    def ruta(self, frase, voz, rate):
+        clave = hashlib.sha1(f"{voz}|{rate}|{normalizar_frase(frase)}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, f"{clave[:20]}.wav")
+
+    def audio_frase(self, frase, voz, rate):
+        """Ruta del WAV de la frase (sintetizándola si es la primera vez) o None si falló"""
+        ruta = self.ruta(frase, voz, rate)
+        while True:
+            with self._lock:
+                if os.path.exists(ruta):
+                    contar("cache.frases.aciertos")
+                    return ruta
+                evento = self._en_curso.get(ruta)
+                if evento is None:
+                    evento = self._en_curso[ruta] = threading.Event()
+                    break
+            evento.wait()   # Otro hilo la está sintetizando
+            if not os.path.exists(ruta):
+                return None
+
+        contar("cache.frases.fallos")
+        try:
+            return ruta if self.sintetizar(frase, ruta, voz, rate) and os.path.exists(ruta) else None
+        finally:
+            with self._lock:
+                del self._en_curso[ruta]
+            evento.set()
+
+    def componer(self, texto, archivo_wav, voz, rate):
+        """
+        Audio de un texto a partir de sus frases (cada frase única se pide una sola vez).
+        Devuelve False si falta el audio de alguna frase (el grupo sigue el camino normal de un TTS
+        fallido; las frases perdidas ya las registra el cliente TTS), salvo con COMPONER_INCOMPLETOS.
+        """
+        frases = dividir_frases(texto)
+        contar("tts.frases", len(frases))
+        with ThreadPoolExecutor(max_workers=max(1, min(HILOS_FRASES, len(frases)))) as pool:
+            rutas = list(pool.map(lambda f: self.audio_frase(f, voz, rate), frases))
+        if None in rutas and not COMPONER_INCOMPLETOS:
+            contar("tts.grupos_incompletos")
+            return False
+
+        piezas, sample_rate = [], None
+        for ruta in rutas:
+            if ruta is None:
+                continue
+            pcm, sample_rate = leer_wav(ruta)
+            if piezas:
+                piezas.append(np.zeros((int(PAUSA_ENTRE_FRASES * sample_rate), pcm.shape[1]), dtype=pcm.dtype))
+            piezas.append(pcm)
+        if not piezas:
+            return False
+
+        temporal = temporal_unico(archivo_wav)
+        escribir_wav(temporal, np.concatenate(piezas), sample_rate)
+        os.replace(temporal, archivo_wav)
+        return True
@@ -0,0 +1,231 @@
+import numpy as np
+import subprocess
+import threading
+import select
+import atexit
+import math
+import os
+from framesMP3 import dividir_frames_mp3, formato_frame_mp3, quitar_id3, cabecera_xing, RETARDO_DECODIFICADOR
+from instrumentacion import contar, medir
+
+# Decodificadores MP3 persistentes: en vez de lanzar un ffmpeg por cada clip (una frase TTS, un
+# archivo de la caché...), unos pocos ffmpeg vivos por formato reciben los clips uno detrás de
+# otro por stdin y devuelven PCM por stdout. ffmpeg no tiene modo servidor ni marca el fin de un
+# clip, así que el límite se calcula contando frames: cada frame MP3 da exactamente 576 o 1152
+# muestras, y detrás de cada clip se escriben unos frames de silencio de relleno que empujan el
+# último frame real a la salida (el demuxer lee en paquetes de 1024 bytes) y se descartan.
+# Resultado idéntico al de un ffmpeg por clip, a la frecuencia original del MP3.
+USAR_TRABAJADORES = True
+TRABAJADORES_POR_FORMATO = 2      # ffmpeg vivos como mucho por (sample rate, canales)
+BYTES_RETENIDOS = 2048            # Entrada que ffmpeg puede retener sin decodificar (paquete + frame en curso)
+BITRATE_RELLENO = '64k'           # Válido en MPEG-1, 2 y 2.5
+TIMEOUT_LECTURA = 10.0            # Segundos sin salida antes de dar un trabajador por colgado
+MAX_BYTES_CLIP = 16 * 1024 ** 2   # Clips más grandes: un ffmpeg propio (no se retienen en memoria)
+
+
+def preparar_mp3(datos):
+    """
+    Separa un MP3 en frames de audio. Devuelve (frames, sample_rate, canales, muestras por frame,
+    muestras a quitar al principio, muestras totales o None). ValueError si no se puede segmentar
+    por frames (no es MP3, formato libre, cambia de formato a mitad...).
+    """
+    frames = dividir_frames_mp3(quitar_id3(bytes(datos)))
+    if not frames:
+        raise ValueError("No es un MP3 segmentable por frames")
+    # Un frame cortado al final se comería los bytes del relleno y desalinearía al trabajador
+    if len(frames[-1]) < 4 or formato_frame_mp3(frames[-1])[3] != len(frames[-1]):
+        frames = frames[:-1]
+    formatos = {formato_frame_mp3(f)[:3] for f in frames}
+    if len(formatos) != 1:
+        raise ValueError("MP3 vacío o con frames de formatos distintos")
+    sample_rate, canales, por_frame = formatos.pop()
+    saltar, total = 0, None
+    xing = cabecera_xing(frames[0])
+    if xing is not None:
+        frames = frames[1:]
+        declarados, retardo, relleno = xing
+        if retardo or relleno:
+            saltar = retardo + RETARDO_DECODIFICADOR
+            if declarados:
+                total = declarados * por_frame - relleno + RETARDO_DECODIFICADOR
+    return frames, sample_rate, canales, por_frame, saltar, total
+
+
+def _frame_silencio(sample_rate, canales):
+    """Un frame MP3 de silencio, sin reservorio (se decodifica solo), del formato pedido"""
+    contar("subprocesos.ffmpeg")
+    cmd = ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f"anullsrc=r={sample_rate}:cl={'mono' if canales == 1 else 'stereo'}",
+           '-t', '0.5', '-c:a', 'libmp3lame', '-b:a', BITRATE_RELLENO, '-reservoir', '0',
+           '-write_xing', '0', '-id3v2_version', '0', '-f', 'mp3', 'pipe:1']
+    result = subprocess.run(cmd, capture_output=True)
+    frames = dividir_frames_mp3(result.stdout) if result.returncode == 0 else []
+    if not frames:
+        raise RuntimeError(f"ffmpeg no pudo crear el relleno: {result.stderr[-200:].decode(errors='replace')}")
+    return frames[len(frames) // 2]
+
+
+class Decodificador:
+    """Un ffmpeg vivo que decodifica clips MP3 de un mismo formato, uno detrás de otro"""
+
+    def __init__(self, sample_rate, canales, por_frame, relleno):
+        self.canales = canales
+        self.por_frame = por_frame
+        self.relleno = relleno
+        self.frames_relleno = math.ceil(BYTES_RETENIDOS / len(relleno)) + 1
+        self.pendiente = 0          # Bytes de salida del relleno del clip anterior aún por descartar
+        self.errores = []
+        cmd = ['ffmpeg', '-v', 'error', '-probesize', '32', '-analyzeduration', '0', '-f', 'mp3', '-i', 'pipe:0',
+               '-f', 's16le', '-flush_packets', '1', 'pipe:1']
+        contar("subprocesos.ffmpeg")
+        contar("ffmpeg.trabajadores.arranques")
+        self.proceso = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, bufsize=0)
+        threading.Thread(target=self._leer_errores, daemon=True).start()
+
+    def _leer_errores(self):
+        # Cualquier aviso (frame corrupto, cabecera perdida...) puede cambiar las muestras por frame
+        for linea in self.proceso.stderr:
+            self.errores.append(linea)
+
+    def vivo(self):
+        return self.proceso.poll() is None and not self.errores
+
+    def _leer(self, n):
+        salida = bytearray()
+        descriptor = self.proceso.stdout.fileno()
+        while len(salida) < n:
+            listos, _, _ = select.select([descriptor], [], [], TIMEOUT_LECTURA)
+            if not listos:
+                raise TimeoutError("El trabajador ffmpeg no devuelve audio")
+            datos = os.read(descriptor, min(n - len(salida), 1 << 20))
+            if not datos:
+                raise RuntimeError("El trabajador ffmpeg terminó")
+            salida += datos
+        return salida
+
+    def decodificar(self, frames):
+        """PCM int16 [muestras, canales] de una lista de frames (frames x muestras por frame exactas)"""
+        entrada = b''.join(frames) + self.relleno * self.frames_relleno
+        fallo = []
+
+        def escribir():
+            # En otro hilo: si no, la tubería de salida se llena mientras se escribe y se bloquea
+            try:
+                vista = memoryview(entrada)
+                while vista:
+                    vista = vista[self.proceso.stdin.write(vista):]
+            except OSError as e:
+                fallo.append(e)
+
+        escritor = threading.Thread(target=escribir, daemon=True)
+        escritor.start()
+        try:
+            if self.pendiente:
+                descartado = self._leer(self.pendiente)
+                # Los dos primeros frames arrastran el final del clip anterior; el resto es silencio puro
+                if bytes(descartado[2 * self.por_frame * self.canales * 2:]).strip(b'\0'):
+                    raise RuntimeError("El trabajador ffmpeg perdió la alineación de frames")
+            pcm = self._leer(len(frames) * self.por_frame * self.canales * 2)
+        finally:
+            escritor.join(TIMEOUT_LECTURA)
+        if fallo or self.errores:
+            raise RuntimeError(f"El trabajador ffmpeg falló: {(fallo or self.errores)[-1]!r}")
+        self.pendiente = self.frames_relleno * self.por_frame * self.canales * 2
+        return np.frombuffer(bytes(pcm), dtype='<i2').reshape(-1, self.canales)
+
+    def cerrar(self):
+        try:
+            self.proceso.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proceso.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+            self.proceso.wait()
+
+    def matar(self):
+        self.proceso.kill()
+        self.proceso.wait()
+
+
+class PoolDecodificadores:
+    """Hasta TRABAJADORES_POR_FORMATO decodificadores vivos por (sample rate, canales), compartidos por los hilos"""
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._pid = os.getpid()
+        self._libres = {}       # formato -> [Decodificador]
+        self._vivos = {}        # formato -> cuántos hay (libres + en uso)
+        self._rellenos = {}     # (sample_rate, canales) -> frame de silencio
+
+    def _revisar_pid(self):
+        # Tras un fork (ProcessPoolExecutor) los ffmpeg y sus tuberías son del proceso padre
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._libres, self._vivos = {}, {}
+
+    def _tomar(self, formato):
+        sample_rate, canales, por_frame = formato
+        with self._condicion:
+            self._revisar_pid()
+            while not self._libres.get(formato) and self._vivos.get(formato, 0) >= TRABAJADORES_POR_FORMATO:
+                self._condicion.wait()
+            if self._libres.get(formato):
+                return self._libres[formato].pop()
+            self._vivos[formato] = self._vivos.get(formato, 0) + 1
+        try:
+            relleno = self._rellenos.get((sample_rate, canales))
+            if relleno is None:
+                relleno = self._rellenos[(sample_rate, canales)] = _frame_silencio(sample_rate, canales)
+            return Decodificador(sample_rate, canales, por_frame, relleno)
+        except BaseException:
+            self._soltar(formato, None)
+            raise
+
+    def _soltar(self, formato, decodificador):
+        with self._condicion:
+            if decodificador is not None and decodificador.vivo() and self._pid == os.getpid():
+                self._libres.setdefault(formato, []).append(decodificador)
+            else:
+                self._vivos[formato] = self._vivos.get(formato, 1) - 1
+            self._condicion.notify()
+
+    def decodificar(self, datos):
+        """
+        (PCM int16 [muestras, canales], sample_rate) de un MP3 en memoria, a su frecuencia original.
+        ValueError si el MP3 no se puede segmentar por frames (el llamador usa un ffmpeg propio);
+        RuntimeError si el trabajador falla (se descarta y el siguiente clip arranca otro).
+        """
+        frames, sample_rate, canales, por_frame, saltar, total = preparar_mp3(datos)
+        formato = (sample_rate, canales, por_frame)
+        decodificador = self._tomar(formato)
+        try:
+            with medir("ffmpeg.trabajadores.decodificar"):
+                pcm = decodificador.decodificar(frames) if frames else np.zeros((0, canales), dtype='<i2')
+        except BaseException:
+            contar("ffmpeg.trabajadores.descartados")
+            decodificador.matar()
+            self._soltar(formato, None)
+            raise
+        self._soltar(formato, decodificador)
+        contar("ffmpeg.trabajadores.clips")
+        return pcm[saltar:total], sample_rate
+
+    def cerrar(self):
+        with self._condicion:
+            libres = [d for lista in self._libres.values() for d in lista] if self._pid == os.getpid() else []
+            self._libres, self._vivos = {}, {}
+        for decodificador in libres:
+            decodificador.cerrar()
+
+
+pool = PoolDecodificadores()
+atexit.register(pool.cerrar)
+
+
+def decodificar_mp3(datos):
+    """(PCM int16 [muestras, canales], sample_rate) de un MP3 en memoria usando el pool compartido"""
+    if len(datos) > MAX_BYTES_CLIP:
+        raise ValueError("Clip demasiado grande para un trabajador")
+    return pool.decodificar(datos)
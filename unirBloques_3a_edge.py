@@ -3,6 +3,28 @@ import subprocess
 import os
 import random
 from datetime import datetime
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from cacheAudio import audio_pelicula
+from almacenPCM import AlmacenPCM, escribir_wav, es_wav_normalizado
+from sonoridad import normalizar_wav, OBJETIVO_LUFS
+from mezclaAudio import renderizar_superpuesto
+from ajusteTiempo import crear_pista_doblaje, factor_tempo, rate_para_tempo
+from detectorVoz import ventana_voz
+import planRender
+from planRender import PlanRender
+from almacenPCM import leer_wav
+from sonoridad import ganancia_normalizacion
+from renderIncremental import renderizar_incremental, codificar_wav_paralelo, mapa_salida, PROCESOS_CODIFICACION, DIR_BLOQUES
+from indiceSalida import escribir_indice
+from empaquetado import empaquetar_m4b, empaquetar_mka
+from clienteTTS import ClienteTTS, edge_a_wav
+from textoTTS import FrasesTTS, limpiar_texto
+from catalogo import Catalogo, ARCHIVO_CATALOGO, DIR_BLOBS, registrar_resultado
+from espacioTrabajo import EspacioTrabajo, dir_temporal, escritura_atomica, temporal_unico
+import codecAudio
+import instrumentacion
+from instrumentacion import medir, contar, contar_bytes, ejecutar
 
 
 # Configuración
@@ -10,8 +32,8 @@ video = 'The.Matrix.1999.mp4'
 
 ##### si es pelicula nueva o a reprocesar desde 0 mirar la variable archivosYaGenerados
 archivosYaGenerados = False ##### esto cambia para generar de nuevos los archivos por ejemplo para hacerle el proceso a una nueva pelicula
-subs = pysrt.open('Hackers.1995.REMASTERED.1080p.BluRay.x264.DTS-FGT-en.srt')
-subs_es = pysrt.open('Hackers.1995.REMASTERED.1080p.BluRay.x264.DTS-FGT-es-419.srt')
+SRT_EN = 'Hackers.1995.REMASTERED.1080p.BluRay.x264.DTS-FGT-en.srt'
+SRT_ES = 'Hackers.1995.REMASTERED.1080p.BluRay.x264.DTS-FGT-es-419.srt'
 # Configuración de TTS (Text-to-Speech)
 
 ##TTS_ENGINE = "win"  # "edge" (Microsoft Edge TTS) o "win" (Windows TTS)
@@ -25,6 +47,16 @@ TTS_VOICE_EN = "en-CA-LiamNeural"  # Voz para inglés (puedes cambiarla) es-AR-E
 TTS_VOICE_ES = "es-AR-ElenaNeural"  ###"en-AU-NatashaNeural"  # Voz australiana para español (tal como pediste)
 TTS_RATE = "+0%"
 TTS_VOLUME = "+0%"
+# TTS en streaming: los chunks MP3 de Edge se decodifican mientras llegan y se guardan directamente
+# como WAV del formato común (sin MP3 intermedio ni paso de normalización). GUARDAR_MP3_TTS conserva
+# además el MP3 original junto al WAV.
+TTS_STREAMING = True
+GUARDAR_MP3_TTS = False
+# Sintetizar por frases: cada frase distinta se pide una sola vez por película (tts_frases/)
+# y el audio del grupo se compone con esas piezas. Requiere TTS_STREAMING (WAV).
+TTS_POR_FRASES = True
+# Cliente Edge TTS compartido: concurrencia adaptativa, reintentos y circuito (ver clienteTTS.py)
+cliente_tts = ClienteTTS()
 
 
 
@@ -35,9 +67,43 @@ sonido_silencio = "tono_silence_1845.mp3"
 VOLUMEN_AUDIO_ORIGINAL = 1 ## 0.3  # 30% volumen para audio original
 VOLUMEN_TTS = 1.0  # 100% volumen para TTS
 
+# Normalización de sonoridad (EBU R128) por segmento antes de concatenar.
+# Los volúmenes de arriba se aplican encima del objetivo (1.0 = exactamente OBJETIVO_LUFS).
+NORMALIZAR_SONORIDAD = True
+
+# Modo de render:
+#   "secuencial"  -> TTS ES, tono, TTS EN, tono... concatenados (archivo de estudio)
+#   "superpuesto" -> el TTS se mezcla encima del audio del grupo bajando la película (ducking)
+#   "doblaje"     -> pista del largo de la película con cada TTS acelerado para caber en su hueco
+MODO_RENDER = "secuencial"
+IDIOMA_SUPERPUESTO = 2  # 1 = inglés, 2 = español (para "superpuesto" y "doblaje")
+# Cómo encajar el TTS en su hueco en modo "doblaje":
+#   "wsola" -> time-stretch local del clip
+#   "rate"  -> volver a pedir el TTS con TTS_RATE ajustado (y WSOLA para el resto que no quepa)
+AJUSTE_DOBLAJE = "wsola"
+
+# Cortar los grupos directamente del PCM mapeado en memoria (WAV) en vez de ffmpeg -> MP3
+USAR_ALMACEN_PCM = True
+GANANCIA_GRUPO_DB = 0.0 if NORMALIZAR_SONORIDAD else 5.0  # Sin normalizar, el antiguo '-af volume=5dB'
+# Recortar los márgenes de cada grupo (los +5 s del final) hasta donde acaba la voz (detectorVoz.py)
+# antes de escribir el corte; g['inicio'] / g['fin'] pasan a ser la ventana recortada
+RECORTAR_SILENCIO_GRUPOS = True
+
+# Codificar la salida secuencial por bloques MP3 independientes (bloques_mp3/):
+# al corregir una línea solo se recodifican los bloques cuyo contenido cambió
+RENDER_INCREMENTAL = True
+# Procesos para codificar la salida final a MP3 (1 = un solo ffmpeg como antes)
+PROCESOS_MP3 = PROCESOS_CODIFICACION
+
+# Formatos extra a partir del mismo plan (modo "secuencial"):
+#   "m4b" -> audiolibro con un capítulo por grupo (título = texto del subtítulo)
+#   "mka" -> pistas separadas EN TTS / ES TTS / película, con los mismos capítulos
+EMPAQUETAR = []  # p. ej. ["m4b", "mka"]
+
 # ==============================================
 # FUNCIONES DE TEXTO A VOZ (TTS)
 # ==============================================
+@medir("verificar_formatos")
 def verificar_formatos(lista_file):
     """Verificar las especificaciones de cada archivo"""
     
@@ -47,58 +113,91 @@ def verificar_formatos(lista_file):
     for linea in lineas:
         if linea.startswith("file '"):
             ruta = linea[6:-2].strip()
-            cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', 
-                   '-show_format', '-show_streams', ruta]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                import json
-                info = json.loads(result.stdout)
-                if 'streams' in info and info['streams']:
-                    stream = info['streams'][0]
-                    print(f"\nArchivo: {os.path.basename(ruta)}")
-                    print(f"  Codec: {stream.get('codec_name', 'N/A')}")
-                    print(f"  Sample rate: {stream.get('sample_rate', 'N/A')}")
-                    print(f"  Canales: {stream.get('channels', 'N/A')}")
-                    print(f"  Bitrate: {info['format'].get('bit_rate', 'N/A')}")
+            info = codecAudio.info(ruta)   # Sin ffprobe si hay backend de códec en proceso
+            if info:
+                print(f"\nArchivo: {os.path.basename(ruta)}")
+                print(f"  Codec: {info['codec'] or 'N/A'}")
+                print(f"  Sample rate: {info['sample_rate'] or 'N/A'}")
+                print(f"  Canales: {info['canales'] or 'N/A'}")
+                print(f"  Bitrate: {info['bitrate'] or 'N/A'}")
 import subprocess
 import os
 
-def normalizar_archivos(lista_archivos, temp_dir="temp_normalized"):
-    """Convertir todos los archivos al mismo formato"""
+@medir("normalizacion")
+def normalizar_archivos(lista_archivos, temp_dir="temp_normalized", volumenes=None):
+    """
+    Convertir todos los archivos al mismo formato.
+    volumenes: {ruta: volumen lineal}; esos archivos se normalizan además a OBJETIVO_LUFS
+    (los que no están, como tonos y silencios, conservan su nivel).
+    """
     if not os.path.exists(temp_dir):
         os.makedirs(temp_dir)
     
+    volumenes = volumenes or {}
     archivos_normalizados = []
+    ya_procesados = {}  # Tonos y silencios se repiten cientos de veces: procesar cada uno una vez
     
     for i, archivo in enumerate(lista_archivos):
+        if archivo in ya_procesados:
+            contar("cache.normalizacion.aciertos")
+            archivos_normalizados.append(ya_procesados[archivo])
+            continue
+        contar("cache.normalizacion.fallos")
+        
+        salida = _normalizar_archivo(archivo, i, temp_dir, volumenes.get(archivo))
+        if salida:
+            ya_procesados[archivo] = salida
+            archivos_normalizados.append(salida)
+
+    return archivos_normalizados
+
+def _normalizar_archivo(archivo, i, temp_dir, volumen=None):
+    """Decodifica un archivo al formato común y, si tiene volumen asignado, ajusta su sonoridad"""
+    # Los WAV del almacén PCM ya están en el formato común: no hace falta recodificar
+    if es_wav_normalizado(archivo):
+        output = archivo
+    else:
         output = os.path.join(temp_dir, f"norm_{i}.wav")
         
-        # Normalizar a formato común: WAV, 44100Hz, stereo, PCM
-        cmd = [
-            'ffmpeg',
-            '-i', archivo,
-            '-ar', '44100',          # Sample rate común
-            '-ac', '2',              # Stereo
-            '-acodec', 'pcm_s16le',  # Codec común
-            '-y',
-            output
-        ]
+        # Normalizar a formato común: WAV, 44100Hz, stereo, PCM (en proceso si hay backend de códec)
         print(f" normalizando {output}")
         try :
-            subprocess.run(cmd, check=True, capture_output=True)
-            archivos_normalizados.append(output)
+            codecAudio.a_wav(archivo, output)
         except Exception as e:
             print(f"Error en normalizar archivos : {e}")
-            ##return False
-
-    return archivos_normalizados
+            return None
+        contar_bytes("normalizados", output)
+    
+    if NORMALIZAR_SONORIDAD and volumen is not None:
+        # Medición por bloques en NumPy + ganancia, sin un 'loudnorm' de dos pasadas
+        salida_sonoridad = os.path.join(temp_dir, f"loud_{i}.wav")
+        try:
+            ganancia = normalizar_wav(output, salida_sonoridad, OBJETIVO_LUFS, volumen)
+            print(f" sonoridad {os.path.basename(archivo)}: {ganancia:+.1f} dB")
+            return salida_sonoridad
+        except Exception as e:
+            print(f"Error normalizando sonoridad : {e}")
+    
+    return output
 
-def concatenar_normalizados(lista_normalizados, output_final):
+@medir("concat")
+def concatenar_normalizados(lista_normalizados, output_final, procesos=None):
     """Concatenar archivos ya normalizados"""
-    # Crear archivo de lista
-    lista_file = "lista_concat.txt"
+    procesos = PROCESOS_MP3 if procesos is None else procesos
+    if procesos > 1 and len(lista_normalizados) == 1 and lista_normalizados[0].lower().endswith('.wav'):
+        # Una sola pista larga: codificar por tramos en paralelo y unir sin huecos
+        codificar_wav_paralelo(lista_normalizados[0], output_final, procesos)
+        contar_bytes("salida", output_final)
+        return output_final
+    if codecAudio.en_proceso() and all(es_wav_normalizado(a) for a in lista_normalizados):
+        # WAV ya normalizados: se codifican en este proceso leyéndolos por bloques
+        with escritura_atomica(output_final) as temporal:
+            codecAudio.codificar_wav_mp3(lista_normalizados, temporal, '192k')
+        contar_bytes("salida", output_final)
+        return output_final
+    
+    # Crear archivo de lista (nombre único: varias películas pueden concatenar a la vez)
+    lista_file = temporal_unico(os.path.join(os.path.dirname(output_final), "lista_concat.txt"))
     with open(lista_file, 'w') as f:
         for archivo in lista_normalizados:
             f.write(f"file '{archivo}'\n")
@@ -114,29 +213,28 @@ def concatenar_normalizados(lista_normalizados, output_final):
         '-ar', '44100',
         '-ac', '2',
         '-y',
-        output_final
     ]
     
-    subprocess.run(cmd, check=True, capture_output=True)
-    
-    # Limpiar
-    os.remove(lista_file)
+    # Se escribe con otro nombre y se publica al acabar: nunca queda una salida a medias
+    try:
+        with escritura_atomica(output_final) as temporal:
+            ejecutar(cmd + [temporal], check=True, capture_output=True)
+    finally:
+        os.remove(lista_file)
+    contar_bytes("salida", output_final)
     return output_final
 
 def tts_con_edge(texto, archivo_salida, voz=TTS_VOICE_EN, rate=TTS_RATE):
     """
-    Convierte texto a audio usando Microsoft Edge TTS
+    Convierte texto a audio usando Microsoft Edge TTS (a través del cliente adaptativo:
+    límite de concurrencia, reintentos y circuito compartidos por todos los hilos)
     """
     try:
-        import asyncio
-        import edge_tts
-        
-        async def generar_audio():
-            communicate = edge_tts.Communicate(texto, voz)
-            await communicate.save(archivo_salida)
-        
-        asyncio.run(generar_audio())
-        
+        if archivo_salida.lower().endswith('.wav'):
+            archivo_mp3 = os.path.splitext(archivo_salida)[0] + '.mp3' if GUARDAR_MP3_TTS else None
+            cliente_tts.sintetizar(texto, archivo_salida, voz, rate, funcion=edge_a_wav, archivo_mp3=archivo_mp3)
+        else:
+            cliente_tts.sintetizar(texto, archivo_salida, voz, rate)
         return os.path.exists(archivo_salida)
     except ImportError:
         print("  ❌ edge-tts no está instalado. Instala con: pip install edge-tts")
@@ -254,10 +352,12 @@ def tts_con_pyttsx3(texto, archivo_salida):
         print("  ❌ pyttsx3 no está instalado. Instala con: pip install pyttsx3")
         return False
 
-def texto_a_audio(texto, archivo_salida, grupo_id, idioma=1):
+@medir("tts")
+def texto_a_audio(texto, archivo_salida, grupo_id, idioma=1, voz=None):
     """
     Convierte texto a audio usando el método configurado.
     idioma: 1 = inglés, 2 = español
+    voz: voz de Edge TTS (por defecto TTS_VOICE_EN / TTS_VOICE_ES según idioma)
     """
     print(f"  🔊 Convirtiendo texto a audio (Grupo {grupo_id})...")
     print(f"  📝 Texto: {texto[:100]}..." if len(texto) > 100 else f"  📝 Texto: {texto}")
@@ -269,8 +369,13 @@ def texto_a_audio(texto, archivo_salida, grupo_id, idioma=1):
     
     if TTS_ENGINE == "edge":
         # Seleccionar voz según idioma
-        voz = TTS_VOICE_ES if idioma == 2 else TTS_VOICE_EN
-        exito = tts_con_edge(texto_limpio, archivo_salida, voz=voz, rate=TTS_RATE)
+        if voz is None:
+            voz = TTS_VOICE_ES if idioma == 2 else TTS_VOICE_EN
+        if TTS_POR_FRASES and archivo_salida.lower().endswith('.wav'):
+            frases = FrasesTTS.para(os.path.dirname(archivo_salida) or ".", tts_con_edge)
+            exito = frases.componer(texto_limpio, archivo_salida, voz, TTS_RATE)
+        else:
+            exito = tts_con_edge(texto_limpio, archivo_salida, voz=voz, rate=TTS_RATE)
     elif TTS_ENGINE == "win":
         if idioma == 1:
             exito = tts_con_windows(texto_limpio, archivo_salida)
@@ -284,9 +389,12 @@ def texto_a_audio(texto, archivo_salida, grupo_id, idioma=1):
     
     if exito and os.path.exists(archivo_salida):
         tamano = os.path.getsize(archivo_salida)
+        contar("tts.ok")
+        contar("bytes.tts", tamano)
         print(f"  ✅ Audio TTS creado: {os.path.basename(archivo_salida)} ({tamano:,} bytes)")
         return True
     else:
+        contar("tts.errores")
         print(f"  ❌ No se pudo crear audio TTS")
         return False
 
@@ -296,6 +404,15 @@ def crear_tono_separador(tipo="beep", duracion=0.3, frecuencia=800, output_file=
     if output_file is None:
         output_file = f'tono_{tipo}_{random.randint(1000, 9999)}.mp3'
     
+    if codecAudio.en_proceso():
+        # Sintetizado con NumPy y codificado sin lanzar ffmpeg (mismas fuentes que las de lavfi)
+        pcm = codecAudio.generar_tono(tipo, duracion, frecuencia)
+        try:
+            return codecAudio.codificar_mp3(pcm, output_file, canales=pcm.shape[1], bitrate=BITRATE_TONO)
+        except Exception as e:
+            print(f"❌ Error creando tono: {e}")
+            return None
+    
     if tipo == "beep":
         # Pitido corto
         cmd = [
@@ -360,199 +477,424 @@ def segundos_a_str(segundos):
     milisegundos = int((segundos - int(segundos)) * 1000)
     return f"{horas:02}:{minutos:02}:{segs:02}.{milisegundos:03}"
 
+@medir("normalizacion")
+def preparar_asset(archivo, temp_dir, cache, volumen=None):
+    """
+    WAV en formato común y ganancia lineal de un archivo fuente (una sola vez por archivo).
+    Con volumen, la ganancia incluye la normalización de sonoridad a OBJETIVO_LUFS.
+    """
+    if archivo in cache:
+        contar("cache.assets.aciertos")
+        return cache[archivo]
+    contar("cache.assets.fallos")
+    
+    wav = None
+    ganancia = 1.0
+    if archivo and os.path.exists(archivo):
+        # Nombre según la fuente (no según el orden): los assets preparados por adelantado
+        # en otra caché (prefetch) no chocan con los del plan
+        nombre = os.path.splitext(os.path.basename(archivo))[0]
+        wav = _normalizar_archivo(archivo, f"asset_{nombre}", temp_dir)
+    if wav and NORMALIZAR_SONORIDAD and volumen is not None:
+        pcm, sr = leer_wav(wav)
+        ganancia = 10 ** (ganancia_normalizacion(pcm, sr, OBJETIVO_LUFS) / 20.0) * volumen
+    
+    cache[archivo] = (wav, ganancia)
+    return cache[archivo]
+
+def construir_plan_secuencial(grupos_render, separador, temp_dir="temp_normalized"):
+    """
+    Plan del archivo de estudio: por grupo TTS ES, separador, TTS EN, y dos separadores entre grupos.
+    separador: lista de archivos (silencio, tono, silencio) que forman un bloque separador.
+    """
+    os.makedirs(temp_dir, exist_ok=True)
+    plan = PlanRender()
+    cache = {}
+    for g in grupos_render:
+        cache.update(g.get('assets', {}))  # Ya preparados durante el prefetch de TTS
+    
+    def agregar_separador():
+        for archivo in separador:
+            wav, _ = preparar_asset(archivo, temp_dir, cache)
+            if wav:
+                plan.agregar(wav, planRender.TIPO_SILENCIO if archivo == sonido_silencio else planRender.TIPO_TONO)
+    
+    for k, g in enumerate(grupos_render):
+        es, ganancia_es = preparar_asset(g['tts_es'], temp_dir, cache, VOLUMEN_TTS)
+        en, ganancia_en = preparar_asset(g['tts_en'], temp_dir, cache, VOLUMEN_TTS)
+        plan.grupos[g['grupo']] = {
+            'cues': g['cues'],
+            'inicio': g['inicio'],
+            'fin': g['fin'],
+            'textos': {'en': g['texto_en'].strip(), 'es': g['texto_es'].strip()},
+        }
+        
+        if es or en:
+            if es:
+                plan.agregar(es, planRender.TIPO_TTS_ES, grupo=g['grupo'], ganancia=ganancia_es)
+            agregar_separador()
+            if en:
+                plan.agregar(en, planRender.TIPO_TTS_EN, grupo=g['grupo'], ganancia=ganancia_en)
+        
+        # Separación entre grupos (excepto después del último)
+        if k < len(grupos_render) - 1:
+            agregar_separador()
+            agregar_separador()
+    
+    return plan
+
 # Configuración
+ARCHIVO_PLAN = "plan_render.npz"
+DIR_ASSETS_PLAN = "assets_plan"  # WAV del plan que no están ya en dir_salida (se guardan con el plan)
+ARCHIVO_METRICAS = "metricas.json"
 MAX_ESPACIO_ENTRE_BLOQUES = 2.0  # Máximo 1 segundo para unir bloques
-grupos = []
-grupo_actual = []
-archivos_temporales = []
-archivos_tonos = []
+LIM_MUESTRA = None  # Procesar solo los primeros N grupos (None = todos), p. ej. 5 para pruebas
+# Grupos con el TTS pedido por delante de la extracción (cola acotada: la red no se adelanta más)
+PREFETCH_TTS = 8
+# Registrar película, cues, grupos, etapas y artefactos en el catálogo SQLite (catalogo.py);
+# los artefactos se guardan además como blobs por contenido en DIR_BLOBS
+USAR_CATALOGO = True
 
 
 
 MARGEN_FIN_GRUPO = 1.0  # Margen al final de cada grupo (cambiaste de 0.1 a 1)
 TIPO_TONO = "beep"  # Opciones: "beep", "click", "silence", "fade"
 DURACION_TONO = 1 ###  0.3  # Duración del tono en segundos
+BITRATE_TONO = '64k'  # Tono codificado en proceso (el '-q:a 9' de ffmpeg ronda esa tasa)
 
 
-# 1. Crear tono de separación
-tono_separador = crear_tono_separador(
-    tipo=TIPO_TONO, 
-    duracion=DURACION_TONO,
-    frecuencia=800
-)
-if tono_separador:
-    archivos_tonos.append(tono_separador)
-    print(f"✅ Tono de separación creado: {tono_separador} ({TIPO_TONO}, {DURACION_TONO}s)")
-
-print(f"Extrayendo diálogos agrupando bloques cercanos...\n")
-# 1. Agrupar subtítulos cercanos
-for i in range(len(subs)):
-    if not grupo_actual:
-        # Primer subtítulo del grupo
-        grupo_actual.append(i)
-    else:
-        # Verificar distancia con el anterior
-        sub_actual = subs[i]
-        sub_anterior = subs[grupo_actual[-1]]
-        
-        # Calcular espacio entre fin del anterior e inicio del actual
-        fin_anterior = sub_anterior.end.ordinal / 1000.0  # en segundos
-        inicio_actual = sub_actual.start.ordinal / 1000.0  # en segundos
-        espacio = inicio_actual - fin_anterior
-        
-        if espacio <= MAX_ESPACIO_ENTRE_BLOQUES:
-            # Están cerca, agregar al mismo grupo
+def cargar_subtitulos(fuente):
+    """Abre un .srt, o el primer .srt dentro de un .zip (como los que bajamos de OpenSubtitles)"""
+    if fuente.lower().endswith('.zip'):
+        import zipfile
+        with zipfile.ZipFile(fuente) as z:
+            nombres = [n for n in z.namelist() if n.lower().endswith('.srt')]
+            if not nombres:
+                raise ValueError(f"El zip no contiene ningún .srt: {fuente}")
+            datos = z.read(nombres[0])
+        for codificacion in ('utf-8-sig', 'cp1252'):
+            try:
+                return pysrt.from_string(datos.decode(codificacion))
+            except UnicodeDecodeError:
+                continue
+    return pysrt.open(fuente)
+
+def agrupar_subtitulos(subs, max_espacio=MAX_ESPACIO_ENTRE_BLOQUES):
+    """Agrupa los índices de subtítulos separados por menos de max_espacio segundos"""
+    grupos = []
+    grupo_actual = []
+    for i in range(len(subs)):
+        if not grupo_actual:
+            # Primer subtítulo del grupo
             grupo_actual.append(i)
         else:
-            # Están lejos, cerrar grupo actual y empezar nuevo
-            grupos.append(grupo_actual.copy())
-            grupo_actual = [i]
-
-# Agregar el último grupo
-if grupo_actual:
-    grupos.append(grupo_actual)
-
-print(f"Encontrados {len(grupos)} grupos de diálogos cercanos")
-print(f"(Uniendo bloques con menos de {MAX_ESPACIO_ENTRE_BLOQUES} segundo de separación)\n")
-
-# 2. Extraer cada grupo 
-### (grupos[:5])
-len_prueba = 5
-lim_muestra = len(grupos)  ### 5 ##len(grupos)##50
-for idx_grupo, grupo in enumerate(grupos[:lim_muestra]):  # Solo primeros 5 grupos para prueba
-    if len(grupo) == 0:
-        continue
-    
-    # Obtener primer y último subtítulo del grupo
-    primer_idx = grupo[0]
-    ultimo_idx = grupo[-1]
-    
-    sub_inicio = subs[primer_idx]
-    sub_fin = subs[ultimo_idx]
-    
-    # Calcular tiempos del grupo
-    inicio_grupo = sub_inicio.start.ordinal / 1000.0
-    fin_grupo = sub_fin.end.ordinal / 1000.0
-    
-    # Agregar pequeño margen (0.1 segundos)
-    inicio_grupo = max(0, inicio_grupo - 0.1)
-    fin_grupo = fin_grupo + 5 ### aumento  margen de 0.1 a 0.5 a 1
-    
+            # Verificar distancia con el anterior
+            sub_actual = subs[i]
+            sub_anterior = subs[grupo_actual[-1]]
+
+            # Calcular espacio entre fin del anterior e inicio del actual
+            fin_anterior = sub_anterior.end.ordinal / 1000.0  # en segundos
+            inicio_actual = sub_actual.start.ordinal / 1000.0  # en segundos
+            espacio = inicio_actual - fin_anterior
+
+            if espacio <= max_espacio:
+                # Están cerca, agregar al mismo grupo
+                grupo_actual.append(i)
+            else:
+                # Están lejos, cerrar grupo actual y empezar nuevo
+                grupos.append(grupo_actual.copy())
+                grupo_actual = [i]
+
+    # Agregar el último grupo
+    if grupo_actual:
+        grupos.append(grupo_actual)
+    return grupos
+
+def preparar_grupos(subs, subs_es, grupos, dir_salida=".", usar_wav=True, lim_muestra=None):
+    """
+    Tiempos, cues, textos y archivos de cada grupo: la entrada de las etapas de
+    extracción, TTS y render (un dict por grupo).
+    """
+    grupos_render = []
+    for idx_grupo, grupo in enumerate(grupos[:lim_muestra]):
+        if len(grupo) == 0:
+            continue
+
+        # Obtener primer y último subtítulo del grupo
+        primer_idx = grupo[0]
+        ultimo_idx = grupo[-1]
+
+        sub_inicio = subs[primer_idx]
+        sub_fin = subs[ultimo_idx]
+
+        # Calcular tiempos del grupo
+        inicio_grupo = sub_inicio.start.ordinal / 1000.0
+        fin_grupo = sub_fin.end.ordinal / 1000.0
+
+        # Agregar pequeño margen (0.1 segundos)
+        inicio_grupo = max(0, inicio_grupo - 0.1)
+        fin_grupo = fin_grupo + 5 ### aumento  margen de 0.1 a 0.5 a 1
+
+        texto_para_tts = ""
+        texto_para_tts_esp = ""
+        for subtitle in subs[primer_idx:ultimo_idx + 1]:
+            texto_para_tts += limpiar_texto(subtitle.text) + " "
+        for subtitle in subs_es[primer_idx:ultimo_idx + 1]:
+            texto_para_tts_esp += limpiar_texto(subtitle.text) + " "
+
+        extension = 'wav' if usar_wav else 'mp3'
+        extension_tts = 'wav' if TTS_ENGINE == "edge" and TTS_STREAMING else 'mp3'
+        grupos_render.append({
+            'grupo': idx_grupo,
+            'cues': list(range(primer_idx, ultimo_idx + 1)),
+            'inicio': inicio_grupo,
+            'fin': fin_grupo,
+            'inicio_cue': sub_inicio.start.ordinal / 1000.0,
+            'fin_cue': sub_fin.end.ordinal / 1000.0,
+            'pelicula': os.path.join(dir_salida, f'grupo_{idx_grupo+1:03d}.{extension}'),
+            'tts_en': os.path.join(dir_salida, f"tts_{primer_idx}.{extension_tts}"),
+            'tts_es': os.path.join(dir_salida, f"tts_es_{primer_idx}.{extension_tts}"),
+            'texto_en': texto_para_tts,
+            'texto_es': texto_para_tts_esp,
+        })
+    return grupos_render
+
+def recortar_silencio(g, pcm, sample_rate):
+    """Ajusta la ventana del grupo a la voz alrededor de sus subtítulos; devuelve el PCM recortado"""
+    with medir("extraccion.vad"):
+        desde, hasta = ventana_voz(pcm, sample_rate, g['inicio_cue'] - g['inicio'], g['fin_cue'] - g['inicio'])
+    contar("vad.segundos_recortados", round((len(pcm) - (hasta - desde)) / sample_rate, 3))
+    g['inicio'], g['fin'] = g['inicio'] + desde / sample_rate, g['inicio'] + hasta / sample_rate
+    return pcm[desde:hasta]
+
+@medir("extraccion")
+def extraer_grupo(g, subs, almacen=None, audio_fuente=None):
+    """Etapa de extracción: corta el audio de la película del grupo a g['pelicula']"""
+    inicio_grupo, fin_grupo = g['inicio'], g['fin']
+    primer_idx, ultimo_idx = g['cues'][0], g['cues'][-1]
+    output_file = g['pelicula']
+
     # Convertir a string
     inicio_str = segundos_a_str(inicio_grupo)
     fin_str = segundos_a_str(fin_grupo)
-    
+
     duracion_grupo = fin_grupo - inicio_grupo
-    
-    output_file = f'grupo_{idx_grupo+1:03d}.mp3'
-   
-   
-    
-    
+
     # Mostrar información del grupo
-    print(f"=== Grupo {idx_grupo+1} ===")
-    print(f"Subtítulos: {primer_idx+1} a {ultimo_idx+1} ({len(grupo)} subtítulos)")
+    print(f"=== Grupo {g['grupo']+1} ===")
+    print(f"Subtítulos: {primer_idx+1} a {ultimo_idx+1} ({len(g['cues'])} subtítulos)")
     print(f"Tiempo: {inicio_str} -> {fin_str}")
     print(f"Duración grupo: {duracion_grupo:.2f} segundos")
-    
+
     # Mostrar textos de los subtítulos
-    for j, sub_idx in enumerate(grupo):
+    for j, sub_idx in enumerate(g['cues']):
         sub = subs[sub_idx]
         tiempo_sub = f"{sub.start} -> {sub.end}"
         print(f"  {j+1}. [{tiempo_sub}] {sub.text[:60]}...")
-    
+
     print(f"Extrayendo a: {output_file}")
-    if archivosYaGenerados == False:
-        # Comando FFmpeg
-        cmd = [
-            'ffmpeg',
-            '-i', video,
-            '-ss', inicio_str,
-            '-to', fin_str,
-            '-af', 'volume=5dB',  # ← Aumentar 5 decibeles
-            '-q:a', '2',
-            '-map', '0:a',
-            '-y',
+    if almacen:
+        # Corte por aritmética de punteros: vista del memmap escrita directamente a WAV
+        vista = almacen.rebanada(inicio_grupo, fin_grupo)
+        if RECORTAR_SILENCIO_GRUPOS:
+            vista = recortar_silencio(g, vista, almacen.sample_rate)
+        escribir_wav(output_file, vista, almacen.sample_rate, ganancia_db=GANANCIA_GRUPO_DB)
+        contar("extraccion.grupos")
+        contar_bytes("grupos", output_file)
+        print(f"✅ Extraído: {output_file} ({len(vista) / almacen.sample_rate:.2f}s desde el almacén PCM)")
+        print()
+        return True
+
+    if codecAudio.en_proceso() or RECORTAR_SILENCIO_GRUPOS:
+        # Corte y codificación en este proceso (sin ffmpeg ni ffprobe por grupo si hay backend en
+        # proceso); el recorte de silencio necesita el PCM antes de codificar
+        try:
+            pcm = codecAudio.decodificar(audio_fuente, inicio=inicio_grupo, fin=fin_grupo)
+            if RECORTAR_SILENCIO_GRUPOS:
+                pcm = recortar_silencio(g, pcm, codecAudio.SAMPLE_RATE)
+                duracion_grupo = g['fin'] - g['inicio']
+            codecAudio.guardar(pcm, output_file, GANANCIA_GRUPO_DB)
+        except Exception as e:
+            print(f"❌ Error: {str(e)[:200]}")
+            print()
+            return False
+        contar("extraccion.grupos")
+        contar_bytes("grupos", output_file)
+        actual_duration = codecAudio.duracion(output_file) or 0.0
+        print(f"✅ Extraído: {output_file}")
+        print(f"   Duración real: {actual_duration:.2f}s (esperada: {duracion_grupo:.2f}s)")
+        print()
+        return True
+
+    # Comando FFmpeg
+    cmd = [
+        'ffmpeg',
+        '-ss', inicio_str,
+        '-to', fin_str,
+        '-i', audio_fuente,
+        '-af', f'volume={GANANCIA_GRUPO_DB}dB',  # ← Aumento fijo solo si no se normaliza la sonoridad
+        '-q:a', '2',
+        '-map', '0:a',
+        '-y',
+        output_file
+    ]
+    result = ejecutar(cmd, capture_output=True, text=True)
+
+    if result.returncode == 0:
+        contar("extraccion.grupos")
+        contar_bytes("grupos", output_file)
+        print(f"✅ Extraído: {output_file}")
+
+        # Verificar duración real
+        cmd_check = [
+            'ffprobe',
+            '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
             output_file
         ]
-    texto_para_tts = ""
-    texto_para_tts_esp = ""
-    for subtitle in subs[primer_idx:ultimo_idx + 1]:
-        texto_para_tts += subtitle.text + " "
-    for subtitle in subs_es[primer_idx:ultimo_idx + 1]:
-        texto_para_tts_esp += subtitle.text + " "
-    ### let texto_para_tts = subs[primer_idx] + subs[primer_idx+1]
-    archivo_salida = "tts_"+str(primer_idx)+".mp3"
-    archivo_salida_esp = "tts_es_"+str(primer_idx)+".mp3"
-    print(" archivo_salida tts "+archivo_salida)
-    print(" archivo_salida tts es "+archivo_salida_esp)
-    tts_audio = 0
-    if archivosYaGenerados == False:
-        tts_audio =  texto_a_audio(texto_para_tts, archivo_salida, primer_idx)
-        tts_audio_es =  texto_a_audio(texto_para_tts_esp, archivo_salida_esp, primer_idx,idioma=2)
-    ####  primero el tts
-    if idx_grupo < len(grupos[:lim_muestra]) - 1 and ( tts_audio or archivosYaGenerados ) :
-        archivos_temporales.append(archivo_salida_esp)
-        if idx_grupo < len(grupos[:lim_muestra]) - 1 and tono_separador:
-            archivos_temporales.append(sonido_silencio)
-            archivos_temporales.append(tono_suave_320)
-            archivos_temporales.append(sonido_silencio)
-        archivos_temporales.append(archivo_salida)
-
-    # Añadir tono de separación (excepto después del último grupo)
-    if idx_grupo < len(grupos[:lim_muestra]) - 1 and tono_separador:
-        archivos_temporales.append(sonido_silencio)
-        archivos_temporales.append(tono_suave_320)
-        archivos_temporales.append(sonido_silencio)
-    ##### para q se escuche primero  el tts
-    ### archivos_temporales.append(output_file)
-    if idx_grupo < len(grupos[:lim_muestra]) - 1 and tono_separador:
-        archivos_temporales.append(sonido_silencio)
-        archivos_temporales.append(tono_suave_320)
-        archivos_temporales.append(sonido_silencio)
-    
-    if archivosYaGenerados == False :
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            print(f"✅ Extraído: {output_file}")
-            
-            # Verificar duración real
-            cmd_check = [
-                'ffprobe',
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                output_file
-            ]
-            
-            check_result = subprocess.run(cmd_check, capture_output=True, text=True)
-            if check_result.returncode == 0:
-                actual_duration = float(check_result.stdout.strip())
-                print(f"   Duración real: {actual_duration:.2f}s (esperada: {duracion_grupo:.2f}s)")
-                
-                diferencia = abs(actual_duration - duracion_grupo)
-                if diferencia > 0.1:
-                    print(f"   ⚠️  Diferencia: {diferencia:.3f}s")
+
+        check_result = ejecutar(cmd_check, capture_output=True, text=True)
+        if check_result.returncode == 0:
+            actual_duration = float(check_result.stdout.strip())
+            print(f"   Duración real: {actual_duration:.2f}s (esperada: {duracion_grupo:.2f}s)")
+
+            diferencia = abs(actual_duration - duracion_grupo)
+            if diferencia > 0.1:
+                print(f"   ⚠️  Diferencia: {diferencia:.3f}s")
+    else:
+        print(f"❌ Error: {result.stderr[:200]}")
+
+    print()
+    return result.returncode == 0
+
+def normalizar_tts_grupo(g, temp_dir):
+    """Prepara los TTS del grupo para el plan (WAV común + ganancia) y los deja en g['assets']"""
+    os.makedirs(temp_dir, exist_ok=True)
+    cache = {}
+    for clave in ('tts_es', 'tts_en'):
+        if g[clave]:
+            preparar_asset(g[clave], temp_dir, cache, VOLUMEN_TTS)
+    g['assets'] = cache
+
+def extraer_y_sintetizar(grupos_render, subs, almacen, audio_fuente, voces=None, dir_salida="."):
+    """
+    Extracción y TTS solapados: mientras se corta (y normaliza) el grupo i, los TTS de los
+    grupos siguientes ya están pedidos en segundo plano, como mucho PREFETCH_TTS por delante.
+    """
+    # Los assets del plan se guardan junto a plan_render.npz, no en el espacio temporal
+    dir_assets = os.path.join(dir_salida, DIR_ASSETS_PLAN)
+    futuros = {}
+    with ThreadPoolExecutor(max_workers=max(1, PREFETCH_TTS), thread_name_prefix="tts") as pool:
+        for i, g in enumerate(grupos_render):
+            for j in range(i, min(i + max(1, PREFETCH_TTS), len(grupos_render))):
+                if j not in futuros:
+                    futuros[j] = pool.submit(generar_tts_grupo, grupos_render[j], voces)
+            extraer_grupo(g, subs, almacen, audio_fuente)
+            futuros.pop(i).result()
+            if MODO_RENDER == "secuencial":
+                normalizar_tts_grupo(g, dir_assets)
+
+def generar_tts_grupo(g, voces=None):
+    """Etapa TTS: genera el audio EN y ES del grupo; deja a None el que no se pudo crear"""
+    voces = voces or {}
+    primer_idx = g['cues'][0]
+    print(" archivo_salida tts "+g['tts_en'])
+    print(" archivo_salida tts es "+g['tts_es'])
+    if not texto_a_audio(g['texto_en'], g['tts_en'], primer_idx, voz=voces.get(1)):
+        g['tts_en'] = None
+    if not texto_a_audio(g['texto_es'], g['tts_es'], primer_idx, idioma=2, voz=voces.get(2)):
+        g['tts_es'] = None
+    return g
+
+def renderizar_superpuesto_grupos(grupos_render, almacen, dir_salida="."):
+    """Modo superpuesto: TTS encima del audio de cada grupo, todos los grupos en una sola pasada"""
+    print(f"\n=== Mezclando {len(grupos_render)} grupos con ducking ===")
+    temp_dir = dir_temporal(dir_salida)
+
+    segmentos = []
+    for i, g in enumerate(grupos_render):
+        voz = g['tts_es'] if IDIOMA_SUPERPUESTO == 2 else g['tts_en']
+        if voz and os.path.exists(voz):
+            voz = _normalizar_archivo(voz, f"voz_{i}", temp_dir, VOLUMEN_TTS)
         else:
-            print(f"❌ Error: {result.stderr[:200]}")
-        
-        print()
+            voz = None
+        segmentos.append({'inicio': g['inicio'], 'fin': g['fin'], 'voz': voz})
 
-# 3. Combinar todos los grupos en un solo archivo
-if archivos_temporales:
-    print(f"\n=== Combinando {len(archivos_temporales)} grupos ===")
-    
-    # Crear archivo de lista para concatenación
-    lista_file = 'lista_combinar.txt'
+    mezcla_wav = os.path.join(temp_dir, "mezcla_superpuesta.wav")
+    duracion_mezcla = renderizar_superpuesto(almacen, segmentos, mezcla_wav,
+                                             volumen_fondo=VOLUMEN_AUDIO_ORIGINAL)
+    output_final = os.path.join(dir_salida, 'salida_superpuesta.mp3')
+    concatenar_normalizados([mezcla_wav], output_final)
+    print(f"✅ Mezcla superpuesta: {output_final} ({duracion_mezcla:.2f} segundos)")
+    return output_final
+
+def renderizar_doblaje_grupos(grupos_render, almacen, dir_salida=".", voces=None):
+    """Modo doblaje: cada TTS en su posición de la película, acelerado si no cabe en su hueco"""
+    print(f"\n=== Pista de doblaje con {len(grupos_render)} grupos ===")
+    voces = voces or {}
+    temp_dir = dir_temporal(dir_salida)
+
+    clips = []
+    for i, g in enumerate(grupos_render):
+        # El hueco va desde el primer subtítulo del grupo hasta el primero del siguiente
+        siguiente = grupos_render[i + 1]['inicio_cue'] if i + 1 < len(grupos_render) else almacen.duracion
+        clip = {'inicio': g['inicio_cue'], 'fin': siguiente, 'voz': None}
+        voz_original = g['tts_es'] if IDIOMA_SUPERPUESTO == 2 else g['tts_en']
+        texto = g['texto_es'] if IDIOMA_SUPERPUESTO == 2 else g['texto_en']
+        if voz_original and os.path.exists(voz_original):
+            clip['voz'] = _normalizar_archivo(voz_original, f"voz_{i}", temp_dir, VOLUMEN_TTS)
+
+        if AJUSTE_DOBLAJE == "rate" and clip['voz']:
+            duracion_voz = os.path.getsize(clip['voz']) / (almacen.sample_rate * almacen.canales * 2)
+            tempo = factor_tempo(duracion_voz, clip['fin'] - clip['inicio'])
+            if tempo > 1.0:
+                base, extension = os.path.splitext(voz_original)
+                archivo_rapido = base + f"_r{rate_para_tempo(tempo)}{extension}"
+                if IDIOMA_SUPERPUESTO == 2:
+                    voz = voces.get(2, TTS_VOICE_ES)
+                else:
+                    voz = voces.get(1, TTS_VOICE_EN)
+                if tts_con_edge(texto.replace('\n', ' ').strip(), archivo_rapido, voz=voz, rate=rate_para_tempo(tempo)):
+                    clip['voz'] = _normalizar_archivo(archivo_rapido, f"voz_r{i}", temp_dir, VOLUMEN_TTS)
+        clips.append(clip)
+
+    pista_wav = os.path.join(temp_dir, "pista_doblaje.wav")
+    tempos = crear_pista_doblaje(pista_wav, almacen.duracion, clips, almacen.sample_rate, almacen.canales)
+    acelerados = [t for t in tempos if t and t > 1.0]
+    print(f"   Clips acelerados: {len(acelerados)} (máx {max(acelerados, default=1.0):.2f}x)")
+
+    output_final = os.path.join(dir_salida, 'pista_doblaje.mp3')
+    concatenar_normalizados([pista_wav], output_final)
+    print(f"✅ Pista de doblaje: {output_final} ({almacen.duracion:.2f} segundos, lista para muxear)")
+    return output_final
+
+def renderizar_secuencial_grupos(grupos_render, tono_separador, dir_salida=".", audio_fuente=None, titulo=None):
+    """Combina todos los grupos (TTS ES, tono, TTS EN...) en un solo archivo de estudio"""
+    print(f"\n=== Combinando {len(grupos_render)} grupos ===")
+    temp_dir = dir_temporal(dir_salida)
+
+    # Plan de render: registros (asset, offset, largo, ganancia) en vez de una lista de rutas
+    separador = [sonido_silencio, tono_suave_320, sonido_silencio] if tono_separador else []
+    # Los WAV del plan van a dir_salida (no al espacio temporal, que se borra al terminar)
+    # para que plan_render.npz siga apuntando a archivos que existen
+    plan = construir_plan_secuencial(grupos_render, separador, os.path.join(dir_salida, DIR_ASSETS_PLAN))
+    errores = plan.validar()
+    for error in errores[:10]:
+        print(f"  ⚠️  Plan: {error}")
+    archivo_plan = os.path.join(dir_salida, ARCHIVO_PLAN)
+    plan.guardar(archivo_plan)
+    print(f"  Plan: {len(plan.registros)} segmentos, {len(plan.assets)} assets -> {archivo_plan}")
+
+    # Crear archivo de lista (solo para revisar formatos de las fuentes)
+    lista_file = os.path.join(temp_dir, 'lista_combinar.txt')
     with open(lista_file, 'w', encoding='utf-8') as f:
-        for archivo in archivos_temporales:
-            if os.path.exists(archivo):
-                f.write(f"file '{os.path.abspath(archivo)}'\n")
-    
+        for asset in plan.assets:
+            f.write(f"file '{os.path.abspath(asset['ruta'])}'\n")
+
     # Archivo final combinado
-    output_final = 'dialogos_combinados.mp3'
-    
+    output_final = os.path.join(dir_salida, 'salida_final.mp3')
+
     '''cmd_combinar = [
         'ffmpeg',
         '-f', 'concat',
@@ -624,37 +966,138 @@ if archivos_temporales:
         output_final
     ]'''
     verificar_formatos(lista_file)
-    # Uso:
-    ## archivos_originales = ["tts_0.mp3", "tono_beep_1319.mp3", "grupo_001.mp3", ...]
-    normalizados = normalizar_archivos(archivos_temporales)
-    concatenar_normalizados(normalizados, "salida_final.mp3")
+
     print(f"Combinando en '{output_final}'...")
-    result = 1 ## subprocess.run(cmd_combinar, capture_output=True, text=True)
-    
-    if result.returncode == 0:
-        # Verificar duración total
-        cmd_check_total = [
-            'ffprobe',
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            output_final
-        ]
-        
-        check_total = subprocess.run(cmd_check_total, capture_output=True, text=True)
-        if check_total.returncode == 0:
-            duracion_total = float(check_total.stdout.strip())
-            print(f"✅ Combinación exitosa: {output_final}")
-            print(f"   Duración total: {duracion_total:.2f} segundos")
-            print(f"   Archivos combinados: {len(archivos_temporales)}")
-    
+    if RENDER_INCREMENTAL:
+        _, bloques = renderizar_incremental(plan, output_final, os.path.join(dir_salida, DIR_BLOQUES),
+                                            procesos=PROCESOS_MP3)
+        mapa = mapa_salida(bloques)
+    else:
+        salida_wav = os.path.join(temp_dir, "salida_final.wav")
+        plan.renderizar_numpy(salida_wav)
+        concatenar_normalizados([salida_wav], output_final)
+        mapa = None
+
+    # Índice lateral (dónde cae cada grupo/tono/TTS en la salida) para el reproductor
+    for ruta in escribir_indice(plan, output_final, mapa):
+        print(f"  Índice: {ruta}")
+
+    if os.path.exists(output_final):
+        duracion_total = plan.duracion_frames / plan.sample_rate
+        print(f"✅ Combinación exitosa: {output_final}")
+        print(f"   Duración total: {duracion_total:.2f} segundos")
+        print(f"   Segmentos combinados: {len(plan.registros)}")
+
+    if "m4b" in EMPAQUETAR:
+        empaquetar_m4b(plan, os.path.join(dir_salida, 'salida_final.m4b'), titulo, temp_dir)
+    if "mka" in EMPAQUETAR:
+        empaquetar_mka(plan, os.path.join(dir_salida, 'salida_final.mka'), audio_fuente, titulo, temp_dir)
+
     # Limpiar lista temporal
     #if os.path.exists(lista_file):
     #    os.remove(lista_file)
+    return output_final
+
+@medir("render")
+def renderizar_grupos(grupos_render, almacen, audio_fuente, tono_separador, dir_salida=".", voces=None, titulo=None):
+    """Etapa de render según MODO_RENDER. Devuelve la ruta del archivo final (o None)"""
+    if not grupos_render:
+        return None
+    if MODO_RENDER == "superpuesto" and almacen:
+        return renderizar_superpuesto_grupos(grupos_render, almacen, dir_salida)
+    if MODO_RENDER == "doblaje" and almacen:
+        return renderizar_doblaje_grupos(grupos_render, almacen, dir_salida, voces)
+    return renderizar_secuencial_grupos(grupos_render, tono_separador, dir_salida, audio_fuente, titulo)
+
+def crear_tono_grupos(directorio=None):
+    """Tono de separación entre grupos (se crea una vez y se comparte entre películas)"""
+    tono_separador = crear_tono_separador(
+        tipo=TIPO_TONO,
+        duracion=DURACION_TONO,
+        frecuencia=800,
+        output_file=os.path.join(directorio, f"tono_{TIPO_TONO}.mp3") if directorio else None
+    )
+    if tono_separador:
+        print(f"✅ Tono de separación creado: {tono_separador} ({TIPO_TONO}, {DURACION_TONO}s)")
+    return tono_separador
+
+def abrir_audio(video_path, ya_generados=False):
+    """Demuxea la pista de audio una sola vez; los cortes de grupo leen de aquí y no del video"""
+    audio_fuente = audio_pelicula(video_path) if ya_generados == False else None
+    almacen = AlmacenPCM(audio_fuente) if audio_fuente and USAR_ALMACEN_PCM else None
+    return audio_fuente, almacen
+
+def etapa_catalogo(catalogo, pelicula_id, nombre):
+    """Contexto que marca la etapa en el catálogo (o no hace nada sin catálogo)"""
+    return catalogo.etapa(pelicula_id, nombre) if catalogo else nullcontext()
+
+def procesar_pelicula(video_path, srt_en, srt_es, dir_salida=".", voces=None, ya_generados=False,
+                      tono_separador=None):
+    """Todas las etapas (parseo, extracción, TTS, render) de una película, una detrás de otra"""
+    # metricas.json y el resumen son de esta película, no de las anteriores del mismo proceso
+    instrumentacion.reiniciar()
+    os.makedirs(dir_salida, exist_ok=True)
+    titulo = os.path.splitext(os.path.basename(video_path))[0]
+    # Intermedios en un temporal propio (se borra al acabar) y dir_salida bloqueado mientras tanto
+    # El catálogo se cierra también si falla una etapa (no deja la conexión SQLite abierta)
+    with EspacioTrabajo(dir_salida, titulo) as espacio, \
+            (Catalogo(ARCHIVO_CATALOGO, DIR_BLOBS) if USAR_CATALOGO else nullcontext()) as catalogo:
+        pelicula_id = catalogo.registrar_pelicula(video_path, titulo) if catalogo else None
+
+        with etapa_catalogo(catalogo, pelicula_id, "parse"):
+            subs = cargar_subtitulos(srt_en)
+            subs_es = cargar_subtitulos(srt_es)
+            if catalogo:
+                catalogo.guardar_cues(pelicula_id, "en", subs)
+                catalogo.guardar_cues(pelicula_id, "es", subs_es)
+        audio_fuente, almacen = abrir_audio(video_path, ya_generados)
+
+        # 1. Crear tono de separación
+        if tono_separador is None:
+            tono_separador = crear_tono_grupos(espacio.temp)
+
+        print(f"Extrayendo diálogos agrupando bloques cercanos...\n")
+        # 1. Agrupar subtítulos cercanos
+        grupos = agrupar_subtitulos(subs)
+        print(f"Encontrados {len(grupos)} grupos de diálogos cercanos")
+        print(f"(Uniendo bloques con menos de {MAX_ESPACIO_ENTRE_BLOQUES} segundo de separación)\n")
+
+        # 2. Extraer cada grupo
+        grupos_render = preparar_grupos(subs, subs_es, grupos, dir_salida, usar_wav=almacen is not None,
+                                        lim_muestra=LIM_MUESTRA)
+        if catalogo:
+            catalogo.guardar_grupos(pelicula_id, grupos_render)
+        if ya_generados == False:
+            with etapa_catalogo(catalogo, pelicula_id, "extract"), etapa_catalogo(catalogo, pelicula_id, "tts"):
+                extraer_y_sintetizar(grupos_render, subs, almacen, audio_fuente, voces, dir_salida)
+
+        perdidos = cliente_tts.informe_perdidos(directorio=dir_salida)
+        if perdidos:
+            print("\n" + perdidos)
+
+        # 3. Render
+        with etapa_catalogo(catalogo, pelicula_id, "render"):
+            output_final = renderizar_grupos(grupos_render, almacen, audio_fuente, tono_separador,
+                                             dir_salida, voces, titulo)
+        if catalogo:
+            voces = voces or {}
+            registrar_resultado(catalogo, pelicula_id, grupos_render,
+                                {1: voces.get(1, TTS_VOICE_EN), 2: voces.get(2, TTS_VOICE_ES)}, output_final)
+
+        print("\n🎧 Archivos generados:")
+        print(f"  {output_final} (combinado)")
+        for g in grupos_render[:5]:
+            for archivo in (g['tts_es'], g['tts_en']):
+                if archivo and os.path.exists(archivo):
+                    size_kb = os.path.getsize(archivo) / 1024
+                    print(f"  {archivo} ({size_kb:.1f} KB)")
+
+        # Dónde se fue el tiempo: tabla y JSON (metricas.json junto a la salida)
+        print("\n" + instrumentacion.resumen())
+        instrumentacion.exportar_json(os.path.join(dir_salida, ARCHIVO_METRICAS))
+        return output_final
+
 
-print("\n🎧 Archivos generados:")
-print(f"  {output_final} (combinado)")
-for i, archivo in enumerate(archivos_temporales[:5]):
-    if os.path.exists(archivo):
-        size_kb = os.path.getsize(archivo) / 1024
-        print(f"  {archivo} ({size_kb:.1f} KB)")
\ No newline at end of file
+if __name__ == "__main__":
+    procesar_pelicula(video, SRT_EN, SRT_ES, voces={1: TTS_VOICE_EN, 2: TTS_VOICE_ES},
+                      ya_generados=archivosYaGenerados)